@@ -0,0 +1,64 @@
+"""
+Benchmark of parsing the collision times and splitting them into
+calendar fields.
+
+Compares pandas.to_datetime and the datetime accessors with
+parse_datetimes and calendar_fields.
+
+Usage:
+    python benchmarks/benchmark_datetimes.py [rows]
+
+The times are drawn from the incdttm column of the test collision
+data, 1,000,000 rows by default.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from wa_collisions.datetime_parser import CALENDAR_FIELDS
+from wa_collisions.datetime_parser import calendar_fields
+from wa_collisions.datetime_parser import parse_datetimes
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+TEST_DATA = "wa_collisions/data/Collisions_test.csv"
+
+
+def with_pandas(values):
+    """
+    Parses with format inference and the datetime accessors.
+    """
+    times = pd.to_datetime(values)
+    return {field: getattr(times.dt, field).values for field in CALENDAR_FIELDS}
+
+
+def with_parser(values):
+    """
+    Parses with parse_datetimes and calendar_fields.
+    """
+    return calendar_fields(parse_datetimes(values))
+
+
+def main(argv):
+    """
+    Runs the benchmark and prints one line per method.
+    """
+    rows = int(argv[1]) if len(argv) > 1 else 1000000
+    times = read_collision_data(TEST_DATA)['incdttm'].dropna().values
+    values = pd.Series(np.random.RandomState(0).choice(times, rows))
+
+    print('{0:<10}{1:>10}'.format('method', 'seconds'))
+    results = []
+    for name, method in [('pandas', with_pandas), ('parser', with_parser)]:
+        start = time.perf_counter()
+        results.append(method(values))
+        print('{0:<10}{1:>10.2f}'.format(name, time.perf_counter() - start))
+
+    for field in CALENDAR_FIELDS:
+        assert np.array_equal(results[0][field], results[1][field])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
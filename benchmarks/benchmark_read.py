@@ -0,0 +1,81 @@
+"""
+Benchmark of reading the collision data with and without the schema.
+
+Compares the parse time, the peak memory while parsing and the size of
+the frame read by read_collision_data with projected=True and False.
+
+Usage:
+    python benchmarks/benchmark_read.py [collision csv] [repeats]
+
+Without a file, the test collision data is repeated 2000 times into a
+temporary file of about 180,000 rows.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+TEST_DATA = "wa_collisions/data/Collisions_test.csv"
+
+
+def measure(file_path, projected):
+    """
+    Reads the collision data once.
+
+    Args:
+        file_path: the path to the collision data
+        projected: passed to read_collision_data
+
+    Returns:
+        seconds taken, peak traced memory and memory of the frame in MB
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = read_collision_data(file_path, projected=projected)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frame = data.memory_usage(deep=True).sum()
+    return seconds, peak / 2.0 ** 20, frame / 2.0 ** 20
+
+
+def _repeated_test_data(path, repeats):
+    with open(TEST_DATA, encoding='utf-8-sig') as source:
+        header = source.readline()
+        rows = source.read()
+    with open(path, 'w', encoding='utf-8') as target:
+        target.write(header)
+        for _ in range(repeats):
+            target.write(rows)
+
+
+def main(argv):
+    """
+    Runs the benchmark and prints one line per mode.
+    """
+    folder = None
+    if len(argv) > 1:
+        file_path = argv[1]
+    else:
+        folder = tempfile.mkdtemp()
+        file_path = os.path.join(folder, 'collisions.csv')
+        _repeated_test_data(file_path, int(argv[2]) if len(argv) > 2 else 2000)
+
+    try:
+        print('{0:<10}{1:>10}{2:>14}{3:>14}'.format('mode', 'seconds', 'peak MB', 'frame MB'))
+        for projected in [False, True]:
+            seconds, peak, frame = measure(file_path, projected)
+            print('{0:<10}{1:>10.2f}{2:>14.1f}{3:>14.1f}'.format(
+                'schema' if projected else 'all', seconds, peak, frame))
+    finally:
+        if folder is not None:
+            os.remove(file_path)
+            os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,176 @@
+"""
+Precomputed cube of collision counts and sums.
+
+This file groups cleaned collisions once by day, neighborhood and
+indicator flags, keeping the number of collisions and the sum of the
+numeric fields of each cell. Other columns, such as roadcond, can key
+the cells too and are then kept by their values. Splitting the neighborhoods into treatment
+and control groups, summing another field, keeping only the collisions
+with some flags or resampling by week or month are then reductions over
+these cells, whose number depends on the number of days and
+neighborhoods rather than on the number of collisions.
+"""
+
+import numpy as np
+import pandas as pd
+
+# fields summed in the cube, when the collisions have them
+CUBE_MEASURES = ['injuries', 'fatalities', 'pedcount', 'pedcylcount', 'personcount']
+
+# indicator flags the cube is keyed by, when the collisions have them
+CUBE_FLAGS = ['ind_ped', 'ind_speeding', 'ind_person', 'ind_pedcycl',
+              'ind_fatalities', 'ind_valid_time']
+
+# names of the columns of the pivots
+TREATMENT_COLUMNS = {True: 'SpeedLimitChange', False: 'SpeedLimitSame'}
+
+
+class AggregationCube(object):
+    """
+    Counts and sums of collisions by day, neighborhood and flags.
+
+    Attributes:
+        cells (pandas dataframe): columns day, object_id, the flags,
+            count and the measures, one row per combination found in
+            the collisions
+        measures (list): fields summed in the cells
+        flags (list): columns the cells are keyed by
+        levels (dict): values of the flags which are not boolean, the
+            cells holding the position of the value, or -1 when missing
+    """
+
+    def __init__(self, cells, measures, flags, levels=None):
+        """
+        Wraps the cells of a cube, see build_cube.
+
+        Args:
+            cells (pandas dataframe): the cells of the cube
+            measures (list): fields summed in the cells
+            flags (list): columns the cells are keyed by
+            levels (dict): values of the flags which are not boolean
+        """
+        self.cells = cells
+        self.measures = list(measures)
+        self.flags = list(flags)
+        self.levels = dict(levels or {})
+
+    def select(self, where=None):
+        """
+        Returns the cells of the collisions with the given flags, the
+        same collisions as keeping the rows equal to each value.
+
+        Args:
+            where (dict): value of the flags to keep, None for every cell
+
+        Returns:
+            pandas dataframe of the matching cells
+
+        Raises:
+            ValueError: if a flag is not in the cube
+        """
+        if not where:
+            return self.cells
+
+        keep = np.ones(self.cells.shape[0], dtype=bool)
+        for flag, value in sorted(where.items()):
+            if flag not in self.flags:
+                raise ValueError("{0} is not a flag of the cube, flags are {1}".format(
+                    flag, self.flags))
+            if flag in self.levels:
+                # missing values and values not in the collisions match nothing
+                codes = np.flatnonzero(self.levels[flag] == value)
+                keep &= np.isin(self.cells[flag].values, codes)
+            else:
+                keep &= self.cells[flag].values == value
+        return self.cells[keep]
+
+    def pivot(self, treatment_ids, control_ids, agg_by=None, resample_by='D', where=None):
+        """
+        Returns the collisions of the treatment and control groups over time.
+
+        Args:
+            treatment_ids (list): object ids of the treatment neighborhoods
+            control_ids (list): object ids of the control neighborhoods
+            agg_by (string): measure to sum, None to count collisions
+            resample_by (string): 'D', 'W' or 'M', for day, week and month
+            where (dict): value of the flags of the collisions to keep
+
+        Returns:
+            dataframe indexed by time with the columns SpeedLimitChange
+            and SpeedLimitSame, see render_stats.pivot_by_treatment
+
+        Raises:
+            ValueError: if agg_by is not a measure of the cube
+            ValueError: if a flag of where is not in the cube
+        """
+        if agg_by is not None and agg_by not in self.measures:
+            raise ValueError("agg_by must be None or one of the measures " + str(self.measures))
+
+        cells = self.select(where)
+        object_ids = cells['object_id'].values
+        in_treatment = np.isin(object_ids, np.asarray(treatment_ids, dtype=object_ids.dtype))
+        in_group = in_treatment | np.isin(object_ids,
+                                          np.asarray(control_ids, dtype=object_ids.dtype))
+        cells = cells[in_group]
+        values = cells['count' if agg_by is None else agg_by]
+
+        data = values.groupby([cells['day'].values, in_treatment[in_group]]).sum().unstack()
+        data = data.reindex(columns=[True, False]).fillna(0)
+        data.index.name = 'time'
+        data.columns.name = 'speedlimit_change_flag'
+        data = data.rename(columns=TREATMENT_COLUMNS)
+        return data.resample(resample_by).sum()
+
+
+def build_cube(collision_data, measures=None, flags=None):
+    """
+    Groups cleaned collisions with neighborhoods into a cube.
+
+    Args:
+        collision_data (pandas dataframe): collisions cleaned by
+            clean_collision_data with an object_id column
+        measures (list): fields to sum, defaults to the CUBE_MEASURES
+            found in collision_data
+        flags (list): columns to key the cells by, defaults to the
+            CUBE_FLAGS found in collision_data. Columns which are not
+            boolean are keyed by their values.
+
+    Returns:
+        the AggregationCube
+
+    Raises:
+        ValueError: if collision_data has no time or object_id column
+        ValueError: if a measure or flag is not a column of collision_data
+    """
+    for column in ['time', 'object_id']:
+        if column not in collision_data.columns:
+            raise ValueError("collision data has no {0} column".format(column))
+    if measures is None:
+        measures = [measure for measure in CUBE_MEASURES if measure in collision_data.columns]
+    if flags is None:
+        flags = [flag for flag in CUBE_FLAGS if flag in collision_data.columns]
+    missing = [column for column in list(measures) + list(flags)
+               if column not in collision_data.columns]
+    if missing:
+        raise ValueError("collision data has no columns {0}".format(missing))
+
+    frame = collision_data[list(measures)].astype('float64')
+    frame['day'] = collision_data['time'].values.astype('datetime64[D]').astype('datetime64[ns]')
+    frame['object_id'] = collision_data['object_id'].values
+    levels = {}
+    for flag in flags:
+        values = collision_data[flag].values
+        if values.dtype == bool:
+            frame[flag] = values
+        else:
+            # codes keep the missing values, which groupby would drop
+            codes, uniques = pd.factorize(values)
+            frame[flag] = codes
+            levels[flag] = np.asarray(uniques, dtype=object)
+
+    grouped = frame.groupby(['day', 'object_id'] + list(flags), sort=True)
+    cells = grouped[list(measures)].sum()
+    cells['count'] = grouped.size()
+    cells = cells.reset_index().reindex(
+        columns=['day', 'object_id'] + list(flags) + ['count'] + list(measures))
+    return AggregationCube(cells, measures, flags, levels)
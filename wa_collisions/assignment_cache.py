@@ -0,0 +1,193 @@
+"""
+Persistent cache of neighborhood assignments.
+
+This file keeps the neighborhood assigned to each collision on disk,
+keyed by the collision key and by coordinate, together with a
+fingerprint of the neighborhood layer it was computed from. A rebuild
+then only runs the point in polygon test for the collisions which are
+new or have moved, and the whole cache is dropped as soon as the
+neighborhood layer changes.
+"""
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+# position returned by lookup for locations which are not in the cache
+UNKNOWN_POSITION = -2
+
+
+class AssignmentCache(object):
+    """
+    Neighborhood positions of known collisions and coordinates.
+
+    Positions are the positions returned by NeighborhoodIndex.query for
+    the neighborhood file with the given fingerprint, -1 meaning the
+    location is not in any neighborhood.
+
+    Attributes:
+        fingerprint (string): fingerprint of the neighborhood layer
+        keys (pandas dataframe): key, x, y and position of each collision.
+            The keys keep their own type, numbers or strings.
+        coordinates (pandas dataframe): x, y and position of each
+            distinct location
+    """
+
+    def __init__(self, fingerprint, keys=None, coordinates=None):
+        """
+        Wraps cached assignments, see load_assignment_cache.
+
+        Args:
+            fingerprint (string): fingerprint of the neighborhood layer
+            keys (pandas dataframe): columns key, x, y and position
+            coordinates (pandas dataframe): columns x, y and position
+        """
+        self.fingerprint = fingerprint
+        if keys is None:
+            keys = pd.DataFrame({'key': [], 'x': [], 'y': [], 'position': []})
+        if coordinates is None:
+            coordinates = pd.DataFrame({'x': [], 'y': [], 'position': []})
+        self.keys = keys
+        self.coordinates = coordinates
+
+    def lookup(self, latitudes, longitudes, keys=None):
+        """
+        Returns the cached position of each location.
+
+        A collision with a known key is a hit only when its coordinates
+        have not changed. Other locations are looked up by coordinate.
+
+        Args:
+            latitudes (array like): first coordinate of the locations
+            longitudes (array like): second coordinate of the locations
+            keys (array like): key of each collision, or None
+
+        Returns:
+            positions (numpy array): cached position of each location,
+            UNKNOWN_POSITION when the location is not in the cache.
+            Locations with a missing coordinate get -1.
+        """
+        x, y, keys = _as_arrays(latitudes, longitudes, keys)
+        positions = np.full(len(x), UNKNOWN_POSITION, dtype=np.intp)
+        positions[np.isnan(x) | np.isnan(y)] = -1
+
+        if keys is not None and len(self.keys):
+            found = pd.Index(self.keys['key'].values).get_indexer(keys)
+            hit = np.flatnonzero(found >= 0)
+            moved = (self.keys['x'].values[found[hit]] != x[hit]) \
+                    | (self.keys['y'].values[found[hit]] != y[hit])
+            hit = hit[~moved]
+            positions[hit] = self.keys['position'].values[found[hit]]
+
+        todo = np.flatnonzero(positions == UNKNOWN_POSITION)
+        if len(todo) and len(self.coordinates):
+            cached = pd.MultiIndex.from_arrays(
+                [self.coordinates['x'].values, self.coordinates['y'].values])
+            found = cached.get_indexer(pd.MultiIndex.from_arrays([x[todo], y[todo]]))
+            hit = found >= 0
+            positions[todo[hit]] = self.coordinates['position'].values[found[hit]]
+        return positions
+
+    def update(self, latitudes, longitudes, positions, keys=None):
+        """
+        Adds the positions of locations to the cache, replacing the
+        entries of collisions and coordinates which are already there.
+
+        Args:
+            latitudes (array like): first coordinate of the locations
+            longitudes (array like): second coordinate of the locations
+            positions (array like): position of each location
+            keys (array like): key of each collision, or None
+        """
+        x, y, keys = _as_arrays(latitudes, longitudes, keys)
+        positions = np.asarray(positions, dtype=np.int64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+
+        coordinates = pd.DataFrame({'x': x[valid], 'y': y[valid], 'position': positions[valid]})
+        self.coordinates = pd.concat([self.coordinates, coordinates], ignore_index=True) \
+            .drop_duplicates(['x', 'y'], keep='last').reset_index(drop=True)
+
+        if keys is not None:
+            valid &= ~pd.isnull(keys)
+            entries = pd.DataFrame({'key': keys[valid], 'x': x[valid], 'y': y[valid],
+                                    'position': positions[valid]})
+            self.keys = pd.concat([self.keys, entries], ignore_index=True) \
+                .drop_duplicates('key', keep='last').reset_index(drop=True)
+
+    def save(self, path):
+        """
+        Writes the cache to a numpy .npz file, replacing the file only
+        once it is completely written.
+
+        Args:
+            path (string): path of the cache file
+        """
+        keys = self.keys['key'].values
+        if keys.dtype == object:
+            keys = keys.astype(str)
+
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as cache_file:
+            np.savez(cache_file, fingerprint=np.array(self.fingerprint), key=keys,
+                     key_x=self.keys['x'].values.astype(float),
+                     key_y=self.keys['y'].values.astype(float),
+                     key_position=self.keys['position'].values.astype(np.int64),
+                     x=self.coordinates['x'].values.astype(float),
+                     y=self.coordinates['y'].values.astype(float),
+                     position=self.coordinates['position'].values.astype(np.int64))
+        os.replace(temporary_path, path)
+
+
+def layer_fingerprint(index):
+    """
+    Returns the sha1 digest of the polygons and labels of a layer.
+
+    Args:
+        index (NeighborhoodIndex): index over the neighborhoods used to
+            assign the locations
+
+    Returns:
+        hex digest of the object ids, names and geometries of the index
+    """
+    digest = hashlib.sha1()
+    digest.update(np.asarray(index.object_ids, dtype=np.int64).tobytes())
+    for names in [index.s_hoods, index.l_hoods]:
+        digest.update('\0'.join(str(name) for name in names).encode('utf-8'))
+    for geometry in index.geometries:
+        digest.update(geometry.wkb)
+    return digest.hexdigest()
+
+
+def load_assignment_cache(path, fingerprint):
+    """
+    Loads a cache saved by AssignmentCache.save.
+
+    Args:
+        path (string): path of the cache file
+        fingerprint (string): fingerprint of the current neighborhood
+            layer
+
+    Returns:
+        the AssignmentCache loaded. The cache is empty when the file
+        doesn't exist or was computed from another neighborhood layer.
+    """
+    if not os.path.exists(path):
+        return AssignmentCache(fingerprint)
+
+    with np.load(path) as saved:
+        if str(saved['fingerprint']) != fingerprint:
+            return AssignmentCache(fingerprint)
+        keys = pd.DataFrame({'key': saved['key'], 'x': saved['key_x'],
+                             'y': saved['key_y'], 'position': saved['key_position']})
+        coordinates = pd.DataFrame({'x': saved['x'], 'y': saved['y'],
+                                    'position': saved['position']})
+    return AssignmentCache(fingerprint, keys, coordinates)
+
+
+def _as_arrays(latitudes, longitudes, keys):
+    x = np.asarray(latitudes, dtype=float).ravel()
+    y = np.asarray(longitudes, dtype=float).ravel()
+    if keys is not None:
+        keys = np.asarray(keys).ravel()
+    return x, y, keys
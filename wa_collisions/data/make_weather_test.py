@@ -0,0 +1,75 @@
+"""
+Generates the weather test data, Weather_test.csv.
+
+The file is synthetic. It has the columns of the Iowa Environmental
+Mesonet ASOS export read by read_weather_data, with one SEA reading at
+53 minutes past each hour (UTC) of every day with a collision in the
+collision test data and of the day after, which the UTC day can spill
+into. Temperatures follow a seasonal and a daily cycle with a little
+noise, rain falls on about a third of the days and the wind drifts
+slowly. The temperature of one reading in fifty is missing and marked
+'M', as in the real export.
+
+Run from the root of the repository:
+
+    python wa_collisions/data/make_weather_test.py
+"""
+
+import numpy as np
+import pandas as pd
+
+COLLISION_PATHS = ['wa_collisions/data/Collisions_test.csv',
+                   'wa_collisions/data/Collisions_With_Neighborhoods_test.csv']
+WEATHER_PATH = 'wa_collisions/data/Weather_test.csv'
+
+# seed of the generator, so the file is the same on every run
+SEED = 2014
+
+
+def make_weather(collision_paths, seed=SEED):
+    """
+    Builds hourly readings for the days of the collisions.
+
+    Args:
+        collision_paths (list): paths of the collision csv files
+        seed (int): seed of the random generator
+
+    Returns:
+        dataframe with the columns of the weather export
+    """
+    days = pd.DatetimeIndex([])
+    for path in collision_paths:
+        times = pd.to_datetime(pd.read_csv(path, usecols=['incdttm'])['incdttm'])
+        days = days.union(pd.DatetimeIndex(times.dt.normalize().dropna().unique()))
+    days = days.union(days + pd.Timedelta(days=1))
+
+    generator = np.random.RandomState(seed)
+    valid = (days.values[:, None] + np.arange(24) * np.timedelta64(1, 'h')
+             + np.timedelta64(53, 'm')).ravel()
+    valid = pd.DatetimeIndex(valid)
+
+    season = np.sin(2 * np.pi * (valid.dayofyear.values - 110) / 365.25)
+    # the warmest hour is around 15:00 local time, 23:00 UTC
+    daily = np.sin(2 * np.pi * (valid.hour.values - 17) / 24)
+    temperature = 52 + 12 * season + 7 * daily + generator.normal(0, 1, len(valid))
+
+    rainy = np.repeat(generator.rand(len(days)) < 0.35, 24)
+    precipitation = np.where(rainy & (generator.rand(len(valid)) < 0.4),
+                             generator.gamma(1.5, 0.02, len(valid)), 0)
+
+    hours = (valid - valid[0]) / pd.Timedelta(hours=1)
+    wind = np.clip(7 + 4 * np.sin(2 * np.pi * hours / 90) + generator.normal(0, 1.5, len(valid)),
+                   0, None)
+
+    weather = pd.DataFrame({
+        'station': 'SEA',
+        'valid': valid.strftime('%Y-%m-%d %H:%M'),
+        'tmpf': np.round(temperature, 1).astype(str),
+        ' p01i': np.round(precipitation, 2),
+        ' sknt': np.round(wind).astype(int)})
+    weather.loc[generator.rand(len(weather)) < 0.02, 'tmpf'] = 'M'
+    return weather
+
+
+if __name__ == '__main__':
+    make_weather(COLLISION_PATHS).to_csv(WEATHER_PATH, index=False)
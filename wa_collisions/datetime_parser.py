@@ -0,0 +1,130 @@
+"""
+Fast parsing of the date and time columns of the source data.
+
+The collision data holds times as MM/DD/YYYY HH:MM, with or without the
+time and the seconds and AM/PM, and dates as ISO YYYY-MM-DDT00:00:00.000Z.
+The ASOS weather data holds times as YYYY-MM-DD HH:MM. This file parses
+those formats with one regular expression per format, converting each
+distinct string only once, and splits times into calendar fields from
+their integer representation instead of one datetime accessor per
+field. Strings in other formats fall back to pandas.to_datetime.
+"""
+
+import numpy as np
+import pandas as pd
+
+# month/day/year with an optional hour, minute, second and AM/PM
+US_PATTERN = (r'^\s*(?P<month>\d{1,2})/(?P<day>\d{1,2})/(?P<year>\d{4})'
+              r'(?:\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?'
+              r'\s*(?P<ampm>[AaPp][Mm])?)?\s*$')
+
+# year-month-day with an optional time, fraction of second and Z. Times
+# are kept as written, so UTC times ending in Z are returned without
+# a timezone.
+ISO_PATTERN = (r'^\s*(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+               r'(?:[T ](?P<hour>\d{2}):(?P<minute>\d{2})(?::(?P<second>\d{2})(?:\.\d+)?)?)?'
+               r'Z?\s*$')
+
+CALENDAR_FIELDS = ['year', 'month', 'day', 'hour', 'minute', 'second']
+
+_NANOSECONDS_PER_DAY = 86400 * 10 ** 9
+_NAT = np.iinfo(np.int64).min
+
+
+def parse_datetimes(values):
+    """
+    Parses dates and times, converting each distinct string once.
+
+    Args:
+        values (array like): strings in one of the known formats, or
+            missing values
+
+    Returns:
+        numpy datetime64[ns] array, NaT where a value is missing
+
+    Raises:
+        ValueError: if a value is in no known format and pandas can't
+            parse it
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    parsed = np.full(len(uniques), _NAT, dtype=np.int64).view('datetime64[ns]')
+
+    todo = pd.Series(uniques, dtype=object).astype(str)
+    remaining = np.ones(len(uniques), dtype=bool)
+    for pattern in [US_PATTERN, ISO_PATTERN]:
+        if not remaining.any():
+            break
+        fields = todo[remaining].str.extract(pattern, expand=True)
+        matched = fields['year'].notnull().values
+        positions = np.flatnonzero(remaining)[matched]
+        parsed[positions] = _assemble(fields[matched])
+        remaining[positions] = False
+
+    if remaining.any():
+        parsed[remaining] = pd.to_datetime(todo[remaining]).values
+
+    times = np.full(len(codes), _NAT, dtype=np.int64).view('datetime64[ns]')
+    found = codes >= 0
+    times[found] = parsed[codes[found]]
+    return times
+
+
+def calendar_fields(times):
+    """
+    Splits times into calendar fields with integer arithmetic.
+
+    Args:
+        times (array like): datetime64 values
+
+    Returns:
+        dictionary of year, month, day, hour, minute and second arrays.
+        The arrays are int64, or float64 with NaN for missing times.
+    """
+    nanoseconds = np.asarray(times, dtype='datetime64[ns]').view(np.int64)
+    missing = nanoseconds == _NAT
+    days, of_day = np.divmod(nanoseconds, _NANOSECONDS_PER_DAY)
+    seconds = of_day // 10 ** 9
+
+    # days since 1970-01-01 to the proleptic Gregorian calendar, counting
+    # years from March so that leap days end the year
+    shifted = days + 719468
+    era = shifted // 146097
+    day_of_era = shifted - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524
+                   - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month_index = (5 * day_of_year + 2) // 153
+    month = np.where(month_index < 10, month_index + 3, month_index - 9)
+
+    fields = {
+        'year': year_of_era + era * 400 + (month <= 2),
+        'month': month,
+        'day': day_of_year - (153 * month_index + 2) // 5 + 1,
+        'hour': seconds // 3600,
+        'minute': seconds // 60 % 60,
+        'second': seconds % 60}
+
+    if missing.any():
+        for field in CALENDAR_FIELDS:
+            fields[field] = fields[field].astype(float)
+            fields[field][missing] = np.nan
+    return fields
+
+
+def _assemble(fields):
+    if fields.shape[0] == 0:
+        return np.array([], dtype='datetime64[ns]')
+
+    hour = fields['hour'].fillna(0).astype(np.int64).values
+    if 'ampm' in fields:
+        ampm = fields['ampm'].fillna('').str.upper().values
+        hour = np.where(ampm == 'PM', hour % 12 + 12, np.where(ampm == 'AM', hour % 12, hour))
+
+    parts = pd.DataFrame({
+        'year': fields['year'].astype(np.int64).values,
+        'month': fields['month'].astype(np.int64).values,
+        'day': fields['day'].astype(np.int64).values,
+        'hour': hour,
+        'minute': fields['minute'].fillna(0).astype(np.int64).values,
+        'second': fields['second'].fillna(0).astype(np.int64).values})
+    return pd.to_datetime(parts).values
@@ -0,0 +1,110 @@
+"""
+On-disk cache of cleaned and integrated dataframes.
+
+This file writes the frames built from the raw collision, weather and
+neighborhood files to Parquet, named after a fingerprint of the source
+files and of the arguments they were built with. Later calls with the
+same inputs read the columns back instead of parsing and cleaning the
+CSV files again, and a new file is built as soon as a source file or an
+argument changes.
+
+Parquet needs the pyarrow package.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pandas as pd
+
+# version of the frames written, part of every fingerprint. Increase it
+# when a change to the cleaning code makes the cached frames stale.
+CACHE_VERSION = 2
+
+
+def source_fingerprint(sources, arguments=None):
+    """
+    Returns a fingerprint of source files and the arguments used to
+    build a frame from them.
+
+    The files are identified by their absolute path, size and time of
+    last modification, so the fingerprint is cheap even for large files.
+
+    Args:
+        sources (list): paths of the files the frame is built from
+        arguments (dict): arguments the frame is built with. The values
+            must be serializable to JSON.
+
+    Returns:
+        hex digest of the sources and arguments
+
+    Raises:
+        ValueError: if a source file doesn't exist
+    """
+    described = []
+    for source in sources:
+        if not os.path.exists(source):
+            raise ValueError("file doesn't exist: " + str(source))
+        status = os.stat(source)
+        described.append([os.path.abspath(source), status.st_size, status.st_mtime_ns])
+
+    key = json.dumps({'version': CACHE_VERSION, 'sources': described,
+                      'arguments': arguments or {}}, sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def cached_frame(cache_folder, name, sources, arguments, build, replace=True):
+    """
+    Returns the frame built from the sources, reading it from the cache
+    folder when it was already built from the same inputs.
+
+    A frame which has to be built is written to the cache folder and,
+    unless replace is false, the frames built under the same name from
+    other inputs are removed.
+
+    Args:
+        cache_folder (string): folder holding the cached frames, created
+            when it doesn't exist
+        name (string): name of the frame, the first part of its file name
+        sources (list): paths of the files the frame is built from
+        arguments (dict): arguments the frame is built with
+        build (function): called without arguments to build the frame
+        replace (bool): whether to remove the frames built under the same
+            name from other inputs
+
+    Returns:
+        the pandas dataframe
+
+    Raises:
+        ValueError: if a source file doesn't exist
+    """
+    path = cached_frame_path(cache_folder, name, source_fingerprint(sources, arguments))
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    frame = build().reset_index(drop=True)
+    if not os.path.exists(cache_folder):
+        os.makedirs(cache_folder)
+    if replace:
+        for stale in glob.glob(cached_frame_path(cache_folder, name, '*')):
+            os.remove(stale)
+
+    temporary_path = path + '.tmp'
+    frame.to_parquet(temporary_path)
+    os.replace(temporary_path, path)
+    return frame
+
+
+def cached_frame_path(cache_folder, name, fingerprint):
+    """
+    Returns the path of a cached frame.
+
+    Args:
+        cache_folder (string): folder holding the cached frames
+        name (string): name of the frame
+        fingerprint (string): fingerprint returned by source_fingerprint
+
+    Returns:
+        path of the Parquet file
+    """
+    return os.path.join(cache_folder, '{0}-{1}.parquet'.format(name, fingerprint))
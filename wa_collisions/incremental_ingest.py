@@ -0,0 +1,232 @@
+"""
+Incremental ingest of the SDOT collision data.
+
+SDOT publishes the collision data as a single file which grows every
+day. This file keeps a partitioned store of the cleaned, neighborhood
+labelled collisions up to date with that file. It remembers a digest of
+the raw record of every collision already ingested and the latest
+incident time seen, so each run only cleans, labels and writes the
+collisions which are new or were updated since the last run. Known
+collisions which happened well before the latest incident time are
+assumed to be final and are not compared again, so the cost of finding
+the changes follows the recent collisions rather than the whole history.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from wa_collisions.datetime_parser import parse_datetimes
+from wa_collisions.neighborhood_reader import assign_neighborhood
+from wa_collisions.partitioned_store import upsert_partitioned_collisions
+from wa_collisions.read_clean_integrate_data import clean_collision_data
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+# file of the ingest state, kept in the store folder
+STATE_NAME = '_ingest_state.npz'
+
+# columns identifying a collision, the first one found in the data is used
+INGEST_KEY_COLUMNS = ['inckey', 'reportno']
+
+# days before the latest incident time in which known collisions are
+# still compared with the file, to catch late edits of the reports
+DEFAULT_LOOK_BACK_DAYS = 90
+
+
+class IngestState(object):
+    """
+    Collisions already ingested into a store.
+
+    Attributes:
+        collisions (pandas dataframe): key, digest of the raw record,
+            year and month of each ingested collision
+        high_water (pandas timestamp): latest incident time ingested, or
+            None before the first run
+    """
+
+    def __init__(self, collisions=None, high_water=None):
+        """
+        Wraps the ingest state, see load_ingest_state.
+
+        Args:
+            collisions (pandas dataframe): columns key, digest, year
+                and month
+            high_water (pandas timestamp): latest incident time ingested
+        """
+        if collisions is None:
+            collisions = pd.DataFrame({'key': [], 'digest': np.array([], dtype=np.uint64),
+                                       'year': [], 'month': []})
+        self.collisions = collisions
+        self.high_water = high_water
+
+    def save(self, path):
+        """
+        Writes the state to a numpy .npz file, replacing the file only
+        once it is completely written.
+
+        Args:
+            path (string): path of the state file
+        """
+        keys = self.collisions['key'].values
+        if keys.dtype == object:
+            keys = keys.astype(str)
+        high_water = '' if self.high_water is None else self.high_water.isoformat()
+
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as state_file:
+            np.savez(state_file, key=keys, high_water=np.array(high_water),
+                     digest=self.collisions['digest'].values.astype(np.uint64),
+                     year=self.collisions['year'].values.astype(np.int64),
+                     month=self.collisions['month'].values.astype(np.int64))
+        os.replace(temporary_path, path)
+
+
+def load_ingest_state(path):
+    """
+    Loads a state saved by IngestState.save.
+
+    Args:
+        path (string): path of the state file
+
+    Returns:
+        the IngestState loaded, empty when the file doesn't exist
+    """
+    if not os.path.exists(path):
+        return IngestState()
+
+    with np.load(path) as saved:
+        collisions = pd.DataFrame({'key': saved['key'], 'digest': saved['digest'],
+                                   'year': saved['year'], 'month': saved['month']})
+        high_water = str(saved['high_water'])
+    return IngestState(collisions, pd.Timestamp(high_water) if high_water else None)
+
+
+def ingest_collisions(collision_data_file_path, store_folder, geo_json_path=None,
+                      workers=1, cache_path=None, look_back_days=DEFAULT_LOOK_BACK_DAYS):
+    """
+    Adds the new and updated collisions of the collision file to a
+    partitioned store of cleaned collisions with neighborhoods.
+
+    The whole file is read with the projected schema, but only the
+    collisions with an unknown key, or which happened or were stored
+    within look_back_days of the high water incident time, are hashed
+    and compared with the state. Only the changed collisions are then
+    cleaned, labelled and written, and only the partitions of their
+    months are rewritten.
+
+    Args:
+        collision_data_file_path: file path to the collision dataset
+        store_folder: folder of the partitioned store, created on the
+            first run
+        geo_json_path: path to the GeoJSON file that contains neighborhood data
+        workers: number of processes used to assign the neighborhoods
+        cache_path: path of the neighborhood assignment cache
+        look_back_days: days before the high water incident time in which
+            known collisions are compared again. Edits of older collisions
+            are not picked up. None compares every collision.
+
+    Returns:
+        dictionary with the number of 'new' and 'updated' collisions
+        ingested, the number of collisions 'compared', the number of
+        changed collisions with a location left out of the store for
+        their 'missing_time' and the 'high_water' incident time of
+        the store
+
+    Raises:
+        ValueError: raises this error when the collision file path does not exist
+        ValueError: raises this error when the collision data has no key column
+        ValueError: raises this error when look_back_days is negative
+    """
+    if look_back_days is not None and look_back_days < 0:
+        raise ValueError("look_back_days must be None or positive, got {0}".format(
+            look_back_days))
+
+    raw = read_collision_data(collision_data_file_path)
+    raw.columns = [column.lower() for column in raw.columns]
+    keys = [column for column in INGEST_KEY_COLUMNS if column in raw.columns]
+    if not keys:
+        raise ValueError("collision data has none of the key columns {0}".format(
+            INGEST_KEY_COLUMNS))
+    key_column = keys[0]
+
+    # the last record of a key in the file is the current one
+    raw = raw.drop_duplicates(key_column, keep='last')
+
+    state_path = os.path.join(store_folder, STATE_NAME)
+    state = load_ingest_state(state_path)
+    known = pd.Index(state.collisions['key'].values).get_indexer(raw[key_column].values)
+    is_new = known < 0
+
+    # only the new and the recent collisions are hashed and compared
+    compared = _recent_collisions(raw, state, known, look_back_days) | is_new
+    digests = np.zeros(len(raw), dtype=np.uint64)
+    digests[compared] = pd.util.hash_pandas_object(raw[compared], index=False).values
+    is_updated = np.zeros(len(raw), dtype=bool)
+    old = compared & ~is_new
+    is_updated[old] = state.collisions['digest'].values[known[old]] != digests[old]
+    changed = is_new | is_updated
+    summary = {'new': int(is_new.sum()), 'updated': int(is_updated.sum()),
+               'compared': int(compared.sum()), 'missing_time': 0,
+               'high_water': state.high_water}
+    if not changed.any():
+        return summary
+
+    data = clean_collision_data(raw[changed].copy())
+    if data.shape[0]:
+        data = assign_neighborhood(data, geo_json_path, workers, cache_path=cache_path)
+
+    # collisions without a time have no partition, they are left out of
+    # the store like the ones without a location
+    missing_time = data['year'].isnull().values
+    summary['missing_time'] = int(missing_time.sum())
+    data = data[~missing_time]
+
+    # updated collisions may have moved out of the month they were stored in
+    previous = state.collisions.iloc[known[is_updated]]
+    previous = previous[previous['year'] >= 0]
+    stale = set(zip(previous['year'].astype(int), previous['month'].astype(int)))
+    if not os.path.exists(store_folder):
+        os.makedirs(store_folder)
+    upsert_partitioned_collisions(data, store_folder, key_column, stale,
+                                  removed_keys=raw[key_column].values[changed])
+
+    # collisions without a location are dropped by the cleaning, they and
+    # the ones without a time are remembered with month -1 so they are
+    # not cleaned again
+    changed_keys = raw[key_column].values[changed]
+    located = pd.Index(data[key_column].values).get_indexer(changed_keys)
+    years = np.full(len(changed_keys), -1, dtype=np.int64)
+    months = np.full(len(changed_keys), -1, dtype=np.int64)
+    years[located >= 0] = data['year'].values[located[located >= 0]]
+    months[located >= 0] = data['month'].values[located[located >= 0]]
+    entries = pd.DataFrame({'key': changed_keys, 'digest': digests[changed],
+                            'year': years, 'month': months})
+    state.collisions = pd.concat([state.collisions, entries], ignore_index=True) \
+        .drop_duplicates('key', keep='last').reset_index(drop=True)
+    if data.shape[0]:
+        latest = data['time'].max()
+        if state.high_water is None or latest > state.high_water:
+            state.high_water = latest
+    state.save(state_path)
+
+    summary['high_water'] = state.high_water
+    return summary
+
+
+def _recent_collisions(raw, state, known, look_back_days):
+    """
+    Returns which known collisions are within the look back window, by
+    the incident time in the file or by the month they were stored in.
+    """
+    if look_back_days is None or state.high_water is None or 'incdttm' not in raw.columns:
+        return np.ones(len(raw), dtype=bool)
+
+    cutoff = state.high_water - pd.Timedelta(days=look_back_days)
+    times = parse_datetimes(raw['incdttm'].values)
+    recent = np.isnat(times) | (times >= np.datetime64(cutoff))
+
+    # collisions moved out of the window since they were stored
+    stored_months = state.collisions['year'].values * 12 + state.collisions['month'].values
+    stored = known >= 0
+    recent[stored] |= stored_months[known[stored]] >= cutoff.year * 12 + cutoff.month
+    return recent
@@ -0,0 +1,206 @@
+"""
+Precomputed grid lookup over the Seattle neighborhood polygons.
+
+This file rasterizes the bounding box of the neighborhoods into square
+cells. Cells which lie inside a single neighborhood resolve a location
+with one array lookup, and only the cells crossed by a neighborhood
+boundary fall back to the exact test of a NeighborhoodIndex.
+"""
+
+import os
+import numpy as np
+from shapely.geometry import box
+from shapely.prepared import prep
+from wa_collisions.assignment_cache import layer_fingerprint
+
+# size of a grid cell in degrees, roughly 100 meters in Seattle
+DEFAULT_CELL_SIZE = 0.001
+
+# cell codes which do not point to a neighborhood
+OUTSIDE_CELL = -1
+BOUNDARY_CELL = -2
+
+
+class NeighborhoodGrid(object):
+    """
+    Grid of cells over a NeighborhoodIndex.
+
+    Each cell holds the position of the neighborhood containing the
+    whole cell, OUTSIDE_CELL when no neighborhood touches it, or
+    BOUNDARY_CELL when the locations in it need the exact test.
+
+    Attributes:
+        index (NeighborhoodIndex): index used for boundary cells
+        codes (numpy array): code of each cell, by row (Y) and column (X)
+        origin (numpy array): minimum X and Y of the grid
+        cell_size (float): width and height of a cell in degrees
+    """
+
+    def __init__(self, index, codes, origin, cell_size):
+        """
+        Wraps precomputed cell codes, see build_neighborhood_grid.
+
+        Args:
+            index (NeighborhoodIndex): index the codes were built from
+            codes (numpy array): code of each cell
+            origin (array like): minimum X and Y of the grid
+            cell_size (float): width and height of a cell in degrees
+        """
+        self.index = index
+        self.codes = np.asarray(codes)
+        self.origin = np.asarray(origin, dtype=float)
+        self.cell_size = float(cell_size)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def boundary_fraction(self):
+        """
+        Fraction of the cells that fall back to the exact test.
+        """
+        return float(np.mean(self.codes == BOUNDARY_CELL))
+
+    def query(self, latitudes, longitudes):
+        """
+        Returns the position of the neighborhood containing each
+        location, the same as NeighborhoodIndex.query.
+
+        Args:
+            latitudes (array like): first coordinate of the locations
+            longitudes (array like): second coordinate of the locations
+
+        Returns:
+            positions (numpy array): position of the neighborhood for
+            each location. Contains -1 if the location is not in any
+            neighborhood.
+
+        Raises:
+            ValueError: if the coordinates can't be converted into float
+            ValueError: if latitudes and longitudes differ in length
+        """
+        x = np.asarray(latitudes, dtype=float).ravel()
+        y = np.asarray(longitudes, dtype=float).ravel()
+        if len(x) != len(y):
+            raise ValueError("latitudes and longitudes must have the same length")
+
+        rows, cols = self.codes.shape
+        with np.errstate(invalid='ignore'):
+            col = np.floor((x - self.origin[0]) / self.cell_size)
+            row = np.floor((y - self.origin[1]) / self.cell_size)
+            on_grid = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+
+        positions = np.full(len(x), OUTSIDE_CELL, dtype=np.intp)
+        positions[on_grid] = self.codes[row[on_grid].astype(np.intp),
+                                        col[on_grid].astype(np.intp)]
+
+        boundary = np.flatnonzero(positions == BOUNDARY_CELL)
+        if len(boundary):
+            positions[boundary] = self.index.query(x[boundary], y[boundary])
+        return positions
+
+    def labels(self, positions):
+        """
+        Returns the Object ID, S_HOOD and L_HOOD for positions returned
+        by query, see NeighborhoodIndex.labels.
+        """
+        return self.index.labels(positions)
+
+
+def build_neighborhood_grid(index, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Rasterizes the neighborhoods of an index into a grid of cells.
+
+    A cell is assigned to a neighborhood only when it lies strictly
+    inside that neighborhood and touches no other one, so every
+    location in it gets the same answer as the exact test.
+
+    Args:
+        index (NeighborhoodIndex): index over the neighborhoods
+        cell_size (float): width and height of a cell in degrees.
+            Smaller cells leave fewer locations to the exact test
+            but take longer to build and more memory.
+
+    Returns:
+        the NeighborhoodGrid built
+
+    Raises:
+        ValueError: if cell_size is not a positive number
+    """
+    if not isinstance(cell_size, (int, float)) or cell_size <= 0:
+        raise ValueError("cell_size must be a positive number, got {0}".format(cell_size))
+
+    origin = index.bounds[:, :2].min(axis=0)
+    extent = index.bounds[:, 2:].max(axis=0)
+    cols, rows = np.maximum(np.ceil((extent - origin) / cell_size), 1).astype(int)
+
+    hits = np.zeros((rows, cols), dtype=np.int32)
+    inside = np.full((rows, cols), OUTSIDE_CELL, dtype=np.int32)
+    for i, geometry in enumerate(index.geometries):
+        prepared = prep(geometry)
+        minx, miny, maxx, maxy = index.bounds[i]
+        first_col, last_col = _cell_range(minx, maxx, origin[0], cell_size, cols)
+        first_row, last_row = _cell_range(miny, maxy, origin[1], cell_size, rows)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                cell = box(origin[0] + col * cell_size, origin[1] + row * cell_size,
+                           origin[0] + (col + 1) * cell_size,
+                           origin[1] + (row + 1) * cell_size)
+                if not prepared.intersects(cell):
+                    continue
+                hits[row, col] += 1
+                if prepared.contains_properly(cell):
+                    inside[row, col] = i
+
+    codes = np.where(hits == 0, OUTSIDE_CELL,
+                     np.where((hits == 1) & (inside >= 0), inside, BOUNDARY_CELL))
+    dtype = np.int16 if len(index) < np.iinfo(np.int16).max else np.int32
+    return NeighborhoodGrid(index, codes.astype(dtype), origin, cell_size)
+
+
+def save_neighborhood_grid(grid, path):
+    """
+    Saves the cells of a grid to a numpy .npz file, with the fingerprint
+    of the neighborhoods it was built from.
+
+    Args:
+        grid (NeighborhoodGrid): grid to save
+        path (string): path of the file to write
+    """
+    np.savez_compressed(path, codes=grid.codes, origin=grid.origin,
+                        cell_size=grid.cell_size,
+                        fingerprint=layer_fingerprint(grid.index))
+
+
+def load_neighborhood_grid(path, index):
+    """
+    Loads a grid saved by save_neighborhood_grid.
+
+    Args:
+        path (string): path to the .npz file
+        index (NeighborhoodIndex): index over the same neighborhoods
+            the grid was built from
+
+    Returns:
+        the NeighborhoodGrid loaded
+
+    Raises:
+        ValueError: if the file doesn't exist
+        ValueError: if the grid was built from other neighborhoods,
+            including the same ids with other names or polygons
+    """
+    if not os.path.exists(path):
+        raise ValueError("grid file doesn't exist: " + str(path))
+
+    with np.load(path) as saved:
+        if 'fingerprint' not in saved.files or \
+                str(saved['fingerprint']) != layer_fingerprint(index):
+            raise ValueError("grid {0} was built from different neighborhoods".format(path))
+        return NeighborhoodGrid(index, saved['codes'], saved['origin'],
+                                float(saved['cell_size']))
+
+
+def _cell_range(low, high, origin, cell_size, count):
+    first = int(np.floor((low - origin) / cell_size))
+    last = int(np.floor((high - origin) / cell_size))
+    return max(first, 0), min(last, count - 1)
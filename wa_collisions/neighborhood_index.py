@@ -0,0 +1,415 @@
+"""
+Spatial index over the Seattle neighborhood polygons.
+
+This file builds a bounding box index over the neighborhood polygons,
+or any other polygon layer, once and resolves whole arrays of locations
+to polygons, instead of testing every location against every polygon
+one at a time.
+"""
+
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+try:
+    from shapely import contains_xy
+except ImportError:
+    from shapely.vectorized import contains as contains_xy
+
+# number of chunks handed to each worker, so that slow chunks
+# (dense downtown areas) do not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+# index set in each worker process by _init_worker
+_WORKER_INDEX = None
+
+
+class PolygonIndex(object):
+    """
+    Bounding box index over a list of polygons.
+
+    The locations of a query are sorted by X once, so each polygon only
+    looks at the slice of locations that falls inside its bounding box.
+    Only those candidates are passed to the exact containment test.
+
+    Attributes:
+        geometries (list): the polygons in their original order
+        bounds (numpy array): minx, miny, maxx and maxy of each polygon
+    """
+
+    def __init__(self, geometries):
+        """
+        Builds the index from a list of polygons.
+
+        Args:
+            geometries (list): shapely polygons or multipolygons
+        """
+        self.geometries = list(geometries)
+        self.bounds = np.array(
+            [geometry.bounds for geometry in self.geometries],
+            dtype=float).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def query(self, latitudes, longitudes):
+        """
+        Returns the position in the index of the polygon containing
+        each location, in the same argument order as get_neighborhood.
+
+        When a location lies in several polygons the first one in
+        order wins, the same as a sequential scan.
+
+        Args:
+            latitudes (array like): first coordinate of the locations
+            longitudes (array like): second coordinate of the locations
+
+        Returns:
+            positions (numpy array): position of the polygon for
+            each location. Contains -1 if the location is not in any
+            polygon.
+
+        Raises:
+            ValueError: if the coordinates can't be converted into float
+            ValueError: if latitudes and longitudes differ in length
+        """
+        x, y = _coordinates(latitudes, longitudes)
+        return self.query_sorted(x, y, *_sort_by_x(x, y))
+
+    def query_sorted(self, x, y, order, sorted_x, sorted_y):
+        """
+        Runs query on locations which are already sorted by X, so that
+        several indexes can share one sort of the same locations.
+
+        Args:
+            x (numpy array): first coordinate of the locations
+            y (numpy array): second coordinate of the locations
+            order (numpy array): positions of the locations sorted by x
+            sorted_x (numpy array): x in sorted order
+            sorted_y (numpy array): y in sorted order
+
+        Returns:
+            positions (numpy array): see query
+        """
+        positions = np.full(len(x), -1, dtype=np.intp)
+        if len(x) == 0:
+            return positions
+
+        for i, geometry in enumerate(self.geometries):
+            minx, miny, maxx, maxy = self.bounds[i]
+            start = np.searchsorted(sorted_x, minx, side='left')
+            stop = np.searchsorted(sorted_x, maxx, side='right')
+            window_y = sorted_y[start:stop]
+            candidates = order[start:stop][(window_y >= miny) & (window_y <= maxy)]
+            candidates = candidates[positions[candidates] < 0]
+            if len(candidates) == 0:
+                continue
+            inside = contains_xy(geometry, x[candidates], y[candidates])
+            positions[candidates[inside]] = i
+        return positions
+
+
+class NeighborhoodIndex(PolygonIndex):
+    """
+    Bounding box index over a frame of neighborhood polygons.
+
+    Attributes:
+        geometries (list): the neighborhood polygons in frame order
+        object_ids (numpy array): OBJECTID of each polygon, in the
+            smallest integer type which also holds -1
+        s_hoods (numpy array): S_HOOD of each polygon
+        l_hoods (numpy array): L_HOOD of each polygon
+        bounds (numpy array): minx, miny, maxx and maxy of each polygon
+    """
+
+    def __init__(self, neighborhoods):
+        """
+        Builds the index from a frame of neighborhoods.
+
+        Args:
+            neighborhoods (geopandas dataframe): neighborhoods with the
+                columns geometry, OBJECTID, S_HOOD and L_HOOD
+        """
+        super(NeighborhoodIndex, self).__init__(neighborhoods['geometry'])
+        self.object_ids = np.asarray(neighborhoods['OBJECTID'])
+        self.object_ids = self.object_ids.astype(compact_int_dtype(self.object_ids))
+        self.s_hoods = np.asarray(neighborhoods['S_HOOD'], dtype=object)
+        self.l_hoods = np.asarray(neighborhoods['L_HOOD'], dtype=object)
+        self._s_hood_codes, self._s_hood_names = pd.factorize(self.s_hoods, sort=True)
+        self._l_hood_codes, self._l_hood_names = pd.factorize(self.l_hoods, sort=True)
+
+    def labels(self, positions):
+        """
+        Returns the Object ID, S_HOOD and L_HOOD for positions returned
+        by query. The names are built straight from integer codes, so no
+        python object is created per location.
+
+        Args:
+            positions (numpy array): positions returned by query
+
+        Returns:
+            object_ids (numpy array): object id of the neighborhood, -1
+            for positions that are not in any neighborhood.
+            s_hoods (pandas categorical): small neighborhood names, NaN
+            for positions that are not in any neighborhood.
+            l_hoods (pandas categorical): large neighborhood names, NaN
+            for positions that are not in any neighborhood.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        found = positions >= 0
+        object_ids = np.full(len(positions), -1, dtype=self.object_ids.dtype)
+        object_ids[found] = self.object_ids[positions[found]]
+        s_codes = np.where(found, self._s_hood_codes[positions], -1)
+        l_codes = np.where(found, self._l_hood_codes[positions], -1)
+        s_hoods = pd.Categorical.from_codes(s_codes, self._s_hood_names)
+        l_hoods = pd.Categorical.from_codes(l_codes, self._l_hood_names)
+        return object_ids, s_hoods, l_hoods
+
+
+class MultiLayerIndex(object):
+    """
+    Several polygon indexes queried together.
+
+    The locations are sorted once and every layer reuses that sort to
+    prune its candidates, so labelling against several layers costs one
+    pass over the locations instead of one pass per layer.
+
+    Attributes:
+        indexes (list): the PolygonIndex of each layer
+    """
+
+    def __init__(self, indexes):
+        """
+        Args:
+            indexes (list): PolygonIndex of each layer
+        """
+        self.indexes = list(indexes)
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def query(self, latitudes, longitudes):
+        """
+        Returns the position of the polygon containing each location
+        in every layer.
+
+        Args:
+            latitudes (array like): first coordinate of the locations
+            longitudes (array like): second coordinate of the locations
+
+        Returns:
+            positions (numpy array): one row per location and one
+            column per layer, see PolygonIndex.query.
+
+        Raises:
+            ValueError: if the coordinates can't be converted into float
+            ValueError: if latitudes and longitudes differ in length
+        """
+        x, y = _coordinates(latitudes, longitudes)
+        positions = np.full((len(x), len(self.indexes)), -1, dtype=np.intp)
+        if len(x) == 0:
+            return positions
+
+        order, sorted_x, sorted_y = _sort_by_x(x, y)
+        for i, index in enumerate(self.indexes):
+            positions[:, i] = index.query_sorted(x, y, order, sorted_x, sorted_y)
+        return positions
+
+
+class UniqueLocations(object):
+    """
+    Unique coordinate pairs of a set of locations.
+
+    Collisions are geocoded to intersections and block faces, so many
+    of them share the exact same coordinates. The pairs are factorized
+    so that each distinct location is tested only once, and results are
+    broadcast back to every row through the inverse codes.
+
+    Attributes:
+        latitudes (numpy array): first coordinate of each unique pair
+        longitudes (numpy array): second coordinate of each unique pair
+        inverse (numpy array): position of each location in the unique
+            pairs. Contains -1 for locations with a missing coordinate.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        """
+        Factorizes the coordinate pairs of the locations.
+
+        Args:
+            latitudes (array like): first coordinate of the locations
+            longitudes (array like): second coordinate of the locations
+
+        Raises:
+            ValueError: if the coordinates can't be converted into float
+            ValueError: if latitudes and longitudes differ in length
+        """
+        x, y = _coordinates(latitudes, longitudes)
+        x_codes, x_values = pd.factorize(x)
+        y_codes, y_values = pd.factorize(y)
+        width = max(len(y_values), 1)
+        valid = (x_codes >= 0) & (y_codes >= 0)
+        pair_codes, pairs = pd.factorize(
+            x_codes[valid].astype(np.int64) * width + y_codes[valid])
+        pairs = np.asarray(pairs, dtype=np.int64)
+
+        self.latitudes = np.asarray(x_values, dtype=float)[pairs // width]
+        self.longitudes = np.asarray(y_values, dtype=float)[pairs % width]
+        self.inverse = np.full(len(x), -1, dtype=np.intp)
+        self.inverse[valid] = pair_codes
+
+    def __len__(self):
+        return len(self.inverse)
+
+    @property
+    def unique_count(self):
+        """
+        Number of distinct coordinate pairs, which is the number of
+        locations that actually go through the containment test.
+        """
+        return len(self.latitudes)
+
+    @property
+    def tests_saved(self):
+        """
+        Number of locations that do not need their own containment
+        test, either because they repeat an earlier coordinate pair
+        or because a coordinate is missing.
+        """
+        return len(self) - self.unique_count
+
+    def broadcast(self, values, missing=-1):
+        """
+        Returns values computed for the unique pairs, expanded back
+        to one value per location.
+
+        Args:
+            values (numpy array): one value, or one row of values, per
+                unique pair
+            missing: value used for locations with a missing coordinate
+
+        Returns:
+            numpy array with one value, or one row, per location
+        """
+        values = np.asarray(values)
+        result = np.full((len(self),) + values.shape[1:], missing, dtype=values.dtype)
+        found = self.inverse >= 0
+        result[found] = values[self.inverse[found]]
+        return result
+
+
+def query_unique(index, latitudes, longitudes, workers=1):
+    """
+    Runs the query of an index on the unique coordinate pairs of the
+    locations only, and broadcasts the positions back to every location.
+
+    Args:
+        index (PolygonIndex, NeighborhoodGrid or MultiLayerIndex):
+            index to query
+        latitudes (array like): first coordinate of the locations
+        longitudes (array like): second coordinate of the locations
+        workers (int): number of processes to use
+
+    Returns:
+        positions (numpy array): the same positions as index.query
+        locations (UniqueLocations): the unique coordinate pairs, which
+        report how many containment tests were saved
+
+    Raises:
+        ValueError: if workers is not a positive int
+        ValueError: if the coordinates can't be converted into float
+        ValueError: if latitudes and longitudes differ in length
+    """
+    locations = UniqueLocations(latitudes, longitudes)
+    positions = query_in_parallel(
+        index, locations.latitudes, locations.longitudes, workers)
+    return locations.broadcast(positions), locations
+
+
+def query_in_parallel(index, latitudes, longitudes, workers):
+    """
+    Runs the query of an index over a pool of processes.
+
+    The locations are split into chunks, the index is sent to each
+    worker once through the pool initializer, and the positions are
+    stitched back together in the original order.
+
+    Args:
+        index (PolygonIndex, NeighborhoodGrid or MultiLayerIndex):
+            index to query
+        latitudes (array like): first coordinate of the locations
+        longitudes (array like): second coordinate of the locations
+        workers (int): number of processes to use
+
+    Returns:
+        positions (numpy array): the same positions as index.query
+
+    Raises:
+        ValueError: if workers is not a positive int
+        ValueError: if the coordinates can't be converted into float
+        ValueError: if latitudes and longitudes differ in length
+    """
+    _check_workers(workers)
+    x, y = _coordinates(latitudes, longitudes)
+
+    chunk_count = min(len(x), workers * CHUNKS_PER_WORKER)
+    if workers == 1 or chunk_count <= 1:
+        return index.query(x, y)
+
+    chunks = zip(np.array_split(x, chunk_count), np.array_split(y, chunk_count))
+    pool = Pool(workers, initializer=_init_worker, initargs=(index,))
+    try:
+        positions = pool.map(_query_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    return np.concatenate(positions)
+
+
+def compact_int_dtype(values):
+    """
+    Returns the smallest signed integer type, int16 or wider, which
+    holds all the values and the -1 used for locations which are not
+    in any polygon.
+
+    Args:
+        values (numpy array): integer values
+
+    Returns:
+        numpy dtype
+    """
+    values = np.asarray(values)
+    low = min(values.min(), -1) if len(values) else -1
+    high = values.max() if len(values) else 0
+    for dtype in [np.int16, np.int32]:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _coordinates(latitudes, longitudes):
+    x = np.asarray(latitudes, dtype=float).ravel()
+    y = np.asarray(longitudes, dtype=float).ravel()
+    if len(x) != len(y):
+        raise ValueError("latitudes and longitudes must have the same length")
+    return x, y
+
+
+def _sort_by_x(x, y):
+    order = np.argsort(x, kind='mergesort')
+    return order, x[order], y[order]
+
+
+def _check_workers(workers):
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        raise ValueError("workers must be a positive int, got {0}".format(workers))
+
+
+def _init_worker(index):
+    global _WORKER_INDEX # pylint: disable=global-statement
+    _WORKER_INDEX = index
+
+
+def _query_chunk(chunk):
+    return _WORKER_INDEX.query(chunk[0], chunk[1])
@@ -7,12 +7,39 @@ given a dataframe containing latitudes and longitudes, assigns
 Seattle neighbourhoods to them
 """
 
+import json
+import os
 import numpy as np
-import geopandas as gpd
+import pandas as pd
 from shapely.geometry import Point
 
+from wa_collisions.assignment_cache import UNKNOWN_POSITION
+from wa_collisions.assignment_cache import layer_fingerprint
+from wa_collisions.assignment_cache import load_assignment_cache
+from wa_collisions.neighborhood_grid import NeighborhoodGrid
+from wa_collisions.neighborhood_index import MultiLayerIndex
+from wa_collisions.neighborhood_index import NeighborhoodIndex
+from wa_collisions.neighborhood_index import PolygonIndex
+from wa_collisions.neighborhood_index import compact_int_dtype
+from wa_collisions.neighborhood_index import query_unique
+from wa_collisions.neighborhood_registry import NeighborhoodRegistry
+from wa_collisions.neighborhood_store import read_neighborhood_store
+from wa_collisions.neighborhood_store import write_neighborhood_store
+
 DEFAULT_JSON_PATH = 'wa_collisions/data/Neighborhoods/Neighborhoods.json'
 
+# column identifying a collision in the assignment cache
+DEFAULT_KEY_COLUMN = 'inckey'
+
+# layer definition which gives the same columns as assign_neighborhood
+NEIGHBORHOOD_LAYER = {'path': DEFAULT_JSON_PATH,
+                      'columns': {'OBJECTID': 'object_id',
+                                  'S_HOOD': 's_hood',
+                                  'L_HOOD': 'l_hood'}}
+
+# layers already read in this process, by absolute path and kind of layer
+_LAYER_CACHE = {}
+
 def get_neighborhood(latitude, longitude, neighborhoods):
     """
     Returns the Object ID, S_HOOD and L_HOOD for the Seattle neighborhood for a
@@ -24,7 +51,9 @@ def get_neighborhood(latitude, longitude, neighborhoods):
     Args:
         latitude (float): latitude of the location
         longitude (float): longitude of the location
-        neighborhoods (geopandas dataframe): neighborhoods
+        neighborhoods (geopandas dataframe or NeighborhoodGrid):
+            neighborhoods. A NeighborhoodGrid resolves most locations
+            with a single array lookup.
 
     Returns:
         object_id (int): object id of the seattle
@@ -41,6 +70,14 @@ def get_neighborhood(latitude, longitude, neighborhoods):
         ValueError: if the latitude or longitude can't be
             converted into float
     """
+    if isinstance(neighborhoods, NeighborhoodGrid):
+        position = neighborhoods.query([float(latitude)], [float(longitude)])[0]
+        if position < 0:
+            return -1, None, None
+        index = neighborhoods.index
+        return index.object_ids[position], \
+               index.s_hoods[position], index.l_hoods[position]
+
     neighborhood_count = _find_neighborhood_count(neighborhoods)
 
     location_point = Point(float(latitude), float(longitude))
@@ -51,7 +88,55 @@ def get_neighborhood(latitude, longitude, neighborhoods):
     return -1, None, None
 
 
-def assign_neighborhood(dataframe, path=None):
+def get_neighborhoods(latitudes, longitudes, neighborhoods=None, path=None,
+                      return_stats=False):
+    """
+    Returns the Object IDs, S_HOODs and L_HOODs of the Seattle
+    neighborhoods for arrays of latitudes and longitudes.
+
+    This is the batch version of get_neighborhood and takes the
+    coordinates in the same order. The locations are resolved in one
+    pass through a NeighborhoodIndex, without creating a python object
+    per location, and repeated coordinates are only tested once.
+
+    Args:
+        latitudes (numpy array or pandas series): latitudes of the
+            locations
+        longitudes (numpy array or pandas series): longitudes of the
+            locations
+        neighborhoods (geopandas dataframe, NeighborhoodIndex or
+            NeighborhoodGrid): neighborhoods. Read from path if None.
+        path (string): path to the geojson file of neighborhoods, used
+            when neighborhoods is None.
+        return_stats (bool): whether to also return the number of
+            containment tests saved by the repeated coordinates.
+
+    Returns:
+        object_ids (numpy array): object ids of the seattle
+        neighborhoods. Contains -1 for locations which are not
+        in any Seattle neighborhood.
+        s_hoods (pandas categorical): small neighborhood names,
+        NaN for locations which are not in any Seattle neighborhood.
+        l_hoods (pandas categorical): large neighborhood names,
+        NaN for locations which are not in any Seattle neighborhood.
+        tests_saved (int): only when return_stats is True, number of
+        locations which didn't need their own containment test.
+
+    Raises:
+        ValueError: if the latitudes or longitudes can't be
+            converted into float
+        ValueError: if latitudes and longitudes differ in length
+    """
+    index = _neighborhood_index(neighborhoods, path)
+    positions, locations = query_unique(index, latitudes, longitudes)
+    if return_stats:
+        return index.labels(positions) + (locations.tests_saved,)
+    return index.labels(positions)
+
+
+def assign_neighborhood(dataframe, path=None, workers=1, grid=None,
+                        cache_path=None, key_column=DEFAULT_KEY_COLUMN,
+                        return_stats=False):
     """
     Returns the provided dataframe with additional columns
     object_id, which contains the object id of the seattle
@@ -59,57 +144,318 @@ def assign_neighborhood(dataframe, path=None):
     which contains the small neighborhood name and l_hood which
     contains the large neighborhood name
 
-    The dataframe must have columns X and Y for the location.
+    The dataframe must have columns X and Y for the location. All the
+    locations are resolved at once through a NeighborhoodIndex built
+    over the neighborhood polygons, and each distinct X and Y pair is
+    only tested once. With more than one worker the
+    locations are split into chunks which are resolved in a pool of
+    processes. With a cache_path, only the rows which are not in the
+    assignment cache are resolved, and the cache is updated with them.
 
     Args:
         dataframe(pandas dataframe): dataframe containing the
             locations in seattle. Must have columns X and Y
+        path(string): path to the geojson file of neighborhoods.
+        workers(int): number of processes used to resolve the
+            locations. Defaults to 1, which runs in this process.
+        grid(NeighborhoodGrid): precomputed grid used to resolve the
+            locations. When given, path is not read.
+        cache_path(string): path of the assignment cache file. The
+            cache is emptied when the neighborhoods used, from path or
+            from the grid, change.
+        key_column(string): column identifying each collision in the
+            cache, numeric or not. Rows are only cached by coordinate
+            when the dataframe doesn't have it.
+        return_stats (bool): whether to also return the number of
+            containment tests saved, by the repeated coordinates and
+            by the rows found in the cache.
 
     Returns:
         dataframe(pandas dataframe): the provided dataframe with an
             added column "object_id" containing the object id of the
             neighborhood in seattle the location is present in. If the
             location is in't any of the neighborhood, the column
-            contains the value -1.
+            contains the value -1. object_id is a small integer column
+            (int16 for the Seattle neighborhoods), and s_hood and l_hood
+            are categorical columns which are missing when the location
+            isn't in any neighborhood.
+        tests_saved(int): only when return_stats is True, number of
+            rows which didn't need their own containment test.
 
     Raises:
         ValueError: if the dataframe doesn't contain the columns
             X or Y.
         ValueError: if the X or Y can't be
             converted into float
+        ValueError: if workers is not a positive int
     """
     if not 'X' in dataframe.columns:
         raise ValueError("Dataframe doesn't have a column X")
     if not 'Y' in dataframe.columns:
         raise ValueError("Dataframe doesn't have a column Y")
 
-    neighborhoods = pull_neighborhoods_file(path)
-    object_ids = np.zeros(len(dataframe))
-    s_hoods = ["" for x in range(len(dataframe))]
-    l_hoods = ["" for x in range(len(dataframe))]
-    for i, _ in enumerate(object_ids):
-        object_ids[i], s_hoods[i], l_hoods[i] = get_neighborhood(
-            dataframe['X'][i], dataframe['Y'][i], neighborhoods)
+    if grid is None:
+        index = load_neighborhood_index(path)
+        lookup = index
+    else:
+        index = grid.index
+        lookup = grid
+    x_values = dataframe['X'].values
+    y_values = dataframe['Y'].values
+    if cache_path is None:
+        positions, locations = query_unique(lookup, x_values, y_values, workers)
+        tested = locations.unique_count
+    else:
+        keys = None
+        if key_column in dataframe.columns:
+            keys = dataframe[key_column].values
+        cache = load_assignment_cache(cache_path, layer_fingerprint(index))
+        positions = cache.lookup(x_values, y_values, keys)
+        missing = np.flatnonzero(positions == UNKNOWN_POSITION)
+        tested = 0
+        if len(missing):
+            positions[missing], locations = query_unique(
+                lookup, x_values[missing], y_values[missing], workers)
+            tested = locations.unique_count
+            cache.update(x_values, y_values, positions, keys)
+            cache.save(cache_path)
 
+    object_ids, s_hoods, l_hoods = index.labels(positions)
     dataframe['object_id'] = object_ids
     dataframe['s_hood'] = s_hoods
     dataframe['l_hood'] = l_hoods
+    if return_stats:
+        return dataframe, len(dataframe) - tested
     return dataframe
 
 def pull_neighborhoods_file(path=None):
     """
     Read GeoJson file of Neighborhoods.
 
+    A path ending in .npz is read as a binary store written by
+    build_neighborhood_store, which skips GeoJSON parsing and does
+    not import geopandas.
+
     Args:
-        path(string): path to geojson file.
+        path(string): path to geojson file or .npz store.
     Returns:
         GeoJson data frame of neighborhoods.
     """
     if path is None:
         path = DEFAULT_JSON_PATH
+    if str(path).endswith('.npz'):
+        return read_neighborhood_store(path)
+    # geopandas pulls in GDAL, so it is only imported to parse geojson
+    import geopandas as gpd
     return gpd.read_file(path)
 
+def assign_layers(dataframe, layers, workers=1):
+    """
+    Returns the provided dataframe with the attributes of the polygon
+    containing each location, for several polygon layers at once.
+
+    The layers can be any polygon file, for example council districts,
+    police beats or school zones next to the neighborhoods. Each
+    distinct X and Y pair is only tested once and the locations are
+    sorted once for all the layers.
+
+    Args:
+        dataframe(pandas dataframe): dataframe containing the
+            locations. Must have columns X and Y
+        layers(list): one dictionary per layer, with the keys
+            'path' (string): path to the polygon file of the layer,
+                or 'frame' (dataframe): the polygons of the layer with
+                a geometry column
+            'columns' (dict): maps an attribute column of the layer to
+                the name of the column added to the dataframe
+        workers(int): number of processes used to resolve the
+            locations. Defaults to 1, which runs in this process.
+
+    Returns:
+        dataframe(pandas dataframe): the provided dataframe with the
+            added columns of every layer. Locations which are not in
+            any polygon of a layer get -1 in integer columns, NaN in
+            float columns and a missing category in text columns.
+
+    Raises:
+        ValueError: if the dataframe doesn't contain the columns
+            X or Y.
+        ValueError: if a layer has no polygons, no columns or doesn't
+            have one of its columns.
+        ValueError: if workers is not a positive int
+    """
+    if not 'X' in dataframe.columns:
+        raise ValueError("Dataframe doesn't have a column X")
+    if not 'Y' in dataframe.columns:
+        raise ValueError("Dataframe doesn't have a column Y")
+
+    frames = [_layer_frame(layer) for layer in layers]
+    index = MultiLayerIndex([PolygonIndex(frame['geometry']) for frame in frames])
+    positions, _ = query_unique(
+        index, dataframe['X'].values, dataframe['Y'].values, workers)
+
+    for i, layer in enumerate(layers):
+        for column, output in layer['columns'].items():
+            dataframe[output] = _take_attribute(frames[i][column], positions[:, i])
+    return dataframe
+
+def load_neighborhoods(path=None):
+    """
+    Read the neighborhoods of a file once per process.
+
+    The frame is kept in memory and returned again as long as the
+    file is unchanged, so it must not be modified by the caller. A
+    change of the file modification time or size reads it again.
+
+    Args:
+        path(string): path to geojson file or .npz store.
+    Returns:
+        data frame of neighborhoods, see pull_neighborhoods_file.
+    Raises:
+        ValueError: if the file doesn't exist
+    """
+    return _cached_layer(path, 'frame', pull_neighborhoods_file)
+
+def load_neighborhood_index(path=None):
+    """
+    Build the NeighborhoodIndex of a file once per process.
+
+    The index is cached the same way as load_neighborhoods.
+
+    Args:
+        path(string): path to geojson file or .npz store.
+    Returns:
+        NeighborhoodIndex over the neighborhoods of the file.
+    Raises:
+        ValueError: if the file doesn't exist
+    """
+    return _cached_layer(path, 'index', lambda layer_path: NeighborhoodIndex(
+        load_neighborhoods(layer_path)))
+
+def load_neighborhood_registry(path=None):
+    """
+    Build the NeighborhoodRegistry of a file once per process.
+
+    The registry is cached the same way as load_neighborhoods.
+
+    Args:
+        path(string): path to geojson file or .npz store.
+    Returns:
+        NeighborhoodRegistry of the names and ids of the file.
+    Raises:
+        ValueError: if the file doesn't exist
+    """
+    return _cached_layer(path, 'registry', lambda layer_path: NeighborhoodRegistry(
+        load_neighborhoods(layer_path)))
+
+def load_neighborhoods_geojson(path=None):
+    """
+    Read the raw GeoJson of a neighborhood file once per process.
+
+    Used by the maps, which take the GeoJson as a dictionary. The
+    dictionary is cached the same way as load_neighborhoods. Maps
+    write their styles into the features, so each call returns fresh
+    features and properties, while the geometries are shared with the
+    cache and must not be modified by the caller.
+
+    Args:
+        path(string): path to geojson file.
+    Returns:
+        dictionary of the GeoJson file.
+    Raises:
+        ValueError: if the file doesn't exist
+    """
+    geojson = dict(_cached_layer(path, 'geojson', _read_geojson))
+    geojson['features'] = [dict(feature, properties=dict(feature.get('properties') or {}))
+                           for feature in geojson.get('features', [])]
+    return geojson
+
+def clear_neighborhood_cache(path=None):
+    """
+    Drop cached neighborhood layers.
+
+    Args:
+        path(string): path of the file to drop. If None, every
+            cached file is dropped.
+    """
+    if path is None:
+        _LAYER_CACHE.clear()
+        return
+    full_path = os.path.abspath(path)
+    for key in [key for key in _LAYER_CACHE if key[0] == full_path]:
+        del _LAYER_CACHE[key]
+
+def build_neighborhood_store(path=None, store_path=None):
+    """
+    Convert a neighborhood file into a binary store.
+
+    Args:
+        path(string): path to the geojson or shape file of
+            neighborhoods. Defaults to the Seattle geojson file.
+        store_path(string): path of the .npz store to write.
+            Defaults to DEFAULT_STORE_PATH of neighborhood_store.
+    Returns:
+        the path of the store written.
+    """
+    return write_neighborhood_store(pull_neighborhoods_file(path), store_path)
+
+def _cached_layer(path, kind, reader):
+    if path is None:
+        path = DEFAULT_JSON_PATH
+    if not os.path.exists(path):
+        raise ValueError("neighborhood file doesn't exist: " + str(path))
+
+    stat = os.stat(path)
+    version = (stat.st_mtime, stat.st_size)
+    key = (os.path.abspath(path), kind)
+    cached = _LAYER_CACHE.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, reader(path))
+        _LAYER_CACHE[key] = cached
+    return cached[1]
+
+def _read_geojson(path):
+    with open(path) as geojson_file:
+        return json.load(geojson_file)
+
+def _layer_frame(layer):
+    if 'frame' in layer:
+        frame = layer['frame']
+    elif 'path' in layer:
+        frame = load_neighborhoods(layer['path'])
+    else:
+        raise ValueError("layer needs a 'path' or a 'frame': " + str(layer))
+
+    if len(frame) == 0:
+        raise ValueError("layer doesn't have any polygons: " + str(layer))
+    if not layer.get('columns'):
+        raise ValueError("layer needs at least one column: " + str(layer))
+    for column in list(layer['columns']) + ['geometry']:
+        if column not in frame.columns:
+            raise ValueError("layer doesn't have a column " + str(column))
+    return frame
+
+def _take_attribute(values, positions):
+    found = positions >= 0
+    if values.dtype.kind in 'iub':
+        result = np.full(len(positions), -1, dtype=compact_int_dtype(values.values))
+        result[found] = values.values[positions[found]]
+        return result
+    if values.dtype.kind == 'f':
+        result = np.full(len(positions), np.nan)
+        result[found] = values.values[positions[found]]
+        return result
+    codes, names = pd.factorize(values, sort=True)
+    return pd.Categorical.from_codes(np.where(found, codes[positions], -1), names)
+
 def _find_neighborhood_count(frame=None, path=None):
     if frame is None:
         frame = pull_neighborhoods_file(path)
     return len(frame)
+
+def _neighborhood_index(neighborhoods=None, path=None):
+    if isinstance(neighborhoods, (NeighborhoodIndex, NeighborhoodGrid)):
+        return neighborhoods
+    if neighborhoods is None:
+        return load_neighborhood_index(path)
+    return NeighborhoodIndex(neighborhoods)
@@ -0,0 +1,145 @@
+"""
+Lookups between the names and ids of the Seattle neighborhoods.
+
+This file indexes the attributes of the neighborhood polygons once, so
+that the object ids of small neighborhoods (S_HOOD) or districts
+(L_HOOD), and the names of an object id, are found with dictionary
+lookups instead of a scan of the polygon layer for every name.
+"""
+
+import numpy as np
+
+
+class NeighborhoodRegistry(object):
+    """
+    Hashed indexes over the names and ids of a neighborhood layer.
+
+    A few names, such as the 'OOO' areas outside of the neighborhoods,
+    are shared by several polygons, so names map to lists of ids.
+
+    Attributes:
+        object_ids (list): OBJECTID of every polygon, in layer order
+        s_hood_ids (dict): object ids of each S_HOOD name
+        l_hood_ids (dict): object ids of each L_HOOD name
+        names (dict): (S_HOOD, L_HOOD) of each object id
+    """
+
+    def __init__(self, neighborhoods):
+        """
+        Builds the indexes from the attributes of a neighborhood layer.
+
+        Args:
+            neighborhoods (pandas dataframe): neighborhoods with the
+                columns OBJECTID, S_HOOD and L_HOOD
+
+        Raises:
+            ValueError: if a column is missing or an OBJECTID repeats
+        """
+        for column in ['OBJECTID', 'S_HOOD', 'L_HOOD']:
+            if column not in neighborhoods.columns:
+                raise ValueError("neighborhoods have no column " + column)
+
+        self.object_ids = [int(object_id) for object_id in neighborhoods['OBJECTID']]
+        self.s_hood_ids = {}
+        self.l_hood_ids = {}
+        self.names = {}
+        for object_id, s_hood, l_hood in zip(self.object_ids, neighborhoods['S_HOOD'],
+                                             neighborhoods['L_HOOD']):
+            if object_id in self.names:
+                raise ValueError("OBJECTID {0} is not unique".format(object_id))
+            self.names[object_id] = (s_hood, l_hood)
+            if s_hood is not None:
+                self.s_hood_ids.setdefault(s_hood, []).append(object_id)
+            if l_hood is not None:
+                self.l_hood_ids.setdefault(l_hood, []).append(object_id)
+
+    def __len__(self):
+        return len(self.object_ids)
+
+    def neighborhood_ids(self, s_hoods):
+        """
+        Returns the object ids of small neighborhoods.
+
+        Args:
+            s_hoods (list): S_HOOD names
+
+        Returns:
+            list of the object ids of the names, in order
+
+        Raises:
+            ValueError: if a name is not an S_HOOD of the layer
+        """
+        return _lookup(self.s_hood_ids, s_hoods, 'neighborhood')
+
+    def district_ids(self, l_hoods):
+        """
+        Returns the object ids of the neighborhoods of districts.
+
+        Args:
+            l_hoods (list): L_HOOD names
+
+        Returns:
+            list of the object ids of the names, in order
+
+        Raises:
+            ValueError: if a name is not an L_HOOD of the layer
+        """
+        return _lookup(self.l_hood_ids, l_hoods, 'district')
+
+    def other_ids(self, object_ids):
+        """
+        Returns the object ids of the layer which are not in a list.
+
+        Args:
+            object_ids (list): object ids to leave out
+
+        Returns:
+            list of the other object ids, in layer order
+        """
+        excluded = set(object_ids)
+        return [object_id for object_id in self.object_ids if object_id not in excluded]
+
+    def contains_ids(self, values, object_ids):
+        """
+        Returns which values are one of the object ids.
+
+        Args:
+            values (array like): object ids, such as the object_id column
+                of the collisions
+            object_ids (list): object ids to look for
+
+        Returns:
+            numpy array of booleans
+        """
+        values = np.asarray(values)
+        return np.isin(values, np.asarray(object_ids, dtype=values.dtype))
+
+    def neighborhood_names(self, object_id):
+        """
+        Returns the S_HOOD and L_HOOD of an object id.
+
+        Args:
+            object_id (int): OBJECTID of a neighborhood
+
+        Returns:
+            tuple of the S_HOOD and L_HOOD names
+
+        Raises:
+            ValueError: if the object id is not in the layer
+        """
+        if object_id not in self.names:
+            raise ValueError("unknown neighborhood object id: " + str(object_id))
+        return self.names[object_id]
+
+
+def _lookup(index, names, kind):
+    if isinstance(names, str):
+        names = [names]
+    unknown = [name for name in names if name not in index]
+    if unknown:
+        raise ValueError("unknown {0} names: {1}".format(kind, unknown))
+
+    object_ids = []
+    for name in names:
+        object_ids.extend(index[name])
+    return object_ids
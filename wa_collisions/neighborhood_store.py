@@ -0,0 +1,142 @@
+"""
+Compact binary store of the Seattle neighborhood polygons.
+
+This file converts the neighborhood layer into a numpy .npz file of
+vertex arrays, ring offsets, bounding boxes and attribute columns, and
+reads it back without parsing GeoJSON. Loading the store does not need
+geopandas or GDAL, which keeps short lived jobs and worker processes
+from paying the full parse cost each time they load the polygons.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPolygon, Polygon
+
+DEFAULT_STORE_PATH = 'wa_collisions/data/Neighborhoods/Neighborhoods.npz'
+
+# version of the layout below, stored in every file
+STORE_VERSION = 1
+
+
+def write_neighborhood_store(neighborhoods, store_path=None):
+    """
+    Writes a frame of neighborhoods to a binary store.
+
+    The exterior and interior rings of every polygon are concatenated
+    into a single array of vertices. Offset arrays record where each
+    ring, each polygon and each neighborhood starts.
+
+    Args:
+        neighborhoods (geopandas dataframe): neighborhoods with a
+            geometry column of polygons or multipolygons
+        store_path (string): path of the .npz file to write. Defaults
+            to DEFAULT_STORE_PATH.
+
+    Returns:
+        the path of the store written
+
+    Raises:
+        ValueError: if a geometry is not a polygon or multipolygon
+    """
+    if store_path is None:
+        store_path = DEFAULT_STORE_PATH
+
+    rings = []
+    ring_offsets = [0]
+    polygon_offsets = [0]
+    geometry_offsets = [0]
+    is_multi = []
+    for geometry in neighborhoods['geometry']:
+        if geometry.geom_type == 'Polygon':
+            parts = [geometry]
+        elif geometry.geom_type == 'MultiPolygon':
+            parts = list(geometry.geoms)
+        else:
+            raise ValueError("unsupported geometry type: " + str(geometry.geom_type))
+        for part in parts:
+            for ring in [part.exterior] + list(part.interiors):
+                coords = np.asarray(ring.coords, dtype=float)[:, :2]
+                rings.append(coords)
+                ring_offsets.append(ring_offsets[-1] + len(coords))
+            polygon_offsets.append(len(ring_offsets) - 1)
+        geometry_offsets.append(len(polygon_offsets) - 1)
+        is_multi.append(geometry.geom_type == 'MultiPolygon')
+
+    arrays = {
+        'version': np.array(STORE_VERSION),
+        'coords': np.concatenate(rings) if rings else np.zeros((0, 2)),
+        'ring_offsets': np.array(ring_offsets, dtype=np.int64),
+        'polygon_offsets': np.array(polygon_offsets, dtype=np.int64),
+        'geometry_offsets': np.array(geometry_offsets, dtype=np.int64),
+        'is_multi': np.array(is_multi, dtype=bool),
+        'bounds': np.array([geometry.bounds for geometry in neighborhoods['geometry']],
+                           dtype=float).reshape(-1, 4)}
+
+    columns = [column for column in neighborhoods.columns if column != 'geometry']
+    arrays['columns'] = np.array(columns, dtype=str)
+    for i, column in enumerate(columns):
+        values = neighborhoods[column]
+        if values.dtype == object:
+            arrays['nulls_{0}'.format(i)] = values.isnull().values
+            arrays['column_{0}'.format(i)] = np.array(values.fillna('').tolist(), dtype=str)
+        else:
+            arrays['column_{0}'.format(i)] = values.values
+
+    np.savez(store_path, **arrays)
+    return store_path
+
+
+def read_neighborhood_store(store_path=None):
+    """
+    Reads a store written by write_neighborhood_store.
+
+    Args:
+        store_path (string): path to the .npz file. Defaults to
+            DEFAULT_STORE_PATH.
+
+    Returns:
+        pandas dataframe of neighborhoods, with the attribute columns
+        of the original layer and a geometry column of shapely polygons.
+
+    Raises:
+        ValueError: if the file doesn't exist
+        ValueError: if the file was written by another store version
+    """
+    if store_path is None:
+        store_path = DEFAULT_STORE_PATH
+    if not os.path.exists(store_path):
+        raise ValueError("neighborhood store doesn't exist: " + str(store_path))
+
+    with np.load(store_path) as store:
+        if int(store['version']) != STORE_VERSION:
+            raise ValueError("neighborhood store {0} has version {1}, expected {2}".format(
+                store_path, int(store['version']), STORE_VERSION))
+
+        data = {}
+        for i, column in enumerate(store['columns']):
+            values = store['column_{0}'.format(i)]
+            if 'nulls_{0}'.format(i) in store.files:
+                values = values.astype(object)
+                values[store['nulls_{0}'.format(i)]] = None
+            data[str(column)] = values
+
+        data['geometry'] = _geometries(store)
+        return pd.DataFrame(data, columns=list(data))
+
+
+def _geometries(store):
+    coords = store['coords']
+    ring_offsets = store['ring_offsets']
+    polygon_offsets = store['polygon_offsets']
+    geometry_offsets = store['geometry_offsets']
+
+    geometries = []
+    for i, multi in enumerate(store['is_multi']):
+        parts = []
+        for part in range(geometry_offsets[i], geometry_offsets[i + 1]):
+            rings = [coords[ring_offsets[ring]:ring_offsets[ring + 1]]
+                     for ring in range(polygon_offsets[part], polygon_offsets[part + 1])]
+            parts.append(Polygon(rings[0], rings[1:]))
+        geometries.append(MultiPolygon(parts) if multi else parts[0])
+    return geometries
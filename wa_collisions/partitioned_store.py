@@ -0,0 +1,245 @@
+"""
+Year and month partitioned store of cleaned collisions.
+
+This file writes cleaned collisions to Parquet files laid out by year
+and month, as store/year=2016/month=10/part-0.parquet, and reads them
+back for a set of years or a date range. Only the files of the months
+matching the request are opened, so an analysis of a few years does not
+pay for loading the whole history.
+
+Parquet needs the pyarrow package.
+"""
+
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# name of the file written in each partition
+PART_NAME = 'part-0.parquet'
+
+_PARTITION_PATTERN = re.compile(r'^year=(\d+)$|^month=(\d+)$')
+
+
+def write_partitioned_collisions(collision_data, store_folder):
+    """
+    Writes cleaned collisions to the store, one partition per year and
+    month.
+
+    The partitions of the months in collision_data are replaced and the
+    other partitions of the store are kept. Collisions without a year or
+    month, such as those without a time, have no partition and are
+    refused rather than left out, so they have to be dropped first.
+
+    Args:
+        collision_data (pandas dataframe): collisions cleaned by
+            clean_collision_data, with year and month columns
+        store_folder (string): folder of the store, created when it
+            doesn't exist
+
+    Returns:
+        list of the partition folders written
+
+    Raises:
+        ValueError: if collision_data has no year or month column
+        ValueError: if a collision has no year or month
+    """
+    _check_partition_columns(collision_data, ['year', 'month'])
+
+    written = []
+    for (year, month), partition in collision_data.groupby(['year', 'month']):
+        written.append(_write_partition(store_folder, year, month,
+                                        partition.drop(columns=['year', 'month'])))
+    return written
+
+
+def upsert_partitioned_collisions(collision_data, store_folder, key_column,
+                                  stale_partitions=None, removed_keys=None):
+    """
+    Adds collisions to the store, replacing the stored collisions with
+    the same keys.
+
+    Only the partitions of the months in collision_data and the stale
+    partitions are rewritten. As with write_partitioned_collisions,
+    collisions without a year or month are refused.
+
+    Args:
+        collision_data (pandas dataframe): collisions cleaned by
+            clean_collision_data, with year and month columns
+        store_folder (string): folder of the store, created when it
+            doesn't exist
+        key_column (string): column identifying a collision
+        stale_partitions (list): (year, month) of other partitions which
+            may hold collisions with the same keys, for collisions which
+            changed month
+        removed_keys (array like): keys of other collisions to remove
+            from the partitions rewritten
+
+    Returns:
+        list of the partition folders written
+
+    Raises:
+        ValueError: if collision_data has no year, month or key column
+        ValueError: if a collision has no year or month
+    """
+    _check_partition_columns(collision_data, ['year', 'month', key_column])
+
+    months = set(zip(collision_data['year'], collision_data['month']))
+    months.update(stale_partitions or [])
+    keys = collision_data[key_column].values
+    if removed_keys is not None:
+        keys = np.concatenate([keys, np.asarray(removed_keys, dtype=keys.dtype)])
+
+    written = []
+    for year, month in sorted(months):
+        folder = partition_folder(store_folder, year, month)
+        parts = [pd.read_parquet(path)
+                 for path in sorted(glob.glob(os.path.join(folder, '*.parquet')))]
+        parts = [part[~part[key_column].isin(keys)] for part in parts]
+        added = collision_data[(collision_data['year'] == year) &
+                               (collision_data['month'] == month)]
+        parts.append(added.drop(columns=['year', 'month']))
+        written.append(_write_partition(store_folder, year, month, _concat(parts)))
+    return written
+
+
+def read_partitioned_collisions(store_folder, years=None, start=None, end=None,
+                                columns=None):
+    """
+    Reads the collisions of the store which match the predicates.
+
+    Args:
+        store_folder (string): folder of the store
+        years (list): years to read, or None for every year
+        start (datetime like): first time to read, or None
+        end (datetime like): time to read up to, excluded, or None
+        columns (list): columns to read besides year and month, or None
+            for every column
+
+    Returns:
+        pandas dataframe of the matching collisions, in the order of
+        their year and month
+
+    Raises:
+        ValueError: if the store folder doesn't exist
+    """
+    if not os.path.isdir(store_folder):
+        raise ValueError("store folder doesn't exist: " + str(store_folder))
+
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    if columns is not None:
+        # year and month are not stored in the files, and the time is
+        # needed to filter the rows by date
+        columns = [column for column in columns if column not in ['year', 'month']]
+        if (start is not None or end is not None) and 'time' not in columns:
+            columns.append('time')
+
+    parts = []
+    for year, month, folder in list_partitions(store_folder):
+        if years is not None and year not in years:
+            continue
+        first = pd.Timestamp(year, month, 1)
+        if (end is not None and first >= end) or \
+                (start is not None and first + pd.offsets.MonthBegin() <= start):
+            continue
+        for path in sorted(glob.glob(os.path.join(folder, '*.parquet'))):
+            part = pd.read_parquet(path, columns=columns)
+            part['year'] = year
+            part['month'] = month
+            parts.append(part)
+
+    if not parts:
+        return pd.DataFrame()
+
+    data = _concat(parts)
+    if start is not None:
+        data = data[data['time'] >= start]
+    if end is not None:
+        data = data[data['time'] < end]
+    return data.reset_index(drop=True)
+
+
+def list_partitions(store_folder):
+    """
+    Lists the partitions of the store.
+
+    Args:
+        store_folder (string): folder of the store
+
+    Returns:
+        list of (year, month, folder) of each partition, sorted by
+        year and month
+    """
+    partitions = []
+    for year_name in os.listdir(store_folder):
+        year = _partition_value(year_name, 1)
+        if year is None:
+            continue
+        year_folder = os.path.join(store_folder, year_name)
+        if not os.path.isdir(year_folder):
+            continue
+        for month_name in os.listdir(year_folder):
+            month = _partition_value(month_name, 2)
+            if month is not None:
+                partitions.append((year, month, os.path.join(year_folder, month_name)))
+    return sorted(partitions)
+
+
+def partition_folder(store_folder, year, month):
+    """
+    Returns the folder of a partition.
+
+    Args:
+        store_folder (string): folder of the store
+        year (int): year of the partition
+        month (int): month of the partition
+
+    Returns:
+        path of the partition folder
+    """
+    return os.path.join(store_folder, 'year={0}'.format(int(year)),
+                        'month={0}'.format(int(month)))
+
+
+def _check_partition_columns(collision_data, columns):
+    for column in columns:
+        if column not in collision_data.columns:
+            raise ValueError("collision data has no {0} column".format(column))
+    missing = collision_data[['year', 'month']].isnull().any(axis=1).sum()
+    if missing:
+        raise ValueError("{0} collisions have no year or month".format(missing))
+
+
+def _write_partition(store_folder, year, month, partition):
+    folder = partition_folder(store_folder, year, month)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    path = os.path.join(folder, PART_NAME)
+    if len(partition):
+        partition.reset_index(drop=True).to_parquet(path + '.tmp')
+        os.replace(path + '.tmp', path)
+    for stale in glob.glob(os.path.join(folder, '*.parquet')):
+        if len(partition) == 0 or stale != path:
+            os.remove(stale)
+    return folder
+
+
+def _partition_value(name, group):
+    match = _PARTITION_PATTERN.match(name)
+    if match is None or match.group(group) is None:
+        return None
+    return int(match.group(group))
+
+
+def _concat(parts):
+    # partitions know only the categories they hold, so combine them
+    # before concatenating to keep the columns categorical
+    for column in parts[0].columns:
+        if all(str(part[column].dtype) == 'category' for part in parts):
+            categories = union_categoricals([part[column] for part in parts]).categories
+            for part in parts:
+                part[column] = part[column].cat.set_categories(categories)
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,140 @@
+"""
+Pipeline of named stages memoized on disk.
+
+This file runs a pipeline of stages which each build a dataframe from
+the frames of earlier stages, the files they read and their arguments.
+Every stage is cached in a folder under a key combining its function,
+arguments, source files and the keys of the stages it takes, so after a
+change only the stages downstream of it run again. Frames built from
+other arguments are kept, so going back and forth between parameters
+reads the frames back instead of building them again.
+"""
+
+import time
+
+from wa_collisions.frame_cache import cached_frame
+from wa_collisions.frame_cache import source_fingerprint
+
+
+class Stage(object):
+    """
+    A step of a pipeline.
+
+    Attributes:
+        name (string): name of the stage
+        function (function): called with the frames of the input stages,
+            in order, and the arguments as keywords
+        inputs (list): names of the stages whose frames are taken
+        arguments (dict): keyword arguments of the function. The values
+            must be serializable to JSON.
+        sources (list): paths of the files read by the function
+    """
+
+    def __init__(self, name, function, inputs=None, arguments=None, sources=None):
+        """
+        Describes a stage, see the attributes.
+        """
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs or [])
+        self.arguments = dict(arguments or {})
+        self.sources = list(sources or [])
+
+
+class Pipeline(object):
+    """
+    Stages run on demand, each at most once per run.
+
+    Attributes:
+        stages (dict): the stages by name
+        timings (dict): seconds taken by each stage built in the last run
+    """
+
+    def __init__(self, stages):
+        """
+        Checks and wraps the stages.
+
+        Args:
+            stages (list): the stages, each after the stages it takes
+
+        Raises:
+            ValueError: if two stages have the same name
+            ValueError: if a stage takes a stage which isn't before it
+        """
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError("more than one stage named {0}".format(stage.name))
+            for name in stage.inputs:
+                if name not in self.stages:
+                    raise ValueError("stage {0} takes {1}, which isn't an earlier stage".format(
+                        stage.name, name))
+            self.stages[stage.name] = stage
+        self.timings = {}
+
+    def key(self, name):
+        """
+        Returns the cache key of a stage.
+
+        Args:
+            name (string): name of the stage
+
+        Returns:
+            hex digest of the function, arguments and sources of the
+            stage and of the keys of its inputs
+
+        Raises:
+            ValueError: if there is no stage of that name
+            ValueError: if a source file doesn't exist
+        """
+        stage = self._stage(name)
+        function = '{0}.{1}'.format(stage.function.__module__, stage.function.__name__)
+        return source_fingerprint(stage.sources, {
+            'function': function, 'arguments': stage.arguments,
+            'inputs': [self.key(input_name) for input_name in stage.inputs]})
+
+    def run(self, name, cache_folder=None):
+        """
+        Returns the frame of a stage, building only the stages which are
+        not in the cache.
+
+        Args:
+            name (string): name of the stage
+            cache_folder (string): folder of the cached frames. When None,
+                every stage needed is built and nothing is cached.
+
+        Returns:
+            the dataframe of the stage
+
+        Raises:
+            ValueError: if there is no stage of that name
+            ValueError: if a source file doesn't exist
+        """
+        self.timings = {}
+        return self._run(name, cache_folder, {})
+
+    def _run(self, name, cache_folder, frames):
+        if name in frames:
+            return frames[name]
+
+        stage = self._stage(name)
+
+        def build():
+            inputs = [self._run(input_name, cache_folder, frames).copy()
+                      for input_name in stage.inputs]
+            started = time.perf_counter()
+            frame = stage.function(*inputs, **stage.arguments)
+            self.timings[name] = time.perf_counter() - started
+            return frame
+
+        if cache_folder is None:
+            frames[name] = build()
+        else:
+            frames[name] = cached_frame(cache_folder, name, [], {'key': self.key(name)},
+                                        build, replace=False)
+        return frames[name]
+
+    def _stage(self, name):
+        if name not in self.stages:
+            raise ValueError("no stage named {0}".format(name))
+        return self.stages[name]
@@ -7,21 +7,72 @@ and collision data sets.
 
 # import packages
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
 import pandas as pd
 import numpy as np
 #from pytz import timezone
 
+from wa_collisions.datetime_parser import CALENDAR_FIELDS
+from wa_collisions.datetime_parser import calendar_fields
+from wa_collisions.datetime_parser import parse_datetimes
 from wa_collisions.neighborhood_reader import assign_neighborhood
-
-def read_collision_data(file_path):
+from wa_collisions.neighborhood_reader import load_neighborhood_index
+from wa_collisions.pipeline import Pipeline
+from wa_collisions.pipeline import Stage
+from wa_collisions.weather_join import collision_stations
+from wa_collisions.weather_join import join_weather_hours
+
+# columns identifying a collision in the SDOT collision data
+KEY_COLUMNS = ['objectid', 'inckey', 'reportno']
+
+# number of collision rows read at a time when streaming
+DEFAULT_CHUNK_SIZE = 100000
+
+# columns of the SDOT collision data used by the analysis and the dtype
+# each is parsed as, None leaving the dtype to pandas. Names are matched
+# without case, so both the lower case and the upper case exports work.
+COLLISION_SCHEMA = {
+    'x': 'float64', 'y': 'float64', 'objectid': None, 'inckey': None,
+    'reportno': 'object', 'object_id': None, 'incdate': 'object', 'incdttm': 'object',
+    'addrtype': 'category', 'collisiontype': 'category',
+    'junctiontype': 'category', 'lightcond': 'category',
+    'roadcond': 'category', 'sdot_coldesc': 'category',
+    'severitydesc': 'category', 'speeding': 'category',
+    'weather': 'category', 'location': 'object',
+    'fatalities': 'float32', 'injuries': 'float32', 'pedcount': 'float32',
+    'pedcylcount': 'float32', 'personcount': 'float32'}
+
+# columns of the Iowa Environmental Mesonet weather data, matched without
+# the leading spaces of the export, and the values marking a missing
+# observation
+WEATHER_SCHEMA = {
+    'station': 'category', 'valid': 'object', 'tmpf': 'float64',
+    'p01i': 'float64', 'sknt': 'float64'}
+WEATHER_NA_VALUES = ['M']
+
+# columns of the cleaned weather data
+WEATHER_DAY_COLUMNS = ['station', 'year', 'month', 'day', 'temperature_mean',
+                       'temperature_high', 'temperature_low', 'precipitation',
+                       'wind_speed']
+
+# columns of the hourly weather data
+WEATHER_HOUR_COLUMNS = ['station', 'timestamp', 'temperature', 'precipitation', 'wind_speed']
+
+def read_collision_data(file_path, projected=True):
     """
 
     Uses the input file path to find the csv file with the collision
     data from Washington state.
 
+    Only the columns in COLLISION_SCHEMA are parsed, with the dtypes
+    declared there, unless projected is False.
 
     Args:
         file_path: the path to the .csv file containing the collision data
+        projected: whether to read only the columns in COLLISION_SCHEMA
 
     Returns:
         dataframe of data from the collision data file
@@ -34,21 +85,50 @@ def read_collision_data(file_path):
         raise ValueError("file doesn't exist: " + str(file_path))
 
     # read in the data frome the file
-    collision_data = pd.read_csv(file_path, low_memory=False)
+    collision_data = pd.read_csv(file_path, low_memory=False,
+                                 **_schema_arguments(file_path, COLLISION_SCHEMA, projected))
 
     # return the data
     return collision_data
 
-def read_weather_data(file_path):
+def read_collision_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, projected=True):
+    """
+    Read the collision data a chunk of rows at a time.
+
+    Args:
+        file_path: the path to the .csv file containing the collision data
+        chunk_size: the number of rows in each chunk
+        projected: whether to read only the columns in COLLISION_SCHEMA
+
+    Returns:
+        iterator over dataframes of at most chunk_size rows
+
+    Raises:
+        ValueError: raises this error when the file path does not exist
+        ValueError: raises this error when chunk_size is not a positive int
+    """
+    if not os.path.exists(file_path):
+        raise ValueError("file doesn't exist: " + str(file_path))
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError("chunk_size must be a positive int, got {0}".format(chunk_size))
+
+    return pd.read_csv(file_path, low_memory=False, chunksize=chunk_size,
+                       **_schema_arguments(file_path, COLLISION_SCHEMA, projected))
+
+def read_weather_data(file_path, projected=True):
     """
     Read in the weather data.
 
     Uses the input file path to find the csv file with the weather
     data from the Iowa Environmental Mosonet database
 
+    Only the columns in WEATHER_SCHEMA are parsed, with the dtypes
+    declared there and 'M' read as a missing value, unless projected
+    is False.
 
     Args:
         file_path: the path to the .csv file containing the weather data
+        projected: whether to read only the columns in WEATHER_SCHEMA
 
     Returns:
         dataframe of data from the weather data file
@@ -61,11 +141,25 @@ def read_weather_data(file_path):
         raise ValueError("file doesn't exist: " + str(file_path))
 
     # read in the data frome the file
-    weather_data = pd.read_csv(file_path, low_memory=False)
+    arguments = _schema_arguments(file_path, WEATHER_SCHEMA, projected)
+    if projected:
+        arguments['na_values'] = WEATHER_NA_VALUES
+    weather_data = pd.read_csv(file_path, low_memory=False, **arguments)
 
     # return the data
     return weather_data
 
+def _schema_arguments(file_path, schema, projected):
+    if not projected:
+        return {}
+
+    # match the names in the header of the file to the schema
+    header = pd.read_csv(file_path, nrows=0).columns
+    columns = [column for column in header if column.strip().lower() in schema]
+    dtypes = {column: schema[column.strip().lower()] for column in columns
+              if schema[column.strip().lower()] is not None}
+    return {'usecols': columns, 'dtype': dtypes}
+
 
 def clean_collision_data(collision_data, include_since_year=None):
     """
@@ -92,14 +186,11 @@ def clean_collision_data(collision_data, include_since_year=None):
     if not isinstance(include_since_year, int) and include_since_year is not None:
         raise ValueError("{0} is not None or an int".format(include_since_year))
 
-    collision_data['time'] = pd.to_datetime(collision_data.incdttm)
-    collision_data['date'] = pd.to_datetime(collision_data.incdate)
-    collision_data['year'] = collision_data.time.dt.year
-    collision_data['month'] = collision_data.time.dt.month
-    collision_data['day'] = collision_data.time.dt.day
-    collision_data['hour'] = collision_data.time.dt.hour
-    collision_data['minute'] = collision_data.time.dt.minute
-    collision_data['second'] = collision_data.time.dt.second
+    collision_data['time'] = parse_datetimes(collision_data.incdttm)
+    collision_data['date'] = parse_datetimes(collision_data.incdate)
+    fields = calendar_fields(collision_data['time'])
+    for field in CALENDAR_FIELDS:
+        collision_data[field] = fields[field]
 
     # only keep attributes that are relevant to the analysis
     columns = ['Y', 'X', 'addrtype', 'collisiontype', 'fatalities', 'injuries',
@@ -112,6 +203,9 @@ def clean_collision_data(collision_data, include_since_year=None):
     if 'object_id' in collision_data.columns:
         columns = columns + ['object_id']
 
+    # keep the collision keys, which identify collisions across extracts
+    columns = columns + [key for key in KEY_COLUMNS if key in collision_data.columns]
+
     # drop the na
     collision_data = collision_data.dropna(axis=0, how='any', subset=['X', 'Y'])
     if include_since_year is not None:
@@ -138,80 +232,132 @@ def clean_collision_data(collision_data, include_since_year=None):
     return collision_data
 
 
-def clean_weather_data(weather_data):
+def clean_weather_data(weather_data, workers=1):
     """
     Clean the weather data.
 
-    Uses the weather data and returns a cleaned data frame
+    Uses the weather data and returns a cleaned data frame. The readings
+    of each station are averaged by hour and the hours by day, resampling
+    on the time of the readings. Stations are aggregated separately, in
+    parallel when workers is more than 1.
 
 
     Args:
         data: dataframe that contains the raw data from the weather data file
+        workers: number of processes used to aggregate the stations
 
     Returns:
-        cleaned dataframe of data from the weather data file
+        cleaned dataframe of data from the weather data file, with one row
+        per station and day
 
     Raises:
-        None
+        ValueError: raises this error when workers is not a positive int
     """
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        raise ValueError("workers must be a positive int, got {0}".format(workers))
+
+    days = _map_stations(_aggregate_station, _prepare_weather(weather_data), workers)
+    if not days:
+        return pd.DataFrame(columns=WEATHER_DAY_COLUMNS)
+    return pd.concat(days, ignore_index=True)
+
+def clean_weather_hours(weather_data, workers=1):
+    """
+    Clean the weather data to hourly readings.
+
+    The readings of each station are averaged by hour, like the first
+    step of clean_weather_data. Hours without readings are left out.
+
+    Args:
+        data: dataframe that contains the raw data from the weather data file
+        workers: number of processes used to aggregate the stations
+
+    Returns:
+        cleaned dataframe with the station, the mean time of the readings
+        of the hour as timestamp, the temperature, precipitation and
+        wind_speed of each station and hour
+
+    Raises:
+        ValueError: raises this error when workers is not a positive int
+    """
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        raise ValueError("workers must be a positive int, got {0}".format(workers))
+
+    hours = _map_stations(_station_hours, _prepare_weather(weather_data), workers)
+    if not hours:
+        return pd.DataFrame(columns=WEATHER_HOUR_COLUMNS)
+    return pd.concat(hours, ignore_index=True)
+
+def _prepare_weather(weather_data):
     # only keep relevant attributes
     columns = ['station', 'valid', 'tmpf', ' p01i', ' sknt']
 
-    #Remove fields with missing values
+    #Remove fields with missing values, marked with 'M' when the data was
+    #not read with WEATHER_NA_VALUES
     weather_data = weather_data.reindex(columns=columns)
-    weather_data = weather_data[(weather_data['tmpf'] != 'M') &
-                                (weather_data[' p01i'] != 'M') &
-                                (weather_data[' sknt'] != 'M')]
+    measures = ['tmpf', ' p01i', ' sknt']
+    weather_data = weather_data.replace({column: 'M' for column in measures}, np.nan)
+    weather_data = weather_data.dropna(subset=measures)
     weather_data.columns = ['station', 'timestamp', 'temperature', 'precipitation', 'wind_speed']
 
     #convert types to floats
-    weather_data['temperature'] = weather_data['temperature'].astype('float64')
-    weather_data['precipitation'] = weather_data['precipitation'].astype('float64')
-    weather_data['wind_speed'] = weather_data['wind_speed'].astype('float64')
-
-    # convert timestamp attribute from string to datetime format and extract year, month, day
-    weather_data['timestamp'] = pd.to_datetime(weather_data['timestamp'])
-    weather_data['year'] = weather_data['timestamp'].dt.year
-    weather_data['month'] = weather_data['timestamp'].dt.month
-    weather_data['day'] = weather_data['timestamp'].dt.day
-    weather_data['hour'] = weather_data['timestamp'].dt.hour
-
-    # aggregate by hour
-    weather_final_hour = weather_data.groupby(
-        ['year', 'month', 'day', 'hour']).agg(
-            {'temperature': np.mean,
-             'precipitation': np.mean,
-             'wind_speed': np.mean}).reset_index()
+    weather_data = weather_data.astype({'temperature': 'float64', 'precipitation': 'float64',
+                                        'wind_speed': 'float64'})
+    weather_data['station'] = weather_data['station'].astype(object).fillna('')
+    weather_data['timestamp'] = parse_datetimes(weather_data['timestamp'])
+    return weather_data
+
+def _map_stations(function, weather_data, workers):
+    stations = [station for _, station in weather_data.groupby('station', sort=True)]
+    if workers == 1 or len(stations) < 2:
+        return [function(station) for station in stations]
+
+    pool = Pool(min(workers, len(stations)))
+    try:
+        return pool.map(function, stations)
+    finally:
+        pool.close()
+        pool.join()
+
+def _station_hours(station):
+    readings = station.set_index('timestamp')[['temperature', 'precipitation', 'wind_speed']]
+    # stations report a few minutes before the hour, so each hour keeps the
+    # mean time of its readings rather than the start of the hour
+    readings['reading_time'] = station['timestamp'].values.astype('int64')
+    hours = readings.resample('H').mean().dropna(subset=['reading_time'])
+    hours['timestamp'] = pd.to_datetime(hours['reading_time'].round(-9).astype('int64'))
+    hours = hours.reset_index(drop=True)
+    hours['station'] = station['station'].iat[0]
+    return hours.reindex(columns=WEATHER_HOUR_COLUMNS)
+
+def _aggregate_station(station):
+    # aggregate by hour, hours without readings are left out
+    hours = _station_hours(station).set_index('timestamp')
 
     # aggregate by day
-    weather_final_day = weather_final_hour.groupby(
-        ['year', 'month', 'day']).agg(
-            {'temperature': [np.mean, np.max, np.min],
-             'precipitation': np.sum,
-             'hour' : np.size,
-             'wind_speed': np.mean}).reset_index()
-    weather_final_day.columns = weather_final_day.columns.get_level_values(0)
-    weather_final_day.columns = [
-        'year',
-        'month',
-        'day',
-        'temperature_mean',
-        'temperature_high',
-        'temperature_low',
-        'precipitation',
-        'count_of_obs',
-        'wind_speed']
+    grouped = hours.resample('D')
+    days = pd.DataFrame({
+        'temperature_mean': grouped['temperature'].mean(),
+        'temperature_high': grouped['temperature'].max(),
+        'temperature_low': grouped['temperature'].min(),
+        'precipitation': grouped['precipitation'].sum(),
+        'count_of_obs': grouped['temperature'].count(),
+        'wind_speed': grouped['wind_speed'].mean()})
 
     # only keep days with more than 22 hours of weather data
-    weather_final_day = weather_final_day[weather_final_day['count_of_obs'] >= 22]
-    weather_final_day.drop(columns=['count_of_obs'], axis=1, inplace=True)
+    days = days[days['count_of_obs'] >= 22]
 
-    # return the weather data aggregate at day level
-    return weather_final_day
+    fields = calendar_fields(days.index.values)
+    days = days.reset_index(drop=True)
+    days['station'] = station['station'].iat[0]
+    for field in ['year', 'month', 'day']:
+        days[field] = fields[field]
+    return days.reindex(columns=WEATHER_DAY_COLUMNS)
 
 
 
-def clean_collisions_neighborhoods(collision_data, geo_json_path=None):
+def clean_collisions_neighborhoods(collision_data, geo_json_path=None, workers=1,
+                                   cache_path=None):
     """
     Add the neighborhoods to the cleaned collision data.
     Clean the collision data and add the neighborhood data. We have tests
@@ -221,6 +367,9 @@ def clean_collisions_neighborhoods(collision_data, geo_json_path=None):
     Args:
         collision_data: dataframe that contains the cleaned collision data
         geo_json_path: path to the GeoJSON file that contains neighborhood data
+        workers: number of processes used to assign the neighborhoods
+        cache_path: path of the neighborhood assignment cache. Only collisions
+            which are new or have moved since the last call are assigned.
     Returns:
         cleaned dataframe of data from the collision data file with neighborhood attributes
     Raises:
@@ -230,52 +379,216 @@ def clean_collisions_neighborhoods(collision_data, geo_json_path=None):
     collision_data = clean_collision_data(collision_data)
 
     ## add the assigned neighborhoods
-    collision_data = assign_neighborhood(collision_data, geo_json_path)
+    collision_data = assign_neighborhood(collision_data, geo_json_path, workers,
+                                         cache_path=cache_path)
 
     return collision_data
 
 
+def stream_collisions_neighborhoods(
+        collision_data_file_path,
+        sink,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        include_since_year=None,
+        geo_json_path=None,
+        workers=1):
+    """
+    Clean the collision data and add the neighborhoods one chunk at a time.
+
+    Each chunk of the collision file is cleaned, gets its neighborhoods and
+    indicator columns, and is handed to the sink before the next chunk is
+    read. Memory use depends on chunk_size, not on the size of the file.
+
+    Args:
+        collision_data_file_path: file path to the collision dataset
+        sink: path of a .csv file to write the labelled collisions to, or a
+            function which is called with each labelled chunk
+        chunk_size: the number of collision rows read at a time
+        include_since_year: the starting year of collision accidents in the output
+        geo_json_path: path to the GeoJSON file that contains neighborhood data
+        workers: number of processes used to assign the neighborhoods
+
+    Returns:
+        the number of labelled collisions passed to the sink
+
+    Raises:
+        ValueError: raises this error when the collision file path does not exist
+        ValueError: raises this error when chunk_size is not a positive int
+    """
+    row_count = 0
+    for chunk in read_collision_chunks(collision_data_file_path, chunk_size):
+        chunk = clean_collision_data(chunk, include_since_year)
+        if chunk.shape[0] == 0:
+            continue
+        chunk = assign_neighborhood(chunk, geo_json_path, workers)
+
+        if callable(sink):
+            sink(chunk)
+        else:
+            chunk.to_csv(sink, mode='w' if row_count == 0 else 'a',
+                         header=row_count == 0, index=False)
+        row_count += chunk.shape[0]
+
+    return row_count
+
+
 def integrate_data(
         collision_data_file_path,
         include_since_year,
         weather_data_file_path,
-        geo_json_path=None):
+        geo_json_path=None,
+        cache_folder=None,
+        hourly=False,
+        station_locations=None,
+        timings=None):
     """
     Clean and integrate collision data, weather data and neighborhood data
 
+    Each collision gets the weather of the station closest to its
+    neighborhood, either the weather of the day or, when hourly is true,
+    the reading of the hour nearest to the collision.
+
+    The collisions are read and cleaned, the neighborhood index is built
+    and the weather is read and cleaned in three threads at once, so the
+    time taken is about that of the longest of them plus the assignment
+    of the neighborhoods and the join.
+
     Args:
         collision_data_file_path: file path to the collision dataset
         include_since_year: the starting year of collision accidents in the output dataframe
         weather_data_file_path: file path to the weather dataset
         geo_json_path: file path to the neighorhoods GEOJSON file
+        cache_folder: folder of the frame cache. When given, the stages of
+            integration_pipeline are run instead, and only the stages affected
+            by a change of the files or arguments since the last call are built
+            again.
+        hourly: whether to join the hourly weather instead of the daily weather
+        station_locations: dictionary of the longitude and latitude of each
+            weather station, defaults to weather_join.STATION_LOCATIONS
+        timings: dictionary which, when given, receives the seconds taken by
+            each stage: collisions, neighborhoods, weather, assign, join and
+            total, or the stages of integration_pipeline which were built and
+            total when cache_folder is given
 
     Returns:
         cleaned dataframe of data from the integrated data
 
     Raises:
         ValueError: raises this error when the file paths do not exist
+        ValueError: raises this error when the weather data has several
+            stations and the location of one of them is unknown
     """
-
-    # read in the collision data
-    # check that the file exists
+    if cache_folder is not None:
+        pipeline = integration_pipeline(collision_data_file_path, include_since_year,
+                                        weather_data_file_path, geo_json_path,
+                                        hourly, station_locations)
+        started = time.perf_counter()
+        data = pipeline.run('join', cache_folder)
+        if timings is not None:
+            timings.update(pipeline.timings)
+            timings['total'] = time.perf_counter() - started
+        return data
+
+    # check that the files exist
     if not os.path.exists(collision_data_file_path):
         raise ValueError("collision data file doesn't exist: " + str(collision_data_file_path))
-
-    collision_data = read_collision_data(collision_data_file_path)
-    collision_data = clean_collision_data(collision_data, include_since_year)
-
-    # add the assigned neighborhoods
     if not os.path.exists(geo_json_path):
         raise ValueError("geo json file doesn't exist: " + str(geo_json_path))
-    data = assign_neighborhood(collision_data, geo_json_path)
-
-    # read in the weather data
     if not os.path.exists(weather_data_file_path):
         raise ValueError("weather data file doesn't exist: " + str(weather_data_file_path))
-    weather_data = read_weather_data(weather_data_file_path)
-    weather_data = clean_weather_data(weather_data)
+
+    # the collisions, the neighborhood index and the weather are independent
+    # until the neighborhoods are assigned, so they are prepared at once
+    started = time.perf_counter()
+    stage_timings = {}
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        collisions = executor.submit(
+            _timed_stage, stage_timings, 'collisions',
+            lambda: clean_collision_data(read_collision_data(collision_data_file_path),
+                                         include_since_year))
+        index = executor.submit(_timed_stage, stage_timings, 'neighborhoods',
+                                load_neighborhood_index, geo_json_path)
+        weather = executor.submit(
+            _timed_stage, stage_timings, 'weather',
+            lambda: (clean_weather_hours if hourly else clean_weather_data)(
+                read_weather_data(weather_data_file_path)))
+
+        # add the assigned neighborhoods
+        collision_data = collisions.result()
+        index.result()
+        data = _timed_stage(stage_timings, 'assign', assign_neighborhood,
+                            collision_data, geo_json_path)
+        weather_data = weather.result()
 
     # join add weather information
-    data = pd.merge(data, weather_data, how='inner', on=['year', 'month', 'day'])
+    data = _timed_stage(stage_timings, 'join', _join_weather, data, weather_data,
+                        hourly, station_locations, geo_json_path)
 
+    stage_timings['total'] = time.perf_counter() - started
+    if timings is not None:
+        timings.update(stage_timings)
     return data
+
+def integration_pipeline(
+        collision_data_file_path,
+        include_since_year,
+        weather_data_file_path,
+        geo_json_path=None,
+        hourly=False,
+        station_locations=None):
+    """
+    Describe integrate_data as a pipeline of stages.
+
+    The stages are read_collisions, clean_collisions, assign_neighborhoods,
+    read_weather, clean_weather and join, which returns the integrated data.
+
+    Args:
+        collision_data_file_path: file path to the collision dataset
+        include_since_year: the starting year of collision accidents in the output dataframe
+        weather_data_file_path: file path to the weather dataset
+        geo_json_path: file path to the neighorhoods GEOJSON file
+        hourly: whether to join the hourly weather instead of the daily weather
+        station_locations: dictionary of the longitude and latitude of each
+            weather station, defaults to weather_join.STATION_LOCATIONS
+
+    Returns:
+        the Pipeline of the stages
+    """
+    return Pipeline([
+        Stage('read_collisions', read_collision_data,
+              arguments={'file_path': collision_data_file_path},
+              sources=[collision_data_file_path]),
+        Stage('clean_collisions', clean_collision_data, inputs=['read_collisions'],
+              arguments={'include_since_year': include_since_year}),
+        Stage('assign_neighborhoods', assign_neighborhood, inputs=['clean_collisions'],
+              arguments={'path': geo_json_path}, sources=[geo_json_path]),
+        Stage('read_weather', read_weather_data,
+              arguments={'file_path': weather_data_file_path},
+              sources=[weather_data_file_path]),
+        Stage('clean_weather', clean_weather_hours if hourly else clean_weather_data,
+              inputs=['read_weather']),
+        Stage('join', _join_weather, inputs=['assign_neighborhoods', 'clean_weather'],
+              arguments={'hourly': hourly, 'station_locations': station_locations,
+                         'geo_json_path': geo_json_path},
+              sources=[geo_json_path])])
+
+def _timed_stage(stage_timings, name, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    stage_timings[name] = time.perf_counter() - started
+    return result
+
+def _join_weather(data, weather_data, hourly, station_locations, geo_json_path):
+    if hourly:
+        return join_weather_hours(data, weather_data, station_locations, geo_json_path)
+
+    # join the weather of the station of each collision when there are
+    # several stations
+    keys = ['year', 'month', 'day']
+    stations = weather_data['station'].unique()
+    if len(stations) > 1:
+        data['station'] = collision_stations(data, stations, station_locations, geo_json_path)
+        keys = ['station'] + keys
+    else:
+        weather_data = weather_data.drop(columns=['station'])
+    return pd.merge(data, weather_data, how='inner', on=keys)
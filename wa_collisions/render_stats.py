@@ -9,9 +9,14 @@ October 2016.
 
 # import packages
 import os
-from datetime import datetime
-import geopandas
 
+import numpy as np
+import pandas as pd
+
+import wa_collisions.frame_cache as frame_cache
+from wa_collisions.aggregation_cube import AggregationCube
+from wa_collisions.aggregation_cube import build_cube
+import wa_collisions.neighborhood_reader as neighborhood_reader
 import wa_collisions.read_clean_integrate_data as read_clean_integrate_data
 
 VALID_RESAMPLE_TYPES = ['M', 'W', 'D']
@@ -20,7 +25,8 @@ VALID_RESAMPLE_TYPES = ['M', 'W', 'D']
 GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
 
 def read_collision_with_neighborhoods(file_path, contains_neighborhood=False
-                                      , geo_path_root=''):
+                                      , geo_path_root='', cache_path=None,
+                                      cache_folder=None):
     """
     Read in the collision dataframe.
 
@@ -35,6 +41,12 @@ def read_collision_with_neighborhoods(file_path, contains_neighborhood=False
             significantly.
         geo_path_root: allows user to add a prefix to the default path
             for the neighborhood shape file GEO_PATH.
+        cache_path: path of the neighborhood assignment cache. When given
+            and contains_neighborhood is false, only the collisions which
+            are new or have moved since the last call are assigned.
+        cache_folder: folder of the frame cache. When given, the cleaned
+            collisions are read from the cache unless the files or the
+            arguments changed since they were written.
 
     Returns:
         dataframe of data from the collision data file and containing
@@ -47,6 +59,16 @@ def read_collision_with_neighborhoods(file_path, contains_neighborhood=False
             is not of type string.
     """
 
+    if cache_folder is not None:
+        sources = [file_path]
+        if not contains_neighborhood and isinstance(geo_path_root, str):
+            sources.append(geo_path_root + GEO_PATH)
+        return frame_cache.cached_frame(
+            cache_folder, 'collisions_with_neighborhoods', sources,
+            {'contains_neighborhood': contains_neighborhood},
+            lambda: read_collision_with_neighborhoods(
+                file_path, contains_neighborhood, geo_path_root, cache_path))
+
     data = read_clean_integrate_data.read_collision_data(file_path)
 
     if contains_neighborhood and 'object_id' not in data.columns:
@@ -60,7 +82,8 @@ def read_collision_with_neighborhoods(file_path, contains_neighborhood=False
 
     if not contains_neighborhood:
         geo_path = geo_path_root + GEO_PATH
-        data = read_clean_integrate_data.clean_collisions_neighborhoods(data, geo_path)
+        data = read_clean_integrate_data.clean_collisions_neighborhoods(
+            data, geo_path, cache_path=cache_path)
     else:
         data = read_clean_integrate_data.clean_collision_data(data)
 
@@ -79,8 +102,14 @@ def pivot_by_treatment(
     Uses the input file path to find the csv file with the collision
     data from Washington state.
 
+    The collisions are first grouped by day and neighborhood. Passing
+    an AggregationCube built once with aggregation_cube.build_cube
+    instead of the dataframe skips that step, which makes each call a
+    reduction over the cells of the cube.
+
     Args:
-        input_frame: the dataframe containing the collision data
+        input_frame: the dataframe containing the collision data, or an
+            AggregationCube built from it
         treatment_list: a list containing the names of the neighborhoods
             in the treatment group. For the purpose of this study, this
             is neighborhoods where the speed limit changed.
@@ -112,59 +141,100 @@ def pivot_by_treatment(
         ValueError: raises this error when resample_by does not contain
             either 'D','W' or 'M'.
         ValueError: raises this error when agg_by is not None or a string.
+        ValueError: raises this error when a name of treatment_list or
+            control_list is not a neighborhood of neighborhood_path.
     """
 
-    if 'object_id' not in input_frame.columns:
-        raise ValueError("input_frame does not contain the id of the \
-            neighborhood, called 'object_id'. Please add this field.")
-
-    if not os.path.exists(neighborhood_path):
-        raise ValueError("neighborhood_path doesn't exist: " + str(neighborhood_path))
+    return pivot_many(input_frame, [{'treatment_list': treatment_list,
+                                     'control_list': control_list,
+                                     'agg_by': agg_by,
+                                     'resample_by': resample_by}],
+                      neighborhood_path=neighborhood_path)[0]
 
-    if resample_by not in VALID_RESAMPLE_TYPES:
-        raise ValueError("Parameter resample_by must be one of: " \
-            + str(VALID_RESAMPLE_TYPES))
-
-    if not isinstance(agg_by, str) and agg_by is not None:
-        raise ValueError("agg_by must be either None or of type string.")
+def pivot_many(
+        input_frame,
+        specs,
+        neighborhood_path='wa_collisions/data/Neighborhoods/Neighborhoods.json'):
+    """
+    Builds several pivots of pivot_by_treatment from one scan of the data.
 
-    if agg_by not in input_frame.columns and agg_by is not None:
-        raise ValueError("agg_by must be either None or a valid column")
+    The collisions are grouped once by day, neighborhood and the flags
+    the specs filter on, summing the fields they aggregate by. Each pivot
+    is then a reduction over the groups, so a batch of pivots costs about
+    as much as a single one.
 
-    data = input_frame.copy()
+    Args:
+        input_frame: the dataframe containing the collision data, or an
+            AggregationCube built from it
+        specs: a list of dicts, one per pivot, with the keys
+            treatment_list, and optionally control_list, agg_by and
+            resample_by, see pivot_by_treatment, and where, a dict of
+            the value of columns the collisions must have, such as
+            {'ind_speeding': True} or {'roadcond': 'Wet'}. A collision
+            is kept like the rows of input_frame[input_frame[column] == value].
+        neighborhood_path (default = '../wa_collisions/data
+            /Neighborhoods/Neighborhoods.json'): a path to the json
+            file which contains the Seattle neighborhoods.
 
-    neighborhoods_df = geopandas.read_file(neighborhood_path)
+    Returns:
+        a list of the pivoted dataframes, in the order of the specs.
 
-    #Find treatment groups by id
-    treatment_ids = _find_neighborhoods_ids(input_list=treatment_list
-                                            , neighborhoods_df=neighborhoods_df)
+    Raises:
+        ValueError: raises this error when the dataframe does not contain
+            a column called 'object_id'.
+        ValueError: raises this error when neighborhood_path is not a valid
+            path.
+        ValueError: raises this error when a spec has no treatment_list
+            or an unknown key.
+        ValueError: raises this error when resample_by does not contain
+            either 'D','W' or 'M'.
+        ValueError: raises this error when agg_by is not None or a valid
+            column, or a flag of where is not a valid column.
+        ValueError: raises this error when a name of treatment_list or
+            control_list is not a neighborhood of neighborhood_path.
+    """
 
-    #Find control group
-    if control_list is None or control_list == []:
-        control_ids = list(set(neighborhoods_df['OBJECTID'].unique()) - set(treatment_ids))
-    else:
-        control_ids = _find_neighborhoods_ids(input_list=control_list
-                                              , neighborhoods_df=neighborhoods_df)
+    is_cube = isinstance(input_frame, AggregationCube)
+    if not is_cube and 'object_id' not in input_frame.columns:
+        raise ValueError("input_frame does not contain the id of the \
+            neighborhood, called 'object_id'. Please add this field.")
 
-    #Filter data
-    data = data[data['object_id'].isin(treatment_ids) | data['object_id'].isin(control_ids)]
+    if not os.path.exists(neighborhood_path):
+        raise ValueError("neighborhood_path doesn't exist: " + str(neighborhood_path))
 
-    #Add speed limit change
-    data['speedlimit_change_flag'] = data['object_id'].isin(treatment_ids)
+    specs = [_check_spec(spec, input_frame.measures if is_cube else input_frame.columns,
+                         input_frame.flags if is_cube else input_frame.columns)
+             for spec in specs]
 
-    #Pivot data
-    if agg_by is None:
-        data = data.groupby(['time', 'speedlimit_change_flag']).size()
+    if is_cube:
+        cube = input_frame
     else:
-        data = data.groupby(['time', 'speedlimit_change_flag'])[agg_by].sum()
-
-    data = data.unstack()
-    data = data.fillna(0)
-    data = data.rename(columns={True: "SpeedLimitChange", False: "SpeedLimitSame"})
-    data = data[['SpeedLimitChange', 'SpeedLimitSame']]
-
-    #Resample data
-    return data.resample(resample_by).sum()
+        measures = sorted(set(spec['agg_by'] for spec in specs) - set([None]))
+        flags = sorted(set(flag for spec in specs for flag in spec['where']))
+        cube = build_cube(input_frame, measures=measures, flags=flags)
+
+    registry = neighborhood_reader.load_neighborhood_registry(neighborhood_path)
+
+    pivots = []
+    daily_pivots = {}
+    for spec in specs:
+        #Find treatment groups by id
+        treatment_ids = registry.neighborhood_ids(spec['treatment_list'])
+
+        #Find control group
+        if spec['control_list'] is None or spec['control_list'] == []:
+            control_ids = registry.other_ids(treatment_ids)
+        else:
+            control_ids = registry.neighborhood_ids(spec['control_list'])
+
+        #Specs which only differ by resample_by share the daily pivot
+        key = (tuple(sorted(treatment_ids)), tuple(sorted(control_ids)), spec['agg_by'],
+               tuple(sorted(spec['where'].items())))
+        if key not in daily_pivots:
+            daily_pivots[key] = cube.pivot(treatment_ids, control_ids, spec['agg_by'],
+                                           'D', spec['where'])
+        pivots.append(daily_pivots[key].resample(spec['resample_by']).sum())
+    return pivots
 
 def find_period_ranges(input_frame, transition_date="2016-10-01"):
     """
@@ -193,50 +263,98 @@ def find_period_ranges(input_frame, transition_date="2016-10-01"):
             before the min date of the given frame or after the max
             date of the given frame.
     """
-    min_date = input_frame.index.min()
-    max_date = input_frame.index.max()
+    return find_many_period_ranges(input_frame, [transition_date])[1][0]
 
-    transition_datetime = datetime.strptime(transition_date, '%Y-%m-%d')
-    if transition_datetime <= min_date or transition_datetime >= max_date:
-        raise ValueError("transition_date {0} must be between the minimum \
-                         and maximum frame dates.".format(transition_date))
+def find_many_period_ranges(input_frame, transition_dates):
+    """
+    Finds the pre and post periods of several transition dates at once.
 
-    actual_transition = input_frame.ix[input_frame.index.
-                                       get_loc(transition_datetime, method='nearest')].name
+    Each transition falls between two dates of the frame, the last one
+    before it and the first one on or after it. The nearest of the two,
+    as in find_period_ranges, is always one of them, so the post period
+    starts at the first date on or after the transition, which is found
+    for every transition with a single binary search.
 
-    if actual_transition < transition_datetime:
-        pre_end = actual_transition
-        post_start = input_frame.ix[input_frame.index.
-                                    get_loc(transition_datetime, method='nearest')+1].name
-    else:
-        pre_end = input_frame.ix[input_frame.index.
-                                 get_loc(transition_datetime, method='nearest')-1].name
-        post_start = actual_transition
+    Args:
+        input_frame: the dataframe returned by pivot_by_treatment, or
+            its sorted index of dates
+        transition_dates: list of dates when the pre-period ends and the
+            post period begins, as strings in the format of 'YYYY-MM-DD'
+
+    Returns:
+        a tuple of a numpy array with, for each transition, the position
+        in the frame of the end of the pre-period and of the start of the
+        post-period, and the list of the date ranges of each transition,
+        as returned by find_period_ranges.
 
-    pre_period_range = [min_date.strftime('%Y-%m-%d'), pre_end.strftime('%Y-%m-%d')]
-    post_period_range = [post_start.strftime('%Y-%m-%d'), max_date.strftime('%Y-%m-%d')]
+    Raises:
+        ValueError: raises this error when the dates of the frame are not
+            sorted.
+        ValueError: raises this error when a transition date comes
+            before the min date of the given frame or after the max
+            date of the given frame.
+    """
+    dates = input_frame.index if isinstance(input_frame, pd.DataFrame) else input_frame
+    dates = pd.DatetimeIndex(dates)
+    if not dates.is_monotonic_increasing:
+        raise ValueError("the dates of input_frame must be sorted.")
+
+    transition_dates = list(transition_dates)
+    transitions = pd.to_datetime(transition_dates, format='%Y-%m-%d').values
+    outside = (transitions <= dates.values[0]) | (transitions >= dates.values[-1])
+    if outside.any():
+        raise ValueError("transition_date {0} must be between the minimum \
+                         and maximum frame dates.".format(
+                             [transition_dates[i] for i in np.flatnonzero(outside)]))
+
+    starts = dates.values.searchsorted(transitions, side='left')
+    positions = np.column_stack([starts - 1, starts])
 
-    return [pre_period_range, post_period_range]
+    names = np.datetime_as_string(dates.values, unit='D').tolist()
+    ranges = [[[names[0], names[pre_end]], [names[post_start], names[-1]]]
+              for pre_end, post_start in positions.tolist()]
+    return positions, ranges
 
-def _find_neighborhoods_ids(input_list, neighborhoods_df):
+def _check_spec(spec, columns, flags):
     """
-    Read in a list of names of neighborhood names. Returns a list of
-    neighbhorhood ids
+    Checks a spec of pivot_many and fills in the default values.
 
     Args:
-        input_list: a list containing the names of the neighborhoods
-            in the treatment group.
-        neighborhoods_df: a dataframe containing neighborhood names
-            and object_id for each neighborhood.
+        spec: the dict describing a pivot
+        columns: the fields which can be aggregated by
+        flags: the fields which can be filtered on
 
     Returns:
-        a list of neighborhood ids corresponding wiht the given names.
+        a dict with every key of a spec.
 
+    Raises:
+        ValueError: raises this error when the spec is not valid, see
+            pivot_many.
     """
+    full_spec = {'treatment_list': None, 'control_list': None, 'agg_by': None,
+                 'resample_by': 'D', 'where': {}}
+    unknown = [key for key in spec if key not in full_spec]
+    if unknown:
+        raise ValueError("unknown keys in pivot spec: " + str(unknown))
+    full_spec.update(spec)
+    full_spec['where'] = dict(full_spec['where'] or {})
+
+    if full_spec['treatment_list'] is None:
+        raise ValueError("each pivot spec must have a treatment_list.")
+
+    if full_spec['resample_by'] not in VALID_RESAMPLE_TYPES:
+        raise ValueError("Parameter resample_by must be one of: " \
+            + str(VALID_RESAMPLE_TYPES))
+
+    agg_by = full_spec['agg_by']
+    if not isinstance(agg_by, str) and agg_by is not None:
+        raise ValueError("agg_by must be either None or of type string.")
+
+    if agg_by not in columns and agg_by is not None:
+        raise ValueError("agg_by must be either None or a valid column")
 
-    id_list = []
-    for i, _ in enumerate(input_list):
-        id_list = id_list + \
-            [int(neighborhoods_df[neighborhoods_df['S_HOOD'] == input_list[i]]['OBJECTID'])]
+    for flag in full_spec['where']:
+        if flag not in flags:
+            raise ValueError("where must only contain valid columns, not " + str(flag))
 
-    return id_list
+    return full_spec
@@ -0,0 +1,89 @@
+"""
+Unittests for aggregation_cube.py
+"""
+
+import unittest
+import numpy as np
+from wa_collisions.aggregation_cube import build_cube
+from wa_collisions.read_clean_integrate_data import clean_collision_data
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+# store the relative path to the Collisions data with neighborhoods
+FILE_PATH_NBRHD = 'wa_collisions/data/Collisions_With_Neighborhoods_test.csv'
+
+DF_NEIGHBORHOODS = clean_collision_data(read_collision_data(FILE_PATH_NBRHD))
+CUBE = build_cube(DF_NEIGHBORHOODS)
+
+# object ids of the treatment and control neighborhoods used in the tests
+TREATMENT_IDS = list(range(1, 60))
+CONTROL_IDS = list(range(60, 120))
+
+# Define a class in which the tests will run
+class AggregationCubeTest(unittest.TestCase):
+    """
+    Unittests for aggregation_cube
+    """
+
+    def test_cells(self):
+        """
+        Tests that the cells hold every collision and every injury
+        """
+        self.assertTrue(CUBE.cells['count'].sum() == DF_NEIGHBORHOODS.shape[0])
+        self.assertTrue(CUBE.cells['injuries'].sum() == DF_NEIGHBORHOODS['injuries'].sum())
+        self.assertTrue('ind_speeding' in CUBE.flags)
+
+    def test_pivot(self):
+        """
+        Tests that the pivots of the cube count the collisions of each
+        group, for each level of resampling
+        """
+        in_treatment = DF_NEIGHBORHOODS['object_id'].isin(TREATMENT_IDS)
+        in_control = DF_NEIGHBORHOODS['object_id'].isin(CONTROL_IDS)
+        for resample_by in ['D', 'W', 'M']:
+            out = CUBE.pivot(TREATMENT_IDS, CONTROL_IDS, resample_by=resample_by)
+            self.assertTrue(out['SpeedLimitChange'].sum() == in_treatment.sum())
+            self.assertTrue(out['SpeedLimitSame'].sum() == in_control.sum())
+
+        out = CUBE.pivot(TREATMENT_IDS, CONTROL_IDS, agg_by='injuries')
+        self.assertTrue(np.isclose(out['SpeedLimitChange'].sum(),
+                                   DF_NEIGHBORHOODS['injuries'][in_treatment].sum()))
+
+    def test_where(self):
+        """
+        Tests that the flags filter the collisions like a filter of the rows
+        """
+        speeding = DF_NEIGHBORHOODS[DF_NEIGHBORHOODS['ind_speeding']]
+        out = CUBE.pivot(TREATMENT_IDS, CONTROL_IDS, where={'ind_speeding': True})
+        self.assertTrue(out.values.sum() == speeding['object_id'].isin(
+            TREATMENT_IDS + CONTROL_IDS).sum())
+
+    def test_where_values(self):
+        """
+        Tests that columns which are not flags filter the collisions by
+        their values, keeping the collisions with a missing value
+        """
+        cube = build_cube(DF_NEIGHBORHOODS, flags=['ind_speeding', 'roadcond'])
+        in_groups = DF_NEIGHBORHOODS['object_id'].isin(TREATMENT_IDS + CONTROL_IDS)
+        wet = DF_NEIGHBORHOODS['roadcond'] == 'Wet'
+        out = cube.pivot(TREATMENT_IDS, CONTROL_IDS, where={'roadcond': 'Wet'})
+        self.assertTrue(0 < out.values.sum() == (wet & in_groups).sum())
+        out = cube.pivot(TREATMENT_IDS, CONTROL_IDS, where={'ind_speeding': False})
+        self.assertTrue(out.values.sum() == (~DF_NEIGHBORHOODS['ind_speeding'] & in_groups).sum())
+        out = cube.pivot(TREATMENT_IDS, CONTROL_IDS, where={'roadcond': 'Flooded'})
+        self.assertTrue(out.values.sum() == 0)
+
+    def test_errors(self):
+        """
+        Tests that unknown measures, flags and columns raise a value error
+        """
+        with self.assertRaises(ValueError):
+            CUBE.pivot(TREATMENT_IDS, CONTROL_IDS, agg_by='fake_column')
+        with self.assertRaises(ValueError):
+            CUBE.pivot(TREATMENT_IDS, CONTROL_IDS, where={'fake_flag': True})
+        with self.assertRaises(ValueError):
+            build_cube(DF_NEIGHBORHOODS.drop(columns=['object_id']))
+        with self.assertRaises(ValueError):
+            build_cube(DF_NEIGHBORHOODS, measures=['fake_column'])
+
+if __name__ == '__main__':
+    unittest.main()
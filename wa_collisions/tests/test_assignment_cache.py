@@ -0,0 +1,158 @@
+"""
+Unittests for assignment_cache.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+from wa_collisions.assignment_cache import UNKNOWN_POSITION
+from wa_collisions.assignment_cache import AssignmentCache
+from wa_collisions.assignment_cache import layer_fingerprint
+from wa_collisions.assignment_cache import load_assignment_cache
+from wa_collisions.neighborhood_grid import build_neighborhood_grid
+from wa_collisions.neighborhood_index import NeighborhoodIndex
+from wa_collisions.neighborhood_reader import assign_neighborhood
+from wa_collisions.neighborhood_reader import load_neighborhood_index
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+# store the relative path to the Collisions data and GeoJson neighborhoods data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+
+# Define a class in which the tests will run
+class AssignmentCacheTest(unittest.TestCase):
+    """
+    Unittests for assignment_cache
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.folder, 'assignments.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_lookup_by_key(self):
+        """
+        Tests that a collision is a hit by key only while its
+        coordinates are unchanged
+        """
+        cache = AssignmentCache('abc')
+        cache.update([1, 2], [1, 2], [5, -1], keys=[10, 11])
+        positions = cache.lookup([1, 2, 3], [1, 2, 3], keys=[10, 11, 12])
+        self.assertTrue(list(positions) == [5, -1, UNKNOWN_POSITION])
+
+        # collision 10 moved to the location of collision 11
+        positions = cache.lookup([2], [2], keys=[10])
+        self.assertTrue(list(positions) == [-1])
+
+        # collision 11 moved to a new location
+        positions = cache.lookup([9], [9], keys=[11])
+        self.assertTrue(list(positions) == [UNKNOWN_POSITION])
+
+    def test_lookup_by_coordinate(self):
+        """
+        Tests that locations without keys are looked up by coordinate
+        and that missing coordinates are never in a neighborhood
+        """
+        cache = AssignmentCache('abc')
+        cache.update([1, 2], [1, 2], [5, 6])
+        positions = cache.lookup([2, 1, 3, np.nan], [2, 1, 3, 1])
+        self.assertTrue(list(positions) == [6, 5, UNKNOWN_POSITION, -1])
+
+    def test_save_load(self):
+        """
+        Tests that a saved cache loads back, and loads empty for
+        another neighborhood file
+        """
+        cache = AssignmentCache('abc')
+        cache.update([1, 2], [1, 2], [5, 6], keys=[10, 11])
+        cache.save(self.cache_path)
+
+        loaded = load_assignment_cache(self.cache_path, 'abc')
+        self.assertTrue(list(loaded.lookup([1, 2], [1, 2], keys=[10, 11])) == [5, 6])
+        self.assertTrue(len(load_assignment_cache(self.cache_path, 'other').keys) == 0)
+        self.assertTrue(len(load_assignment_cache('fakepath', 'abc').coordinates) == 0)
+
+    def test_assign_neighborhood_cached(self):
+        """
+        Tests that assigning neighborhoods through the cache returns
+        the same neighborhoods as without the cache
+        """
+        data = read_collision_data(COLLISIONS_DATA)
+        expected = assign_neighborhood(data.copy())
+        first = assign_neighborhood(data.copy(), cache_path=self.cache_path)
+        second = assign_neighborhood(data.copy(), cache_path=self.cache_path)
+        for frame in [first, second]:
+            self.assertTrue(np.array_equal(frame['object_id'], expected['object_id']))
+            self.assertTrue(frame['s_hood'].equals(expected['s_hood']))
+
+        # collisions without a location are never cached
+        cache = load_assignment_cache(self.cache_path,
+                                      layer_fingerprint(load_neighborhood_index(GEO_PATH)))
+        located = data.dropna(subset=['X', 'Y'])
+        self.assertTrue(len(cache.keys) == located['inckey'].nunique())
+
+    def test_assign_neighborhood_moved(self):
+        """
+        Tests that a cached collision which moved is assigned again
+        """
+        data = pd.DataFrame({'X': [-122.3230027], 'Y': [47.6199206], 'inckey': [1]})
+        assign_neighborhood(data.copy(), cache_path=self.cache_path)
+        data['X'] = 0
+        moved = assign_neighborhood(data.copy(), cache_path=self.cache_path)
+        self.assertTrue(list(moved['object_id']) == [-1])
+
+    def test_assign_neighborhood_stats(self):
+        """
+        Tests that the collisions found in the cache are counted in the
+        tests saved
+        """
+        data = pd.DataFrame({'X': [-122.3230027, -122.3230027, 0],
+                             'Y': [47.6199206, 47.6199206, 0], 'inckey': [1, 2, 3]})
+        _, tests_saved = assign_neighborhood(data.iloc[:2].copy(), cache_path=self.cache_path,
+                                             return_stats=True)
+        self.assertTrue(tests_saved == 1)
+        _, tests_saved = assign_neighborhood(data.copy(), cache_path=self.cache_path,
+                                             return_stats=True)
+        self.assertTrue(tests_saved == 2)
+
+    def test_assign_neighborhood_other_grid(self):
+        """
+        Tests that a grid over another layer doesn't use the assignments
+        cached for the neighborhood file
+        """
+        data = pd.DataFrame({'X': [-122.3230027], 'Y': [47.6199206], 'inckey': [1]})
+        first = assign_neighborhood(data.copy(), cache_path=self.cache_path)
+        self.assertTrue(list(first['object_id']) == [100])
+
+        layer = pd.DataFrame({'OBJECTID': [7], 'S_HOOD': ['Box'], 'L_HOOD': ['BOX'],
+                              'geometry': [box(-122.5, 47.4, -122.2, 47.8)]})
+        grid = build_neighborhood_grid(NeighborhoodIndex(layer), cell_size=0.05)
+        other = assign_neighborhood(data.copy(), grid=grid, cache_path=self.cache_path)
+        self.assertTrue(list(other['object_id']) == [7])
+
+    def test_string_keys(self):
+        """
+        Tests that collisions keyed by a string column are cached, saved
+        and loaded with their keys
+        """
+        data = read_collision_data(COLLISIONS_DATA)
+        expected = assign_neighborhood(data.copy())
+        for _ in range(2):
+            cached = assign_neighborhood(data.copy(), cache_path=self.cache_path,
+                                         key_column='reportno')
+            self.assertTrue(np.array_equal(cached['object_id'], expected['object_id']))
+
+        cache = load_assignment_cache(self.cache_path,
+                                      layer_fingerprint(load_neighborhood_index(GEO_PATH)))
+        located = data.dropna(subset=['X', 'Y', 'reportno'])
+        self.assertTrue(len(cache.keys) == located['reportno'].nunique())
+        self.assertTrue(set(cache.keys['key']) == set(located['reportno'].astype(str)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Unittests for datetime_parser.py
+"""
+
+import unittest
+import numpy as np
+import pandas as pd
+from wa_collisions.datetime_parser import CALENDAR_FIELDS
+from wa_collisions.datetime_parser import calendar_fields
+from wa_collisions.datetime_parser import parse_datetimes
+
+# Define a class in which the tests will run
+class DatetimeParserTest(unittest.TestCase):
+    """
+    Unittests for datetime_parser
+    """
+
+    def test_known_formats(self):
+        """
+        Tests that the collision and weather formats are parsed
+        """
+        values = ['11/13/2016 11:10', '1/2/2004', '3/4/2010 1:05:09 PM',
+                  '12/1/2010 12:30 AM', '2016-11-13T00:00:00.000Z', '2014-01-01 00:53',
+                  None, '11/13/2016 11:10']
+        expected = pd.to_datetime(['2016-11-13 11:10', '2004-01-02', '2010-03-04 13:05:09',
+                                   '2010-12-01 00:30', '2016-11-13', '2014-01-01 00:53',
+                                   None, '2016-11-13 11:10'])
+        parsed = parse_datetimes(values)
+        self.assertTrue(parsed.dtype == np.dtype('datetime64[ns]'))
+        self.assertTrue(pd.DatetimeIndex(parsed).equals(expected))
+
+    def test_all_missing(self):
+        """
+        Tests that values which are all missing are parsed as NaT
+        """
+        parsed = parse_datetimes([None, np.nan])
+        self.assertTrue(parsed.dtype == np.dtype('datetime64[ns]'))
+        self.assertTrue(np.isnat(parsed).all() and len(parsed) == 2)
+        self.assertTrue(len(parse_datetimes([])) == 0)
+
+    def test_other_formats(self):
+        """
+        Tests that other formats fall back to pandas and that values
+        which can't be parsed raise a value error
+        """
+        parsed = parse_datetimes(['Jan 5 2012', '2014-01-01 00:53'])
+        self.assertTrue(str(parsed[0]).startswith('2012-01-05'))
+        with self.assertRaises(ValueError):
+            parse_datetimes(['not a date'])
+
+    def test_calendar_fields(self):
+        """
+        Tests that the calendar fields match the datetime accessors,
+        before 1970 and over leap years too
+        """
+        times = pd.date_range('1890-01-01', '2030-12-31', freq='37h').values
+        fields = calendar_fields(times)
+        for field in CALENDAR_FIELDS:
+            self.assertTrue(np.array_equal(fields[field],
+                                           getattr(pd.Series(times).dt, field).values))
+
+        fields = calendar_fields(parse_datetimes(['2/29/2016 23:59', None]))
+        self.assertTrue(fields['day'][0] == 29 and fields['minute'][0] == 59)
+        self.assertTrue(np.isnan(fields['year'][1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Unittests for frame_cache.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from wa_collisions.frame_cache import cached_frame
+from wa_collisions.frame_cache import source_fingerprint
+from wa_collisions.read_clean_integrate_data import integrate_data
+
+# store the relative path to the Collisions data, Weather data and GeoJson neighborhoods data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+WEATHER_DATA = "wa_collisions/data/Weather_test.csv"
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+
+# Define a class in which the tests will run
+class FrameCacheTest(unittest.TestCase):
+    """
+    Unittests for frame_cache
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, 'source.csv')
+        with open(self.source, 'w') as source_file:
+            source_file.write('a\n1\n')
+        self.builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def build(self):
+        """
+        Builds a small frame and counts the builds
+        """
+        self.builds += 1
+        return pd.DataFrame({'a': [1, 2], 'b': pd.Categorical(['x', 'y'])})
+
+    def test_cached_frame(self):
+        """
+        Tests that a frame is built once and then read from the cache
+        """
+        cache_folder = os.path.join(self.folder, 'cache')
+        first = cached_frame(cache_folder, 'test', [self.source], {'year': 1}, self.build)
+        second = cached_frame(cache_folder, 'test', [self.source], {'year': 1}, self.build)
+        self.assertTrue(self.builds == 1)
+        self.assertTrue(first.equals(second))
+        self.assertTrue(str(second['b'].dtype) == 'category')
+
+    def test_rebuild_on_change(self):
+        """
+        Tests that the frame is built again when an argument or a source
+        changes, and that only the latest frame is kept
+        """
+        cached_frame(self.folder, 'test', [self.source], {'year': 1}, self.build)
+        cached_frame(self.folder, 'test', [self.source], {'year': 2}, self.build)
+        self.assertTrue(self.builds == 2)
+
+        with open(self.source, 'a') as source_file:
+            source_file.write('2\n')
+        cached_frame(self.folder, 'test', [self.source], {'year': 2}, self.build)
+        self.assertTrue(self.builds == 3)
+        self.assertTrue(len([name for name in os.listdir(self.folder)
+                             if name.endswith('.parquet')]) == 1)
+
+    def test_missing_source(self):
+        """
+        Tests that a missing source file raises a value error
+        """
+        with self.assertRaises(ValueError):
+            source_fingerprint(['fakepath'])
+
+    def test_integrate_data_cached(self):
+        """
+        Tests that the cached integrated data matches the integrated data
+        """
+        expected = integrate_data(COLLISIONS_DATA, 2014, WEATHER_DATA, GEO_PATH)
+        for _ in range(2):
+            cached = integrate_data(COLLISIONS_DATA, 2014, WEATHER_DATA, GEO_PATH,
+                                    cache_folder=self.folder)
+            self.assertTrue(cached.shape == expected.shape)
+            self.assertTrue(list(cached['object_id']) == list(expected['object_id']))
+            self.assertTrue(list(cached['time']) == list(expected['time']))
+
+if __name__ == '__main__':
+    unittest.main()
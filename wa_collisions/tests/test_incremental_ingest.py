@@ -0,0 +1,148 @@
+"""
+Unittests for incremental_ingest.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from wa_collisions.incremental_ingest import STATE_NAME
+from wa_collisions.incremental_ingest import ingest_collisions
+from wa_collisions.incremental_ingest import load_ingest_state
+from wa_collisions.partitioned_store import read_partitioned_collisions
+from wa_collisions.read_clean_integrate_data import clean_collisions_neighborhoods
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+# store the relative path to the Collisions data and GeoJson neighborhoods data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+
+# Define a class in which the tests will run
+class IncrementalIngestTest(unittest.TestCase):
+    """
+    Unittests for incremental_ingest
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, 'collisions.csv')
+        self.store = os.path.join(self.folder, 'store')
+        self.data = read_collision_data(COLLISIONS_DATA, projected=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def ingest(self, data, **arguments):
+        """
+        Writes the collision file and ingests it
+        """
+        data.to_csv(self.source, index=False)
+        return ingest_collisions(self.source, self.store, GEO_PATH, **arguments)
+
+    def latest_located(self):
+        """
+        Returns the position of the latest collision with a location
+        """
+        times = pd.to_datetime(self.data['incdttm'])
+        return times[self.data['X'].notnull()].idxmax()
+
+    def test_ingest_delta(self):
+        """
+        Tests that each run only ingests the new and updated collisions
+        and that the store holds the current collisions
+        """
+        summary = self.ingest(self.data.iloc[:50])
+        self.assertTrue(summary['new'] == 50 and summary['updated'] == 0)
+
+        summary = self.ingest(self.data)
+        self.assertTrue(summary['new'] == self.data.shape[0] - 50)
+        self.assertTrue(summary['updated'] == 0)
+
+        summary = self.ingest(self.data)
+        self.assertTrue(summary['new'] == 0 and summary['updated'] == 0)
+
+        updated = self.data.copy()
+        located = self.latest_located()
+        updated.loc[located, 'injuries'] = 7
+        summary = self.ingest(updated)
+        self.assertTrue(summary['new'] == 0 and summary['updated'] == 1)
+
+        expected = clean_collisions_neighborhoods(read_collision_data(self.source), GEO_PATH)
+        stored = read_partitioned_collisions(self.store).sort_values('inckey')
+        expected = expected.sort_values('inckey')
+        self.assertTrue(list(stored['inckey']) == list(expected['inckey']))
+        self.assertTrue(list(stored['injuries']) == list(expected['injuries']))
+        self.assertTrue(list(stored['object_id']) == list(expected['object_id']))
+        self.assertTrue(summary['high_water'] == expected['time'].max())
+
+    def test_updated_month(self):
+        """
+        Tests that a collision updated to another month is removed from
+        the month it was stored in
+        """
+        self.ingest(self.data)
+        updated = self.data.copy()
+        located = self.latest_located()
+        updated.loc[located, 'incdttm'] = '1/2/2001 10:00'
+        updated.loc[located, 'incdate'] = '2001-01-02T00:00:00.000Z'
+        self.ingest(updated)
+
+        stored = read_partitioned_collisions(self.store)
+        moved = stored[stored['inckey'] == updated.loc[located, 'inckey']]
+        self.assertTrue(list(moved['year']) == [2001])
+
+        state = load_ingest_state(os.path.join(self.store, STATE_NAME))
+        self.assertTrue(len(state.collisions) == self.data['inckey'].nunique())
+
+    def test_missing_time(self):
+        """
+        Tests that a collision with a location but no time is left out
+        of the store and counted, and removed from the month it was
+        stored in when its time is blanked
+        """
+        blanked = self.data.copy()
+        blanked.loc[1, 'incdttm'] = None
+        self.assertTrue(pd.notnull(blanked.loc[1, 'X']))
+        summary = self.ingest(blanked)
+        self.assertTrue(summary['missing_time'] == 1)
+        stored = read_partitioned_collisions(self.store)
+        self.assertTrue(blanked.loc[1, 'inckey'] not in set(stored['inckey']))
+
+        state = load_ingest_state(os.path.join(self.store, STATE_NAME))
+        entry = state.collisions[state.collisions['key'] == blanked.loc[1, 'inckey']]
+        self.assertTrue(list(entry['month']) == [-1])
+        summary = self.ingest(blanked)
+        self.assertTrue(summary['new'] == 0 and summary['updated'] == 0)
+
+        # the time of a stored collision is removed
+        self.ingest(self.data, look_back_days=None)
+        summary = self.ingest(blanked, look_back_days=None)
+        self.assertTrue(summary['updated'] == 1 and summary['missing_time'] == 1)
+        stored = read_partitioned_collisions(self.store)
+        self.assertTrue(blanked.loc[1, 'inckey'] not in set(stored['inckey']))
+
+    def test_look_back(self):
+        """
+        Tests that known collisions older than the look back window are
+        not compared again, unless the look back is None
+        """
+        self.ingest(self.data)
+        times = pd.to_datetime(self.data['incdttm'])
+        oldest = times[self.data['X'].notnull()].idxmin()
+        updated = self.data.copy()
+        updated.loc[oldest, 'injuries'] = 7
+
+        summary = self.ingest(updated)
+        self.assertTrue(summary['updated'] == 0)
+        self.assertTrue(summary['compared'] < self.data.shape[0] / 2)
+
+        summary = self.ingest(updated, look_back_days=None)
+        self.assertTrue(summary['updated'] == 1)
+        self.assertTrue(summary['compared'] == self.data['inckey'].nunique())
+
+        with self.assertRaises(ValueError):
+            self.ingest(updated, look_back_days=-1)
+
+if __name__ == '__main__':
+    unittest.main()
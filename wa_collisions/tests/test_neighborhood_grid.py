@@ -0,0 +1,107 @@
+"""
+Unittests for neighborhood_grid.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from wa_collisions.neighborhood_grid import build_neighborhood_grid
+from wa_collisions.neighborhood_grid import save_neighborhood_grid
+from wa_collisions.neighborhood_grid import load_neighborhood_grid
+from wa_collisions.neighborhood_index import NeighborhoodIndex
+from wa_collisions.neighborhood_reader import assign_neighborhood
+from wa_collisions.neighborhood_reader import get_neighborhood
+from wa_collisions.neighborhood_reader import pull_neighborhoods_file
+
+# a coarse grid keeps the build fast in the tests
+CELL_SIZE = 0.005
+
+INDEX = NeighborhoodIndex(pull_neighborhoods_file())
+GRID = build_neighborhood_grid(INDEX, CELL_SIZE)
+
+# Define a class in which the tests will run
+class NeighborhoodGridTest(unittest.TestCase):
+    """
+    Unittests for neighborhood_grid
+    """
+
+    def test_query_matches_index(self):
+        """
+        Tests that the grid returns the same positions as the
+        exact index for locations spread over Seattle
+        """
+        generator = np.random.RandomState(0)
+        minx, miny = INDEX.bounds[:, :2].min(axis=0) - 0.01
+        maxx, maxy = INDEX.bounds[:, 2:].max(axis=0) + 0.01
+        x_values = generator.uniform(minx, maxx, 5000)
+        y_values = generator.uniform(miny, maxy, 5000)
+        self.assertTrue(np.array_equal(GRID.query(x_values, y_values),
+                                       INDEX.query(x_values, y_values)))
+
+    def test_boundary_fraction(self):
+        """
+        Tests that only part of the cells need the exact test
+        """
+        self.assertTrue(0 < GRID.boundary_fraction < 1)
+
+    def test_bad_cell_size(self):
+        """
+        Tests that a non positive cell size raises a value error
+        """
+        with self.assertRaises(ValueError):
+            build_neighborhood_grid(INDEX, 0)
+        with self.assertRaises(ValueError):
+            build_neighborhood_grid(INDEX, 'a')
+
+    def test_save_load(self):
+        """
+        Tests that a saved grid loads back with the same cells and
+        that loading it over other neighborhoods raises a value error
+        """
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'grid.npz')
+            save_neighborhood_grid(GRID, path)
+            loaded = load_neighborhood_grid(path, INDEX)
+            self.assertTrue(np.array_equal(loaded.codes, GRID.codes))
+            self.assertTrue(loaded.cell_size == GRID.cell_size)
+
+            other = NeighborhoodIndex(pull_neighborhoods_file().iloc[:10])
+            with self.assertRaises(ValueError):
+                load_neighborhood_grid(path, other)
+
+            # the same ids over edited polygons
+            edited = pull_neighborhoods_file()
+            edited.loc[0, 'geometry'] = edited.loc[0, 'geometry'].buffer(0.001)
+            with self.assertRaises(ValueError):
+                load_neighborhood_grid(path, NeighborhoodIndex(edited))
+        finally:
+            shutil.rmtree(folder)
+
+        with self.assertRaises(ValueError):
+            load_neighborhood_grid('fakepath', INDEX)
+
+    def test_get_neighborhood_grid(self):
+        """
+        Tests that get_neighborhood resolves locations with a grid
+        """
+        object_id, s_hood, _ = get_neighborhood(-122.3230027, 47.6199206, GRID)
+        self.assertTrue(object_id == 100)
+        self.assertTrue(s_hood == 'Broadway')
+        object_id, s_hood, l_hood = get_neighborhood(0, 0, GRID)
+        self.assertTrue(object_id == -1)
+        self.assertTrue(s_hood is None and l_hood is None)
+
+    def test_assign_neighborhood_grid(self):
+        """
+        Tests that assign_neighborhood resolves locations with a grid
+        """
+        test_data = {"X": [0, -122.3230027], "Y":[0, 47.6199206]}
+        neighborhoods = assign_neighborhood(pd.DataFrame(data=test_data), grid=GRID)
+        self.assertTrue(list(neighborhoods["object_id"]) == [-1, 100])
+
+if __name__ == '__main__':
+    unittest.main()
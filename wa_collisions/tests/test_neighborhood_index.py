@@ -0,0 +1,116 @@
+"""
+Unittests for neighborhood_index.py
+"""
+
+import unittest
+import numpy as np
+from wa_collisions.neighborhood_index import NeighborhoodIndex
+from wa_collisions.neighborhood_index import query_in_parallel
+from wa_collisions.neighborhood_index import query_unique
+from wa_collisions.neighborhood_index import UniqueLocations
+from wa_collisions.neighborhood_reader import get_neighborhood
+from wa_collisions.neighborhood_reader import pull_neighborhoods_file
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+# store the relative path to the Collisions data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+
+# Define a class in which the tests will run
+class NeighborhoodIndexTest(unittest.TestCase):
+    """
+    Unittests for neighborhood_index
+    """
+
+    def test_index_size(self):
+        """
+        Tests that the index holds one entry per neighborhood
+        """
+        index = NeighborhoodIndex(pull_neighborhoods_file())
+        self.assertTrue(len(index) == 119)
+        self.assertTrue(index.bounds.shape == (119, 4))
+
+    def test_query_matches_get_neighborhood(self):
+        """
+        Tests that the bulk query returns the same neighborhoods
+        as get_neighborhood for every location in the test data
+        """
+        neighborhoods = pull_neighborhoods_file()
+        index = NeighborhoodIndex(neighborhoods)
+        data = read_collision_data(COLLISIONS_DATA).dropna(subset=['X', 'Y'])
+        positions = index.query(data['X'].values, data['Y'].values)
+        for i, (x, y) in enumerate(zip(data['X'], data['Y'])):
+            object_id, _, _ = get_neighborhood(x, y, neighborhoods)
+            expected = -1 if positions[i] < 0 else index.object_ids[positions[i]]
+            self.assertTrue(object_id == expected)
+
+    def test_query_misses(self):
+        """
+        Tests that locations outside of Seattle and missing
+        locations return -1
+        """
+        index = NeighborhoodIndex(pull_neighborhoods_file())
+        positions = index.query([0, np.nan, -122.3230027], [0, np.nan, 47.6199206])
+        self.assertTrue(positions[0] == -1)
+        self.assertTrue(positions[1] == -1)
+        self.assertTrue(index.object_ids[positions[2]] == 100)
+
+    def test_query_length_mismatch(self):
+        """
+        Tests that passing coordinates of different lengths
+        raises a value error
+        """
+        index = NeighborhoodIndex(pull_neighborhoods_file())
+        with self.assertRaises(ValueError):
+            index.query([0, 1], [0])
+
+    def test_query_in_parallel(self):
+        """
+        Tests that querying with a pool of processes returns the
+        same positions, in the same order, as a single process
+        """
+        index = NeighborhoodIndex(pull_neighborhoods_file())
+        data = read_collision_data(COLLISIONS_DATA)
+        expected = index.query(data['X'].values, data['Y'].values)
+        positions = query_in_parallel(index, data['X'].values, data['Y'].values, 2)
+        self.assertTrue(np.array_equal(positions, expected))
+
+    def test_query_in_parallel_workers(self):
+        """
+        Tests that passing an invalid number of workers raises
+        a value error
+        """
+        index = NeighborhoodIndex(pull_neighborhoods_file())
+        with self.assertRaises(ValueError):
+            query_in_parallel(index, [0], [0], 0)
+        with self.assertRaises(ValueError):
+            query_in_parallel(index, [0], [0], 'a')
+
+    def test_unique_locations(self):
+        """
+        Tests that repeated and missing coordinates are counted
+        as saved tests and broadcast back to every location
+        """
+        locations = UniqueLocations([1, 2, 1, np.nan, 1], [5, 6, 5, 7, 6])
+        self.assertTrue(len(locations) == 5)
+        self.assertTrue(locations.unique_count == 3)
+        self.assertTrue(locations.tests_saved == 2)
+        values = locations.broadcast(np.arange(locations.unique_count))
+        self.assertTrue(values[0] == values[2])
+        self.assertTrue(values[3] == -1)
+        self.assertTrue(len(set(values[[0, 1, 4]])) == 3)
+
+    def test_query_unique(self):
+        """
+        Tests that querying the unique locations returns the same
+        positions as querying every location
+        """
+        index = NeighborhoodIndex(pull_neighborhoods_file())
+        data = read_collision_data(COLLISIONS_DATA)
+        x_values = np.concatenate([data['X'].values, data['X'].values])
+        y_values = np.concatenate([data['Y'].values, data['Y'].values])
+        positions, locations = query_unique(index, x_values, y_values)
+        self.assertTrue(np.array_equal(positions, index.query(x_values, y_values)))
+        self.assertTrue(locations.tests_saved >= len(data))
+
+if __name__ == '__main__':
+    unittest.main()
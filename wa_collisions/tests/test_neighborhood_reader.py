@@ -2,11 +2,22 @@
 Unittests for neighborhood_reader.py
 """
 
+import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
+from shapely.geometry import box
+from wa_collisions.neighborhood_reader import assign_layers
 from wa_collisions.neighborhood_reader import assign_neighborhood
+from wa_collisions.neighborhood_reader import NEIGHBORHOOD_LAYER
 from wa_collisions.neighborhood_reader import get_neighborhood
+from wa_collisions.neighborhood_reader import get_neighborhoods
 from wa_collisions.neighborhood_reader import pull_neighborhoods_file
+from wa_collisions.neighborhood_reader import load_neighborhoods
+from wa_collisions.neighborhood_reader import load_neighborhoods_geojson
+from wa_collisions.neighborhood_reader import clear_neighborhood_cache
 from wa_collisions.neighborhood_reader import _find_neighborhood_count
 
 # store the relative path to the GeoJson neighborhoods data
@@ -54,6 +65,52 @@ class NeighborhoodReaderTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             get_neighborhood(-122.3230027, "a", neighborhoods)
 
+    def test_get_neighborhoods(self):
+        """
+        Tests that the batch lookup returns object ids and
+        categorical names for arrays of locations
+        """
+        object_ids, s_hoods, l_hoods = get_neighborhoods(
+            np.array([0, -122.3230027]), np.array([0, 47.6199206]))
+        self.assertTrue(list(object_ids) == [-1, 100])
+        self.assertTrue(isinstance(s_hoods, pd.Categorical))
+        self.assertTrue(isinstance(l_hoods, pd.Categorical))
+        self.assertTrue(pd.isnull(s_hoods[0]))
+        self.assertTrue(s_hoods[1] == 'Broadway')
+        self.assertTrue(l_hoods[1] == 'CAPITOL HILL')
+
+    def test_get_neighborhoods_series(self):
+        """
+        Tests that the batch lookup accepts a pair of pandas series
+        and matches get_neighborhood
+        """
+        neighborhoods = pull_neighborhoods_file()
+        x_values = pd.Series([-122.3230027, -122.3794907, 0])
+        y_values = pd.Series([47.6199206, 47.69060081, 0])
+        object_ids, _, _ = get_neighborhoods(x_values, y_values, neighborhoods)
+        for i, object_id in enumerate(object_ids):
+            expected, _, _ = get_neighborhood(x_values[i], y_values[i], neighborhoods)
+            self.assertTrue(object_id == expected)
+
+    def test_get_neighborhoods_stats(self):
+        """
+        Tests that the batch lookup returns the number of tests saved
+        by repeated and missing coordinates when asked
+        """
+        object_ids, _, _, tests_saved = get_neighborhoods(
+            np.array([-122.3230027, -122.3230027, np.nan, 0]),
+            np.array([47.6199206, 47.6199206, 47.6199206, 0]), return_stats=True)
+        self.assertTrue(list(object_ids) == [100, 100, -1, -1])
+        self.assertTrue(tests_saved == 2)
+
+    def test_get_neighborhoods_length(self):
+        """
+        Tests that passing coordinates of different lengths
+        raises a value error
+        """
+        with self.assertRaises(ValueError):
+            get_neighborhoods(np.array([0, 1]), np.array([0]))
+
     def test_missing_column_x(self):
         """
         Tests that passing dataframe without column X raises error
@@ -88,6 +145,113 @@ class NeighborhoodReaderTest(unittest.TestCase):
         self.assertTrue(neighborhoods["object_id"][0] == -1)
         self.assertTrue(neighborhoods["object_id"][1] == 100)
 
+    def test_compact_columns(self):
+        """
+        Tests that assign neighborhood returns a small integer
+        object_id and categorical names
+        """
+        test_data = {"X": [0, -122.3230027], "Y":[0, 47.6199206]}
+        neighborhoods = assign_neighborhood(pd.DataFrame(data=test_data))
+        self.assertTrue(neighborhoods["object_id"].dtype == np.int16)
+        self.assertTrue(neighborhoods["s_hood"].dtype.name == 'category')
+        self.assertTrue(neighborhoods["l_hood"].dtype.name == 'category')
+        self.assertTrue(pd.isnull(neighborhoods["s_hood"][0]))
+        self.assertTrue(neighborhoods["l_hood"][1] == 'CAPITOL HILL')
+
+    def test_correct_data_workers(self):
+        """
+        Tests that assigning neighborhoods with several workers
+        returns the correct neighborhoods in the original order.
+        """
+        test_data = {"X": [0, -122.3230027, 0, -122.3230027],
+                     "Y":[0, 47.6199206, 0, 47.6199206]}
+        test_df = pd.DataFrame(data=test_data)
+        neighborhoods = assign_neighborhood(test_df, workers=2)
+        self.assertTrue(list(neighborhoods["object_id"]) == [-1, 100, -1, 100])
+
+    def test_correct_data_stats(self):
+        """
+        Tests that assign neighborhood returns the number of tests saved
+        by repeated coordinates when asked
+        """
+        test_data = {"X": [0, -122.3230027, 0, -122.3230027, -122.3230027],
+                     "Y":[0, 47.6199206, 0, 47.6199206, 47.6199206]}
+        neighborhoods, tests_saved = assign_neighborhood(
+            pd.DataFrame(data=test_data), return_stats=True)
+        self.assertTrue(list(neighborhoods["object_id"]) == [-1, 100, -1, 100, 100])
+        self.assertTrue(tests_saved == 3)
+
+    def test_load_neighborhoods_cached(self):
+        """
+        Tests that the neighborhood layer is only read once until
+        the file changes or the cache is cleared
+        """
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'hoods.json')
+            shutil.copy(GEO_PATH, path)
+            first = load_neighborhoods(path)
+            self.assertTrue(load_neighborhoods(path) is first)
+
+            clear_neighborhood_cache(path)
+            second = load_neighborhoods(path)
+            self.assertTrue(second is not first)
+
+            stat = os.stat(path)
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+            self.assertTrue(load_neighborhoods(path) is not second)
+        finally:
+            clear_neighborhood_cache()
+            shutil.rmtree(folder)
+
+        with self.assertRaises(ValueError):
+            load_neighborhoods('fakepath')
+
+    def test_load_neighborhoods_geojson(self):
+        """
+        Tests that changing the returned GeoJson properties does not
+        change the cached GeoJson
+        """
+        geojson = load_neighborhoods_geojson(GEO_PATH)
+        self.assertTrue(len(geojson['features']) == 119)
+        geojson['features'][0]['properties']['style'] = 'changed'
+        geojson = load_neighborhoods_geojson(GEO_PATH)
+        self.assertFalse('style' in geojson['features'][0]['properties'])
+
+    def test_assign_layers(self):
+        """
+        Tests that several layers are assigned at once, and that the
+        neighborhood layer matches assign_neighborhood
+        """
+        districts = pd.DataFrame({
+            'DISTRICT': [1, 2],
+            'NAME': ['West', 'East'],
+            'geometry': [box(-122.5, 47.4, -122.32, 47.8), box(-122.32, 47.4, -122.2, 47.8)]})
+        district_layer = {'frame': districts,
+                          'columns': {'DISTRICT': 'district_id', 'NAME': 'district'}}
+        test_data = {"X": [0, -122.3230027, -122.3, np.nan], "Y":[0, 47.6199206, 47.6, 1]}
+        expected = assign_neighborhood(pd.DataFrame(data=test_data))
+        labelled = assign_layers(pd.DataFrame(data=test_data),
+                                 [NEIGHBORHOOD_LAYER, district_layer])
+        self.assertTrue(list(labelled['object_id']) == list(expected['object_id']))
+        self.assertTrue(list(labelled['s_hood'][1:3]) == list(expected['s_hood'][1:3]))
+        self.assertTrue(list(labelled['district_id']) == [-1, 1, 2, -1])
+        self.assertTrue(pd.isnull(labelled['district'][0]))
+        self.assertTrue(list(labelled['district'][1:3]) == ['West', 'East'])
+
+    def test_assign_layers_errors(self):
+        """
+        Tests that layers without a polygon source or with missing
+        columns raise a value error
+        """
+        test_df = pd.DataFrame(data={"X": [0], "Y":[0]})
+        with self.assertRaises(ValueError):
+            assign_layers(test_df, [{'columns': {'OBJECTID': 'object_id'}}])
+        with self.assertRaises(ValueError):
+            assign_layers(test_df, [{'path': GEO_PATH, 'columns': {'fake': 'fake'}}])
+        with self.assertRaises(ValueError):
+            assign_layers(pd.DataFrame(data={"X": [0]}), [NEIGHBORHOOD_LAYER])
+
     def test_find_neighborhood_count(self):
         """
         Test to see if the find_neighborhood_count function
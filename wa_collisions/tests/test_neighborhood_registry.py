@@ -0,0 +1,56 @@
+"""
+Unittests for neighborhood_registry.py
+"""
+
+import unittest
+import pandas as pd
+from wa_collisions.neighborhood_reader import load_neighborhood_registry
+from wa_collisions.neighborhood_registry import NeighborhoodRegistry
+
+# store the relative path to the GeoJson neighborhoods data
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+
+# Define a class in which the tests will run
+class NeighborhoodRegistryTest(unittest.TestCase):
+    """
+    Unittests for neighborhood_registry
+    """
+
+    def test_lookups(self):
+        """
+        Tests the ids of neighborhoods and districts and the names of ids
+        """
+        registry = load_neighborhood_registry(GEO_PATH)
+        self.assertTrue(len(registry) == 119)
+        self.assertTrue(registry.neighborhood_ids(['Broadway']) == [100])
+        self.assertTrue(registry.neighborhood_names(100) == ('Broadway', 'CAPITOL HILL'))
+        self.assertTrue(100 in registry.district_ids('CAPITOL HILL'))
+        self.assertTrue(len(registry.neighborhood_ids(['Industrial District'])) == 2)
+        self.assertTrue(len(registry.other_ids([100])) == 118)
+        self.assertTrue(load_neighborhood_registry(GEO_PATH) is registry)
+
+    def test_unknown_names(self):
+        """
+        Tests that unknown names and ids raise a value error naming them
+        """
+        registry = load_neighborhood_registry(GEO_PATH)
+        with self.assertRaisesRegex(ValueError, 'Fake Hood'):
+            registry.neighborhood_ids(['Broadway', 'Fake Hood'])
+        with self.assertRaises(ValueError):
+            registry.district_ids(['FAKE DISTRICT'])
+        with self.assertRaises(ValueError):
+            registry.neighborhood_names(1000)
+
+    def test_bad_layer(self):
+        """
+        Tests that a layer with missing columns or repeated ids raises a
+        value error
+        """
+        with self.assertRaises(ValueError):
+            NeighborhoodRegistry(pd.DataFrame({'OBJECTID': [1], 'S_HOOD': ['A']}))
+        with self.assertRaises(ValueError):
+            NeighborhoodRegistry(pd.DataFrame({'OBJECTID': [1, 1], 'S_HOOD': ['A', 'B'],
+                                               'L_HOOD': ['C', 'C']}))
+
+if __name__ == '__main__':
+    unittest.main()
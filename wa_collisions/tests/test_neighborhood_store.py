@@ -0,0 +1,85 @@
+"""
+Unittests for neighborhood_store.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPolygon, Polygon
+from wa_collisions.neighborhood_reader import build_neighborhood_store
+from wa_collisions.neighborhood_reader import get_neighborhood
+from wa_collisions.neighborhood_reader import pull_neighborhoods_file
+from wa_collisions.neighborhood_store import read_neighborhood_store
+from wa_collisions.neighborhood_store import write_neighborhood_store
+
+# store the relative paths to the GeoJson neighborhoods data and its store
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+STORE_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.npz"
+
+# Define a class in which the tests will run
+class NeighborhoodStoreTest(unittest.TestCase):
+    """
+    Unittests for neighborhood_store
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_store_matches_geojson(self):
+        """
+        Tests that the shipped store holds the same attributes and
+        polygons as the GeoJson file
+        """
+        stored = pull_neighborhoods_file(STORE_PATH)
+        parsed = pull_neighborhoods_file(GEO_PATH)
+        self.assertTrue(list(stored.columns) == list(parsed.columns))
+        for column in ['OBJECTID', 'S_HOOD', 'L_HOOD']:
+            self.assertTrue(list(stored[column]) == list(parsed[column]))
+        for stored_geometry, parsed_geometry in zip(stored['geometry'], parsed['geometry']):
+            self.assertTrue(stored_geometry.equals(parsed_geometry))
+
+    def test_build_store(self):
+        """
+        Tests that a store built from the GeoJson file resolves
+        locations like the GeoJson file
+        """
+        path = build_neighborhood_store(GEO_PATH, os.path.join(self.folder, 'hoods.npz'))
+        neighborhoods = pull_neighborhoods_file(path)
+        self.assertTrue(len(neighborhoods) == 119)
+        object_id, _, _ = get_neighborhood(-122.3230027, 47.6199206, neighborhoods)
+        self.assertTrue(object_id == 100)
+
+    def test_multipolygon_and_nulls(self):
+        """
+        Tests that multipolygons, holes and missing names survive
+        a round trip through the store
+        """
+        square = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], [[(1, 1), (2, 1), (2, 2), (1, 2)]])
+        parts = MultiPolygon([Polygon([(5, 5), (6, 5), (6, 6)]),
+                              Polygon([(7, 7), (8, 7), (8, 8)])])
+        frame = pd.DataFrame({'OBJECTID': [1, 2], 'S_HOOD': ['A', None],
+                              'geometry': [square, parts]})
+        path = write_neighborhood_store(frame, os.path.join(self.folder, 'hoods.npz'))
+        stored = read_neighborhood_store(path)
+        self.assertTrue(stored['geometry'][0].equals(square))
+        self.assertTrue(stored['geometry'][1].equals(parts))
+        self.assertTrue(stored['geometry'][1].geom_type == 'MultiPolygon')
+        self.assertTrue(stored['S_HOOD'][1] is None)
+        self.assertTrue(np.array_equal(stored['OBJECTID'], [1, 2]))
+
+    def test_missing_store(self):
+        """
+        Tests that reading a store which doesn't exist raises
+        a value error
+        """
+        with self.assertRaises(ValueError):
+            read_neighborhood_store('fakepath.npz')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unittests for partitioned_store.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from wa_collisions.partitioned_store import list_partitions
+from wa_collisions.partitioned_store import partition_folder
+from wa_collisions.partitioned_store import read_partitioned_collisions
+from wa_collisions.partitioned_store import upsert_partitioned_collisions
+from wa_collisions.partitioned_store import write_partitioned_collisions
+from wa_collisions.read_clean_integrate_data import clean_collision_data
+from wa_collisions.read_clean_integrate_data import read_collision_data
+
+# store the relative path to the Collisions data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+
+CLEAN_DATA = clean_collision_data(read_collision_data(COLLISIONS_DATA))
+
+# Define a class in which the tests will run
+class PartitionedStoreTest(unittest.TestCase):
+    """
+    Unittests for partitioned_store
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        write_partitioned_collisions(CLEAN_DATA, self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        """
+        Tests that the whole store reads back the cleaned collisions
+        """
+        stored = read_partitioned_collisions(self.folder)
+        expected = CLEAN_DATA.sort_values(['year', 'month'], kind='mergesort')
+        self.assertTrue(stored.shape == expected.shape)
+        self.assertTrue(list(stored['inckey']) == list(expected['inckey']))
+        self.assertTrue(list(stored['year']) == list(expected['year']))
+        self.assertTrue(str(stored['weather'].dtype) == 'category')
+
+        partitions = list_partitions(self.folder)
+        self.assertTrue(len(partitions) == CLEAN_DATA.groupby(['year', 'month']).ngroups)
+
+    def test_prune_years(self):
+        """
+        Tests that only the partitions of the years asked for are opened
+        """
+        # a broken partition fails the read if it is opened
+        with open(os.path.join(partition_folder(self.folder, 2004, 3), 'part-0.parquet'),
+                  'w') as broken:
+            broken.write('broken')
+
+        stored = read_partitioned_collisions(self.folder, years=[2016, 2017, 2018])
+        expected = CLEAN_DATA[CLEAN_DATA.year.isin([2016, 2017, 2018])]
+        self.assertTrue(stored.shape[0] == expected.shape[0])
+        self.assertTrue(set(stored['year']) == set(expected['year']))
+
+    def test_date_range(self):
+        """
+        Tests that a date range returns the collisions in the range
+        """
+        stored = read_partitioned_collisions(self.folder, start='2016-10-15', end='2017-03-01',
+                                             columns=['inckey'])
+        expected = CLEAN_DATA[(CLEAN_DATA.time >= '2016-10-15') &
+                              (CLEAN_DATA.time < '2017-03-01')]
+        self.assertTrue(sorted(stored['inckey']) == sorted(expected['inckey']))
+        self.assertTrue(list(stored.columns) == ['inckey', 'time', 'year', 'month'])
+
+        self.assertTrue(read_partitioned_collisions(self.folder, years=[1900]).empty)
+
+    def test_errors(self):
+        """
+        Tests that a missing store or month column raises a value error
+        """
+        with self.assertRaises(ValueError):
+            read_partitioned_collisions('fakepath')
+        with self.assertRaises(ValueError):
+            write_partitioned_collisions(CLEAN_DATA.drop(columns=['month']), self.folder)
+
+    def test_missing_month(self):
+        """
+        Tests that collisions without a year or month raise a value
+        error instead of being left out of the store
+        """
+        data = CLEAN_DATA.copy()
+        data['year'] = data['year'].astype(float)
+        data.loc[data.index[1], 'year'] = float('nan')
+        with self.assertRaises(ValueError):
+            write_partitioned_collisions(data, self.folder)
+        with self.assertRaises(ValueError):
+            upsert_partitioned_collisions(data, self.folder, 'inckey')
+
+if __name__ == '__main__':
+    unittest.main()
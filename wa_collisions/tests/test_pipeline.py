@@ -0,0 +1,95 @@
+"""
+Unittests for pipeline.py
+"""
+
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from wa_collisions.pipeline import Pipeline
+from wa_collisions.pipeline import Stage
+from wa_collisions.read_clean_integrate_data import integration_pipeline
+
+# store the relative path to the Collisions data, Weather data and GeoJson neighborhoods data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+WEATHER_DATA = "wa_collisions/data/Weather_test.csv"
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+
+
+def numbers(count):
+    """
+    Returns a frame of the first numbers
+    """
+    return pd.DataFrame({'number': range(count)})
+
+
+def scale(frame, factor):
+    """
+    Returns the numbers of a frame times a factor
+    """
+    frame['number'] = frame['number'] * factor
+    return frame
+
+
+# Define a class in which the tests will run
+class PipelineTest(unittest.TestCase):
+    """
+    Unittests for pipeline
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_only_downstream_stages_run(self):
+        """
+        Tests that only the stages after a changed argument are built
+        and that frames built from earlier arguments are kept
+        """
+        def pipeline(factor):
+            return Pipeline([Stage('numbers', numbers, arguments={'count': 3}),
+                             Stage('scaled', scale, inputs=['numbers'],
+                                   arguments={'factor': factor})])
+
+        first = pipeline(2)
+        self.assertTrue(list(first.run('scaled', self.folder)['number']) == [0, 2, 4])
+        self.assertTrue(sorted(first.timings) == ['numbers', 'scaled'])
+
+        second = pipeline(3)
+        self.assertTrue(list(second.run('scaled', self.folder)['number']) == [0, 3, 6])
+        self.assertTrue(sorted(second.timings) == ['scaled'])
+
+        first.run('scaled', self.folder)
+        self.assertTrue(first.timings == {})
+
+    def test_bad_stages(self):
+        """
+        Tests that duplicate, unknown or later inputs raise a value error
+        """
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('numbers', numbers), Stage('numbers', numbers)])
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('scaled', scale, inputs=['numbers']), Stage('numbers', numbers)])
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('numbers', numbers)]).run('other')
+
+    def test_integration_pipeline(self):
+        """
+        Tests that changing the year only runs the collision stages after
+        the read and gives the integrated data of that year
+        """
+        pipeline = integration_pipeline(COLLISIONS_DATA, 2014, WEATHER_DATA, GEO_PATH)
+        uncached = pipeline.run('join')
+        cached = pipeline.run('join', self.folder)
+        self.assertTrue(list(cached['inckey']) == list(uncached['inckey']))
+
+        pipeline = integration_pipeline(COLLISIONS_DATA, 2016, WEATHER_DATA, GEO_PATH)
+        data = pipeline.run('join', self.folder)
+        self.assertTrue(sorted(pipeline.timings) ==
+                        ['assign_neighborhoods', 'clean_collisions', 'join'])
+        self.assertTrue(data['year'].min() == 2016)
+
+if __name__ == '__main__':
+    unittest.main()
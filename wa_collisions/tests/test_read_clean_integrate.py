@@ -3,7 +3,12 @@ Creating Unit Tests for the module that Reads, Cleans,
 and Integrates the data.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
+import pandas as pd
 
 #import read_clean_integrate_data
 from wa_collisions import read_clean_integrate_data
@@ -39,6 +44,28 @@ class IntegrateDataTest(unittest.TestCase):
         self.assertTrue(len(test_data) > 1)
 
 
+    def test_read_projected(self):
+        """
+        Test that only the columns of the schema are read, with their
+        declared dtypes, and that cleaning gives the same data as when
+        every column is read.
+        """
+        projected = read_clean_integrate_data.read_collision_data(COLLISIONS_DATA)
+        full = read_clean_integrate_data.read_collision_data(COLLISIONS_DATA, projected=False)
+        self.assertTrue(projected.shape[1] < full.shape[1])
+        self.assertTrue('coldetkey' not in projected.columns)
+        self.assertTrue(str(projected['weather'].dtype) == 'category')
+
+        projected = read_clean_integrate_data.clean_collision_data(projected)
+        full = read_clean_integrate_data.clean_collision_data(full)
+        self.assertTrue(list(projected.columns) == list(full.columns))
+        for column in ['weather', 'roadcond', 'injuries', 'time', 'ind_speeding']:
+            self.assertTrue(list(projected[column].astype(object).fillna('')) ==
+                            list(full[column].astype(object).fillna('')))
+
+        weather = read_clean_integrate_data.read_weather_data(WEATHER_DATA)
+        self.assertTrue(weather['tmpf'].dtype == 'float64')
+
     # test the type of error that is created when the path is incorrect
     def test_file_collision(self):
         """
@@ -93,6 +120,30 @@ class IntegrateDataTest(unittest.TestCase):
         self.assertTrue(
             clean_data.groupby(['year', 'month', 'day']).count().shape[0] == clean_data.shape[0])
 
+    def test_clean_weather_stations(self):
+        """
+        Test that the weather of each station is aggregated separately,
+        with one row per station and day, in parallel or not.
+        """
+        weather = read_clean_integrate_data.read_weather_data(WEATHER_DATA)
+        other = weather.copy()
+        other['station'] = 'BFI'
+        other['tmpf'] = other['tmpf'] + 10
+        both = pd.concat([weather, other], ignore_index=True)
+
+        single = read_clean_integrate_data.clean_weather_data(weather)
+        clean_data = read_clean_integrate_data.clean_weather_data(both)
+        self.assertTrue(clean_data.shape[0] == 2 * single.shape[0])
+        self.assertTrue(clean_data.groupby(['station', 'year', 'month', 'day']).ngroups ==
+                        clean_data.shape[0])
+        bfi = clean_data[clean_data['station'] == 'BFI'].reset_index(drop=True)
+        self.assertTrue(np.allclose(bfi['temperature_high'], single['temperature_high'] + 10))
+
+        parallel = read_clean_integrate_data.clean_weather_data(both, workers=2)
+        self.assertTrue(parallel.equals(clean_data))
+        with self.assertRaises(ValueError):
+            read_clean_integrate_data.clean_weather_data(weather, workers=0)
+
     def test_clean_data_collisions_end_year(self):
         """
         Test the type of data from cleaning the data.
@@ -143,5 +194,51 @@ class IntegrateDataTest(unittest.TestCase):
             clean_data = read_clean_integrate_data.integrate_data(
                 COLLISIONS_DATA, 2014, WEATHER_DATA, '')
 
+    def test_integrate_data_timings(self):
+        """
+        Test that the time taken by each stage of the integration is
+        reported and that the stages give the integrated data.
+        """
+        timings = {}
+        data = read_clean_integrate_data.integrate_data(
+            COLLISIONS_DATA, 2014, WEATHER_DATA, GEO_PATH, timings=timings)
+        self.assertTrue(data.shape[0] > 0)
+        self.assertTrue('temperature_mean' in data.columns and 'object_id' in data.columns)
+        stages = ['collisions', 'neighborhoods', 'weather', 'assign', 'join', 'total']
+        self.assertTrue(sorted(timings) == sorted(stages))
+        self.assertTrue(min(timings.values()) >= 0)
+
+    def test_stream_collisions_neighborhoods(self):
+        """
+        Test that streaming the collision data in chunks gives the same
+        collisions and neighborhoods as cleaning the whole file at once.
+        """
+        expected = read_clean_integrate_data.clean_collisions_neighborhoods(
+            read_clean_integrate_data.read_collision_data(COLLISIONS_DATA), GEO_PATH)
+
+        chunks = []
+        row_count = read_clean_integrate_data.stream_collisions_neighborhoods(
+            COLLISIONS_DATA, chunks.append, chunk_size=10, geo_json_path=GEO_PATH)
+        self.assertTrue(row_count == expected.shape[0])
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(max(len(chunk) for chunk in chunks) <= 10)
+        object_ids = [i for chunk in chunks for i in chunk['object_id']]
+        self.assertTrue(object_ids == list(expected['object_id']))
+
+        folder = tempfile.mkdtemp()
+        try:
+            output_path = os.path.join(folder, 'labelled.csv')
+            read_clean_integrate_data.stream_collisions_neighborhoods(
+                COLLISIONS_DATA, output_path, chunk_size=10, geo_json_path=GEO_PATH)
+            written = read_clean_integrate_data.read_collision_data(output_path)
+            self.assertTrue(written.shape[0] == expected.shape[0])
+            self.assertTrue(list(written['object_id']) == list(expected['object_id']))
+        finally:
+            shutil.rmtree(folder)
+
+        with self.assertRaises(ValueError):
+            read_clean_integrate_data.stream_collisions_neighborhoods(
+                COLLISIONS_DATA, chunks.append, chunk_size=0)
+
 if __name__ == '__main__':
     unittest.main()
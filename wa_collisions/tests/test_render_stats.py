@@ -3,6 +3,7 @@ Unittests for render_stats.py
 """
 import datetime
 import unittest
+import pandas as pd
 from causalimpact import CausalImpact
 
 import wa_collisions.render_stats as render_stats
@@ -87,6 +88,7 @@ class RenderStatsTest(unittest.TestCase):
             3) attempting to resample the data by year
             4) trying to sum by a non-string column
             5) trying to sum by a column which doesn't exist
+            6) passing a neighborhood name which doesn't exist
         """
         #Test dataframe without neighborhood
         with self.assertRaises(ValueError):
@@ -112,6 +114,13 @@ class RenderStatsTest(unittest.TestCase):
             render_stats.pivot_by_treatment(DF_NEIGHBORHOODS, treatment_list=['Genesee']
                                             , agg_by='fake_column')
 
+        #Test unknown neighborhood names
+        with self.assertRaises(ValueError):
+            render_stats.pivot_by_treatment(DF_NEIGHBORHOODS, treatment_list=['Fake Hood'])
+        with self.assertRaises(ValueError):
+            render_stats.pivot_by_treatment(DF_NEIGHBORHOODS, treatment_list=['Genesee']
+                                            , control_list=['Fake Hood'])
+
     def test_treatment(self):
         """
         Tests that the correct number of treatment and control values are returned
@@ -180,6 +189,48 @@ class RenderStatsTest(unittest.TestCase):
         injury_count = int(out.sum()['SpeedLimitSame'])
         self.assertTrue(injury_count == 21)
 
+    def test_pivot_many(self):
+        """
+        Tests that pivot_many gives the pivots of pivot_by_treatment, with
+        the where filter matching a filter of the rows, and checks its specs.
+        """
+        test_treatment_in = ['Atlantic', 'Pike-Market', 'Belltown', 'International District'
+                             , 'Central Business District', 'First Hill', 'Yesler Terrace'
+                             , 'Pioneer Square', 'Interbay', 'Mann', 'Minor']
+        speeding = DF_NEIGHBORHOODS[DF_NEIGHBORHOODS['ind_speeding']]
+
+        out = render_stats.pivot_many(DF_NEIGHBORHOODS, [
+            {'treatment_list': test_treatment_in, 'resample_by': 'M'},
+            {'treatment_list': test_treatment_in, 'agg_by': 'injuries'},
+            {'treatment_list': test_treatment_in, 'where': {'ind_speeding': True}}])
+        expected = [
+            render_stats.pivot_by_treatment(DF_NEIGHBORHOODS, test_treatment_in, resample_by='M'),
+            render_stats.pivot_by_treatment(DF_NEIGHBORHOODS, test_treatment_in, agg_by='injuries'),
+            render_stats.pivot_by_treatment(speeding, test_treatment_in)]
+
+        self.assertTrue(len(out) == 3)
+        for pivot, expected_pivot in zip(out, expected):
+            self.assertTrue(pivot.sum().equals(expected_pivot.sum()))
+
+        # columns which are not flags filter by their values
+        wet = DF_NEIGHBORHOODS[DF_NEIGHBORHOODS['roadcond'] == 'Wet']
+        out = render_stats.pivot_many(DF_NEIGHBORHOODS, [
+            {'treatment_list': test_treatment_in, 'where': {'roadcond': 'Wet'}},
+            {'treatment_list': test_treatment_in, 'where': {'ind_speeding': 1}}])
+        expected = [render_stats.pivot_by_treatment(wet, test_treatment_in),
+                    render_stats.pivot_by_treatment(speeding, test_treatment_in)]
+        for pivot, expected_pivot in zip(out, expected):
+            self.assertTrue(pivot.sum().equals(expected_pivot.sum()))
+
+        with self.assertRaises(ValueError):
+            render_stats.pivot_many(DF_NEIGHBORHOODS, [{'control_list': test_treatment_in}])
+        with self.assertRaises(ValueError):
+            render_stats.pivot_many(DF_NEIGHBORHOODS, [{'treatment_list': test_treatment_in,
+                                                        'filter': {'ind_speeding': True}}])
+        with self.assertRaises(ValueError):
+            render_stats.pivot_many(DF_NEIGHBORHOODS, [{'treatment_list': test_treatment_in,
+                                                        'where': {'fake_column': True}}])
+
     def test_transition_date_before_start(self):
         """
         Tests that a ValueError is returned when transition_date before falls before any date in the
@@ -250,6 +301,45 @@ class RenderStatsTest(unittest.TestCase):
         max_date = datetime.date(max_date.year, max_date.month, max_date.day)
         self.assertTrue(max_date.strftime('%Y-%m-%d') == out[1][1])
 
+    def test_many_period_ranges(self):
+        """
+        Tests that find_many_period_ranges gives the ranges of find_period_ranges
+        for each transition date, with their positions in the frame, and the
+        expected ranges of weekly and monthly frames.
+        """
+        test_treatment_in = ['Atlantic', 'Pike-Market', 'Belltown', 'International District'
+                             , 'Central Business District', 'First Hill', 'Yesler Terrace'
+                             , 'Pioneer Square', 'Interbay', 'Mann', 'Minor']
+        transition_dates = ["2016-10-02", "2016-10-31", "2017-01-15"]
+        out_df = render_stats.pivot_by_treatment(DF_NEIGHBORHOODS, treatment_list=test_treatment_in
+                                                 , resample_by='M')
+        positions, ranges = render_stats.find_many_period_ranges(out_df, transition_dates)
+
+        for i, transition_date in enumerate(transition_dates):
+            self.assertTrue(ranges[i] == render_stats.find_period_ranges(out_df, transition_date))
+            self.assertTrue(out_df.index[positions[i][0]].strftime('%Y-%m-%d') == ranges[i][0][1])
+            self.assertTrue(out_df.index[positions[i][1]].strftime('%Y-%m-%d') == ranges[i][1][0])
+        self.assertTrue(ranges[1][1][0] == "2016-10-31")
+
+        # weeks ending on sundays, with a transition on a wednesday and one on a sunday
+        weekly = pd.DataFrame({'SpeedLimitChange': 0.0, 'SpeedLimitSame': 0.0},
+                              index=pd.date_range('2016-09-04', periods=10, freq='W'))
+        positions, ranges = render_stats.find_many_period_ranges(
+            weekly, ["2016-10-05", "2016-10-16"])
+        self.assertTrue(positions.tolist() == [[4, 5], [5, 6]])
+        self.assertTrue(ranges == [[["2016-09-04", "2016-10-02"], ["2016-10-09", "2016-11-06"]],
+                                   [["2016-09-04", "2016-10-09"], ["2016-10-16", "2016-11-06"]]])
+
+        # months labelled by their last day, with a transition in the middle of june
+        monthly = pd.DataFrame({'SpeedLimitChange': 0.0, 'SpeedLimitSame': 0.0},
+                               index=pd.date_range('2016-01-31', periods=12, freq='M'))
+        positions, ranges = render_stats.find_many_period_ranges(monthly, ["2016-06-15"])
+        self.assertTrue(positions.tolist() == [[4, 5]])
+        self.assertTrue(ranges == [[["2016-01-31", "2016-05-31"], ["2016-06-30", "2016-12-31"]]])
+
+        with self.assertRaises(ValueError):
+            render_stats.find_many_period_ranges(out_df, ["2016-10-02", "1900-01-01"])
+
     def test_causal_impact_load(self):
         """
         Performs a smoke test where we load causal impact.
@@ -0,0 +1,104 @@
+"""
+Unittests for timeseries_store.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from wa_collisions.timeseries_store import TimeSeriesStore
+from wa_collisions.timeseries_store import load_timeseries_store
+
+# a daily panel of three years with the columns of pivot_by_treatment
+DAYS = pd.date_range('2015-01-01', '2017-12-31', freq='D', name='time')
+PANEL = pd.DataFrame(np.random.RandomState(0).poisson(3, (len(DAYS), 2)).astype(float),
+                     index=DAYS, columns=pd.Index(['SpeedLimitChange', 'SpeedLimitSame'],
+                                                  name='speedlimit_change_flag'))
+
+# Define a class in which the tests will run
+class TimeSeriesStoreTest(unittest.TestCase):
+    """
+    Unittests for timeseries_store
+    """
+
+    def assert_resampled(self, store, panel):
+        """
+        Checks that the views of a store are the resampled panel
+        """
+        for resolution in ['D', 'W', 'M']:
+            view = store.view(resolution)
+            expected = panel.resample(resolution).sum()
+            self.assertTrue(view.index.equals(expected.index))
+            self.assertTrue(np.allclose(view.values, expected.values))
+            self.assertTrue(view.index.name == 'time')
+            self.assertTrue(view.columns.equals(expected.columns))
+
+    def test_views(self):
+        """
+        Tests that the views are the panel resampled by day, week and month
+        """
+        self.assert_resampled(TimeSeriesStore(PANEL), PANEL)
+        with self.assertRaises(ValueError):
+            TimeSeriesStore(PANEL).view('Y')
+
+    def test_append(self):
+        """
+        Tests that appending days, again or after a gap, updates the views
+        """
+        store = TimeSeriesStore(PANEL.iloc[:40])
+        self.assert_resampled(store, PANEL.iloc[:40])
+        store.append(PANEL.iloc[38:100])
+        self.assert_resampled(store, PANEL.iloc[:100])
+        store.append(PANEL.iloc[100:103])
+        self.assert_resampled(store, PANEL.iloc[:103])
+
+        store.append(PANEL.iloc[150:])
+        panel = PANEL.copy()
+        panel.iloc[103:150] = 0
+        self.assert_resampled(store, panel)
+
+    def test_append_middle(self):
+        """
+        Tests that appending a range in the middle of the store replaces
+        those days and keeps the days after them
+        """
+        store = TimeSeriesStore(PANEL.iloc[:100])
+        store.view('W')
+        corrected = PANEL.iloc[50:61] + 1
+        store.append(corrected)
+
+        panel = PANEL.iloc[:100].copy()
+        panel.iloc[50:61] = corrected.values
+        self.assertTrue(len(store.days) == 100)
+        self.assert_resampled(store, panel)
+
+    def test_bad_append(self):
+        """
+        Tests that days before the store or other columns raise a value error
+        """
+        store = TimeSeriesStore(PANEL.iloc[10:])
+        with self.assertRaises(ValueError):
+            store.append(PANEL.iloc[:20])
+        with self.assertRaises(ValueError):
+            store.append(PANEL.iloc[-5:].rename(columns={'SpeedLimitSame': 'Other'}))
+        with self.assertRaises(ValueError):
+            store.append(PANEL.iloc[:0])
+
+    def test_save_load(self):
+        """
+        Tests that a saved store loads with the same views
+        """
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'panel.npz')
+            TimeSeriesStore(PANEL).save(path)
+            self.assert_resampled(load_timeseries_store(path), PANEL)
+            with self.assertRaises(ValueError):
+                load_timeseries_store(os.path.join(folder, 'missing.npz'))
+        finally:
+            shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -138,6 +138,11 @@ class VisualizerTest(unittest.TestCase):
             test_map = visualize_heatmap_by_day(test_data, \
                     'ALL', '2018-01-01', '2017-02-01')
 
+        # test if a value error is raised when passing an unknown district
+        with self.assertRaises(ValueError):
+            test_map = visualize_heatmap_by_day(test_data, \
+                    'FAKE DISTRICT', '2016-01-01', '2018-02-01')
+
     def test_visualize_heatmap_time_hour(self):
         """
         Passing correct data to visualize_heatmap_with_time returns
@@ -168,6 +173,11 @@ class VisualizerTest(unittest.TestCase):
             test_map = visualize_heatmap_by_hour(test_data, \
                     'ALL', '2018-01-01', '2017-02-01')
 
+        # test if a value error is raised when passing an unknown district
+        with self.assertRaises(ValueError):
+            test_map = visualize_heatmap_by_hour(test_data, \
+                    ['DOWNTOWN', 'FAKE DISTRICT'], '2016-01-01', '2018-02-01')
+
     def test_generate_factor_list(self):
         """
         Test if the generate_factor_list function correctly returns a dictionary.
@@ -0,0 +1,116 @@
+"""
+Unittests for weather_join.py
+"""
+
+import unittest
+import numpy as np
+import pandas as pd
+from wa_collisions.neighborhood_reader import load_neighborhoods
+from wa_collisions.read_clean_integrate_data import clean_weather_hours
+from wa_collisions.read_clean_integrate_data import integrate_data
+from wa_collisions.weather_join import STATION_LOCATIONS
+from wa_collisions.weather_join import collision_stations
+from wa_collisions.weather_join import join_weather_hours
+from wa_collisions.weather_join import nearest_stations
+from wa_collisions.weather_join import neighborhood_stations
+
+# store the relative path to the Collisions data, Weather data and GeoJson neighborhoods data
+COLLISIONS_DATA = "wa_collisions/data/Collisions_test.csv"
+WEATHER_DATA = "wa_collisions/data/Weather_test.csv"
+GEO_PATH = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
+
+# collisions in Broadway, next to Boeing Field, and outside the neighborhoods
+COLLISIONS = pd.DataFrame({
+    'X': [-122.3230027, -122.30, -122.26],
+    'Y': [47.6199206, 47.52, 47.44],
+    'object_id': [100, -1, -1],
+    'time': pd.to_datetime(['2014-02-27 12:41', '2014-02-27 12:10', '2014-02-27 18:00'])})
+
+# Define a class in which the tests will run
+class WeatherJoinTest(unittest.TestCase):
+    """
+    Unittests for weather_join
+    """
+
+    def test_nearest_stations(self):
+        """
+        Tests that each location gets the closest station
+        """
+        stations = nearest_stations([-122.31, -122.30, -122.22], [47.45, 47.53, 47.49],
+                                    STATION_LOCATIONS)
+        self.assertTrue(list(stations) == ['SEA', 'BFI', 'RNT'])
+        with self.assertRaises(ValueError):
+            nearest_stations([0], [0], {})
+
+    def test_neighborhood_stations(self):
+        """
+        Tests that every neighborhood gets a station and that the north
+        of Seattle is closer to Boeing Field than to Sea-Tac
+        """
+        locations = {name: STATION_LOCATIONS[name] for name in ['SEA', 'BFI']}
+        stations = neighborhood_stations(load_neighborhoods(GEO_PATH), locations)
+        self.assertTrue(len(stations) == 119)
+        self.assertTrue(stations[100] == 'BFI')
+
+    def test_collision_stations(self):
+        """
+        Tests the station of collisions in and outside the neighborhoods
+        """
+        stations = collision_stations(COLLISIONS, ['SEA', 'BFI'], geo_json_path=GEO_PATH)
+        self.assertTrue(list(stations) == ['BFI', 'BFI', 'SEA'])
+        self.assertTrue(list(collision_stations(COLLISIONS, ['XYZ'])) == ['XYZ'] * 3)
+        with self.assertRaises(ValueError):
+            collision_stations(COLLISIONS, ['SEA', 'XYZ'])
+
+    def test_join_weather_hours(self):
+        """
+        Tests that each collision gets the reading of its station nearest
+        in time, with the UTC readings moved to local time
+        """
+        hours = pd.DataFrame({
+            'station': ['SEA', 'SEA', 'BFI', 'BFI'],
+            'timestamp': pd.to_datetime(['2014-02-27 20:00', '2014-02-27 21:00',
+                                         '2014-02-27 20:00', '2014-02-27 21:00']),
+            'temperature': [1.0, 2.0, 3.0, 4.0],
+            'precipitation': [0.0, 0.0, 0.0, 0.0],
+            'wind_speed': [0.0, 0.0, 0.0, 0.0]})
+        joined = join_weather_hours(COLLISIONS, hours, geo_json_path=GEO_PATH)
+        self.assertTrue(list(joined['X']) == [-122.30, -122.3230027, -122.26])
+        self.assertTrue(list(joined['station']) == ['BFI', 'BFI', 'SEA'])
+        self.assertTrue(list(joined['temperature'][:2]) == [3.0, 4.0])
+        self.assertTrue(np.isnan(joined['temperature'][2]))
+
+    def test_join_reading_time(self):
+        """
+        Tests that a collision gets the reading nearest in time when the
+        readings are taken before the hour, not the nearest start of hour
+        """
+        raw = pd.DataFrame({
+            'station': ['SEA', 'SEA', 'SEA'],
+            'valid': ['2014-02-27 18:53', '2014-02-27 19:53', '2014-02-27 20:53'],
+            'tmpf': [40.0, 50.0, 60.0],
+            ' p01i': [0.0, 0.0, 0.0],
+            ' sknt': [5, 5, 5]})
+        hours = clean_weather_hours(raw)
+        self.assertTrue(list(hours['timestamp'].dt.minute) == [53, 53, 53])
+
+        # 11:40 local time is 19:40 UTC, 13 minutes after the 19:53 reading
+        # but closer to the 20:00 start of the hour of the 20:53 reading
+        collisions = COLLISIONS.iloc[:1].copy()
+        collisions['time'] = pd.to_datetime(['2014-02-27 11:40'])
+        joined = join_weather_hours(collisions, hours, geo_json_path=GEO_PATH)
+        self.assertTrue(list(joined['temperature']) == [50.0])
+        self.assertTrue(joined['weather_time'][0] == pd.Timestamp('2014-02-27 11:53'))
+
+    def test_integrate_hourly(self):
+        """
+        Tests that the hourly integration joins a reading to each collision
+        """
+        data = integrate_data(COLLISIONS_DATA, 2014, WEATHER_DATA, GEO_PATH, hourly=True)
+        self.assertTrue(data.shape[0] > 0)
+        self.assertTrue(data['time'].is_monotonic_increasing)
+        gaps = (data['time'] - data['weather_time']).abs().dropna()
+        self.assertTrue((gaps <= pd.Timedelta('1H')).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+Daily treatment/control panel with weekly and monthly views.
+
+This file keeps the daily pivot of render_stats.pivot_by_treatment as
+running totals. A week or a month is then the difference of the totals
+at its last day and at the last day before it, so the weekly and monthly
+views are derived from the days without going back to the collisions.
+When days are appended, only the weeks and months from the first new day
+on are derived again.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# resolutions of the views, the same as render_stats.VALID_RESAMPLE_TYPES
+VIEW_RESOLUTIONS = ['D', 'W', 'M']
+
+
+class TimeSeriesStore(object):
+    """
+    Running totals of a daily panel and the views derived from them.
+
+    Attributes:
+        days (pandas DatetimeIndex): every day of the panel, without gaps
+        columns (pandas Index): the columns of the panel, such as
+            SpeedLimitChange and SpeedLimitSame
+        totals (numpy array): running total of each column at each day
+    """
+
+    def __init__(self, daily):
+        """
+        Builds the running totals of a daily panel.
+
+        Args:
+            daily (pandas dataframe): a pivot by day, such as the one of
+                pivot_by_treatment with resample_by='D'. Missing days are
+                counted as zero.
+
+        Raises:
+            ValueError: if daily is empty or not indexed by day
+        """
+        daily = _daily_frame(daily)
+        self.days = daily.index
+        self.columns = daily.columns
+        self.totals = np.cumsum(daily.values.astype('float64'), axis=0)
+        self._views = {}
+
+    def append(self, daily):
+        """
+        Adds days to the panel. The days of daily replace the same days of
+        the panel and the days after them are kept, so the last day can be
+        appended again once it is complete and a range of days corrected.
+
+        Args:
+            daily (pandas dataframe): a pivot by day with the columns of
+                the panel
+
+        Raises:
+            ValueError: if daily is empty, not indexed by day, starts
+                before the panel or has other columns
+        """
+        daily = _daily_frame(daily)
+        if not daily.columns.equals(self.columns):
+            raise ValueError("columns {0} are not the columns of the store {1}".format(
+                list(daily.columns), list(self.columns)))
+        if daily.index[0] < self.days[0]:
+            raise ValueError("days before the first day of the store {0}".format(
+                self.days[0].strftime('%Y-%m-%d')))
+
+        # days between the end of the panel and the new days have no collisions
+        if daily.index[0] > self.days[-1] + pd.Timedelta(days=1):
+            gap = pd.date_range(self.days[-1] + pd.Timedelta(days=1),
+                                daily.index[0] - pd.Timedelta(days=1), freq='D')
+            daily = pd.concat([pd.DataFrame(0.0, index=gap, columns=daily.columns), daily])
+
+        cut = self.days.searchsorted(daily.index[0])
+        end = self.days.searchsorted(daily.index[-1], side='right')
+        previous = self.totals[cut - 1] if cut > 0 else np.zeros(len(self.columns))
+        replaced = previous + np.cumsum(daily.values.astype('float64'), axis=0)
+
+        # the days after daily are shifted by the change of the total
+        tail = self.totals[end:] - self.totals[end - 1] + replaced[-1]
+        self.totals = np.concatenate([self.totals[:cut], replaced, tail])
+        self.days = pd.date_range(self.days[0], periods=self.totals.shape[0], freq='D',
+                                  name=self.days.name)
+
+        for resolution in list(self._views):
+            self._views[resolution] = _extend_view(self._views[resolution], self.days,
+                                                   resolution, cut)
+
+    def view(self, resolution='D'):
+        """
+        Returns the panel summed by day, week or month.
+
+        Args:
+            resolution (string): 'D', 'W' or 'M', for day, week and month
+
+        Returns:
+            dataframe indexed by time, the same as resampling the daily
+            panel with that resolution
+
+        Raises:
+            ValueError: if resolution is not 'D', 'W' or 'M'
+        """
+        if resolution not in VIEW_RESOLUTIONS:
+            raise ValueError("resolution must be one of: " + str(VIEW_RESOLUTIONS))
+
+        if resolution == 'D':
+            index = self.days
+            values = np.diff(np.vstack([np.zeros((1, len(self.columns))), self.totals]),
+                             axis=0)
+        else:
+            if resolution not in self._views:
+                self._views[resolution] = _extend_view(None, self.days, resolution, 0)
+            starts, labels = self._views[resolution]
+            index = pd.DatetimeIndex(labels, freq=resolution)
+            ends = np.append(starts[1:], len(self.days)) - 1
+            before = np.vstack([np.zeros((1, len(self.columns))), self.totals])[starts]
+            values = self.totals[ends] - before
+
+        frame = pd.DataFrame(values, index=index, columns=self.columns)
+        frame.index.name = self.days.name
+        return frame
+
+    def save(self, path):
+        """
+        Writes the panel to a numpy .npz file, replacing the file only
+        once it is completely written.
+
+        Args:
+            path (string): path of the store file
+        """
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as store_file:
+            np.savez(store_file, start=np.array(self.days[0].isoformat()),
+                     totals=self.totals,
+                     columns=np.array([str(column) for column in self.columns]),
+                     names=np.array([str(self.days.name or ''),
+                                     str(self.columns.name or '')]))
+        os.replace(temporary_path, path)
+
+
+def load_timeseries_store(path):
+    """
+    Loads a panel saved by TimeSeriesStore.save.
+
+    Args:
+        path (string): path of the store file
+
+    Returns:
+        the TimeSeriesStore loaded
+
+    Raises:
+        ValueError: if the file doesn't exist
+    """
+    if not os.path.exists(path):
+        raise ValueError("time series store doesn't exist: " + str(path))
+
+    with np.load(path) as saved:
+        totals = saved['totals']
+        index_name, columns_name = [str(name) or None for name in saved['names']]
+        days = pd.date_range(str(saved['start']), periods=totals.shape[0], freq='D',
+                             name=index_name)
+        columns = pd.Index(list(saved['columns']), name=columns_name)
+
+    daily = pd.DataFrame(np.diff(np.vstack([np.zeros((1, totals.shape[1])), totals]), axis=0),
+                         index=days, columns=columns)
+    return TimeSeriesStore(daily)
+
+
+def _daily_frame(daily):
+    if daily.shape[0] == 0:
+        raise ValueError("the daily panel is empty")
+    if not isinstance(daily.index, pd.DatetimeIndex):
+        raise ValueError("the daily panel must be indexed by time")
+    if not (daily.index == daily.index.normalize()).all() or not daily.index.is_unique:
+        raise ValueError("the daily panel must have one row per day")
+    return daily.sort_index().asfreq('D', fill_value=0)
+
+
+def _extend_view(view, days, resolution, cut):
+    """
+    Returns the first day and label of each period of a view, keeping the
+    periods of an older view which end before the day at position cut.
+    """
+    if view is None:
+        starts, labels = np.array([], dtype=np.intp), np.array([], dtype='datetime64[ns]')
+        keep = 0
+    else:
+        starts, labels = view
+        keep = max(starts.searchsorted(cut, side='right') - 1, 0)
+    first = starts[keep] if keep < len(starts) else 0
+
+    period_ends = days[first:].to_period(resolution).to_timestamp(how='end').normalize()
+    period_ends = period_ends.values
+    changes = np.flatnonzero(period_ends[1:] != period_ends[:-1]) + 1
+    new_starts = np.concatenate([[0], changes]) + first
+    new_labels = period_ends[np.concatenate([[0], changes])]
+    return (np.concatenate([starts[:keep], new_starts]).astype(np.intp),
+            np.concatenate([labels[:keep], new_labels]))
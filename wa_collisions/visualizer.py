@@ -11,6 +11,9 @@ import folium
 import folium.plugins as plugins
 import ipywidgets as widgets
 
+from wa_collisions.neighborhood_reader import load_neighborhood_registry
+from wa_collisions.neighborhood_reader import load_neighborhoods_geojson
+
 MAP_JSON_DEFAULT = "wa_collisions/data/Neighborhoods/Neighborhoods.json"
 MAP_LOCATION_START = [47.6199206, -122.3230027]
 MAP_ZOOM = 11
@@ -19,7 +22,8 @@ ERROR = 0.000001
 def visualize_neighborhood(neighborhood_data, mapping_value, path=None):
     """
     Visualizes the data provided per neighborhood in abs
-    folim map and returns the map.
+    folim map and returns the map. The geo json file is only
+    read once per process, see load_neighborhoods_geojson.
 
     Args:
         neighborhood_data(pandas dataframe): Dataframe containing
@@ -53,7 +57,7 @@ def visualize_neighborhood(neighborhood_data, mapping_value, path=None):
     min_value = min(neighborhood_data[mapping_value])
 
     neigborhood_map.choropleth(
-        geo_data=path,
+        geo_data=load_neighborhoods_geojson(path),
         data=neighborhood_data,
         columns=['object_id', mapping_value],
         key_on='feature.properties.OBJECTID',
@@ -111,7 +115,8 @@ def visualize_neighborhood_mean(neighborhood_data, value, path=None):
     return visualize_neighborhood(counts_per_neighborhood, 'mean', path)
 
 
-def visualize_heatmap_by_day(data, district, start_date='2018-01-01', end_date='2018-12-31'):
+def visualize_heatmap_by_day(data, district, start_date='2018-01-01', end_date='2018-12-31',
+                             path=None):
     """
     Visualize the geographical distribution of collisons in a series of daily heatmaps.
 
@@ -124,12 +129,15 @@ def visualize_heatmap_by_day(data, district, start_date='2018-01-01', end_date='
             to be presented in the heatmap
         end_date (string): the end date of the collisions
             to be presented in the heatmap
+        path (string): the path of the neighborhoods the object_id of
+            the collisions refers to, defaults to MAP_JSON_DEFAULT
 
     Returns:
         the heatmap produced
 
     Raises:
         ValueError: if timeframe user selected is invalid
+        ValueError: if the district is not in the neighborhoods
     """
 
     columns = ['Y', 'X', 'date', 'object_id', 'l_hood']
@@ -141,10 +149,8 @@ def visualize_heatmap_by_day(data, district, start_date='2018-01-01', end_date='
     timeMask = ((df_collision['date'] >= np.datetime64(start_date)) &
                 (df_collision['date'] <= np.datetime64(end_date)))
 
-    if district == 'ALL':
-        index = timeMask
-    else:
-        index = timeMask & (df_collision['l_hood'] == district)
+    in_district = _in_districts(df_collision, district, path)
+    index = timeMask & in_district
 
     if sum(index) == 0:
         print('No matched collision.')
@@ -156,10 +162,7 @@ def visualize_heatmap_by_day(data, district, start_date='2018-01-01', end_date='
     data = list()
     for date in dates:
         timeMask = df_collision['date'] == date
-        if district == 'ALL':
-            index = timeMask
-        else:
-            index = timeMask & (df_collision['l_hood'] == district)
+        index = timeMask & in_district
         coordinates = df_collision.reindex(index[index].index.values)[['Y', 'X']].values
         coordinates = coordinates * np.array([[1, 1]])
         data.append(coordinates.tolist())
@@ -180,7 +183,8 @@ def visualize_heatmap_by_day(data, district, start_date='2018-01-01', end_date='
 
     return m
 
-def visualize_heatmap_by_hour(data, districts, start_date='2018-01-01', end_date='2018-12-31'):
+def visualize_heatmap_by_hour(data, districts, start_date='2018-01-01', end_date='2018-12-31',
+                              path=None):
     """
     Visualize the geographical distribution of collisons in a series of hourly heatmaps.
 
@@ -193,12 +197,15 @@ def visualize_heatmap_by_hour(data, districts, start_date='2018-01-01', end_date
             to be presented in the heatmap
         end_date (string): the end date of the collisions
             to be presented in the heatmap
+        path (string): the path of the neighborhoods the object_id of
+            the collisions refers to, defaults to MAP_JSON_DEFAULT
 
     Returns:
         the heatmap produced
 
     Raises:
         ValueError: if timeframe user selected is invalid
+        ValueError: if a district is not in the neighborhoods
     """
 
     columns = ['Y', 'X', 'date', 'object_id', 's_hood', 'l_hood', 'hour']
@@ -209,10 +216,8 @@ def visualize_heatmap_by_hour(data, districts, start_date='2018-01-01', end_date
 
     timeMask = ((df_collision['date'] >= np.datetime64(start_date)) &
                 (df_collision['date'] <= np.datetime64(end_date)))
-    if districts == 'ALL':
-        index = timeMask
-    else:
-        index = timeMask & (df_collision['l_hood'].isin(districts))
+    in_district = _in_districts(df_collision, districts, path)
+    index = timeMask & in_district
 
     if sum(index) == 0:
         print('No matched collision.')
@@ -225,10 +230,7 @@ def visualize_heatmap_by_hour(data, districts, start_date='2018-01-01', end_date
     data = list()
     for hour in hours:
         timeMask = df_collision['hour'] == hour
-        if districts == 'ALL':
-            index = timeMask
-        else:
-            index = timeMask & (df_collision['l_hood'].isin(districts))
+        index = timeMask & in_district
         coordinates = df_collision.reindex(index[index].index.values)[['Y', 'X']].values
         coordinates = coordinates * np.array([[1, 1]])
         data.append(coordinates.tolist())
@@ -268,7 +270,9 @@ def generate_factor_list(factor_list, df):
 
     factors = dict()
     for _, key in enumerate(factor_list):
-        factors[key] = df[key].value_counts().index.values
+        # categorical columns also count the categories which don't occur
+        counts = df[key].value_counts()
+        factors[key] = np.asarray(counts.index[counts > 0])
     return factors
 
 def roadcond_selection_widget(roadcond_list):
@@ -377,3 +381,27 @@ def map_by_roadcond(df, map_json_path, roadcond=''):
         print("No matched collision")
         return None
     return visualize_neighborhood_count(df_collision, path=map_json_path)
+
+def _in_districts(df_collision, districts, path=None):
+    """
+    Find the collisions in the neighborhoods of one or more districts.
+
+    Args:
+        df_collision(pandas dataframe): collisions with an object_id column
+        districts (string or list): a district name, a list of district
+            names or 'ALL'
+        path (string): the path of the neighborhoods
+
+    Returns:
+        boolean series aligned with df_collision
+
+    Raises:
+        ValueError: if a district is not in the neighborhoods
+    """
+    if isinstance(districts, str) and districts == 'ALL':
+        return pd.Series(True, index=df_collision.index)
+
+    registry = load_neighborhood_registry(MAP_JSON_DEFAULT if path is None else path)
+    object_ids = registry.district_ids(districts)
+    return pd.Series(registry.contains_ids(df_collision['object_id'], object_ids),
+                     index=df_collision.index)
@@ -0,0 +1,161 @@
+"""
+Join of weather stations and hourly weather to the collisions.
+
+This file assigns every neighborhood the weather station closest to it,
+once per neighborhood file, and gives each collision the station of its
+neighborhood. Collisions outside the neighborhoods get the station
+closest to their own location. The hourly weather of that station is
+then attached to each collision with an as-of join on time, which sorts
+the collisions once and finds the reading nearest to each collision.
+"""
+
+import numpy as np
+import pandas as pd
+
+from wa_collisions.neighborhood_reader import load_neighborhoods
+
+# longitude and latitude of the ASOS stations around Seattle
+STATION_LOCATIONS = {
+    'SEA': (-122.3144, 47.4447),
+    'BFI': (-122.3019, 47.5300),
+    'RNT': (-122.2158, 47.4931),
+    'PAE': (-122.2816, 47.9063)}
+
+# timezone of the collision times
+LOCAL_TIMEZONE = 'America/Los_Angeles'
+
+# largest gap between a collision and the weather reading joined to it
+DEFAULT_TOLERANCE = '1H'
+
+
+def nearest_stations(longitudes, latitudes, station_locations):
+    """
+    Returns the station closest to each location.
+
+    Distances are measured in degrees, with the longitudes scaled by
+    the cosine of the latitude, which is accurate enough at the scale
+    of a city.
+
+    Args:
+        longitudes (array like): longitude of the locations
+        latitudes (array like): latitude of the locations
+        station_locations (dict): longitude and latitude of each station
+
+    Returns:
+        numpy array of the name of the closest station to each location
+
+    Raises:
+        ValueError: if station_locations is empty
+    """
+    if not station_locations:
+        raise ValueError("no station locations given")
+
+    names = sorted(station_locations)
+    stations = np.array([station_locations[name] for name in names], dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float).reshape(-1, 1)
+    latitudes = np.asarray(latitudes, dtype=float).reshape(-1, 1)
+
+    scale = np.cos(np.radians(stations[:, 1]))
+    distances = ((longitudes - stations[:, 0]) * scale) ** 2 + (latitudes - stations[:, 1]) ** 2
+    return np.array(names, dtype=object)[np.argmin(distances, axis=1)]
+
+
+def neighborhood_stations(neighborhoods, station_locations):
+    """
+    Returns the station closest to each neighborhood.
+
+    Args:
+        neighborhoods (dataframe): neighborhoods with OBJECTID and
+            geometry columns, see load_neighborhoods
+        station_locations (dict): longitude and latitude of each station
+
+    Returns:
+        pandas series of the station of each neighborhood, indexed by
+        the neighborhood object id
+    """
+    points = [geometry.representative_point() for geometry in neighborhoods['geometry']]
+    stations = nearest_stations([point.x for point in points], [point.y for point in points],
+                                station_locations)
+    return pd.Series(stations, index=neighborhoods['OBJECTID'].values)
+
+
+def collision_stations(collision_data, stations, station_locations=None, geo_json_path=None):
+    """
+    Returns the weather station of each collision.
+
+    Args:
+        collision_data (dataframe): collisions with X, Y and object_id
+            columns, see assign_neighborhood
+        stations (list): stations with weather data
+        station_locations (dict): longitude and latitude of each station.
+            Defaults to STATION_LOCATIONS.
+        geo_json_path (string): path to the neighborhoods file
+
+    Returns:
+        numpy array of the station of each collision
+
+    Raises:
+        ValueError: if there are several stations and the location of one
+            of them is unknown
+    """
+    stations = sorted(set(stations))
+    if len(stations) == 1:
+        return np.full(collision_data.shape[0], stations[0], dtype=object)
+
+    if station_locations is None:
+        station_locations = STATION_LOCATIONS
+    unknown = [station for station in stations if station not in station_locations]
+    if unknown:
+        raise ValueError("unknown location of the weather stations {0}".format(unknown))
+    locations = {station: station_locations[station] for station in stations}
+
+    by_neighborhood = neighborhood_stations(load_neighborhoods(geo_json_path), locations)
+    assigned = by_neighborhood.reindex(collision_data['object_id'].values).values
+
+    outside = pd.isnull(assigned)
+    if outside.any():
+        assigned[outside] = nearest_stations(collision_data['X'].values[outside],
+                                             collision_data['Y'].values[outside], locations)
+    return assigned
+
+
+def join_weather_hours(collision_data, weather_hours, station_locations=None,
+                       geo_json_path=None, tolerance=DEFAULT_TOLERANCE,
+                       weather_timezone='UTC', local_timezone=LOCAL_TIMEZONE):
+    """
+    Attaches the nearest hourly reading of the station of each collision.
+
+    Args:
+        collision_data (dataframe): cleaned collisions with neighborhoods
+        weather_hours (dataframe): hourly weather, see clean_weather_hours
+        station_locations (dict): longitude and latitude of each station.
+            Defaults to STATION_LOCATIONS.
+        geo_json_path (string): path to the neighborhoods file
+        tolerance (string): largest time between a collision and its
+            reading. Collisions without a reading that close get NaN.
+        weather_timezone (string): timezone of the weather timestamps
+        local_timezone (string): timezone of the collision times
+
+    Returns:
+        collisions sorted by time, with the station, the weather_time of
+        the reading and its temperature, precipitation and wind_speed
+
+    Raises:
+        ValueError: if there are several stations and the location of one
+            of them is unknown
+    """
+    data = collision_data[collision_data['time'].notnull()].copy()
+    data['station'] = collision_stations(data, weather_hours['station'].unique(),
+                                         station_locations, geo_json_path)
+    data = data.sort_values('time', kind='mergesort')
+
+    # readings are moved to the local time of the collisions
+    hours = weather_hours.rename(columns={'timestamp': 'weather_time'})
+    hours['weather_time'] = pd.DatetimeIndex(hours['weather_time']) \
+        .tz_localize(weather_timezone).tz_convert(local_timezone).tz_localize(None)
+    hours['station'] = hours['station'].astype(object)
+    hours = hours.sort_values('weather_time', kind='mergesort')
+
+    data = pd.merge_asof(data, hours, left_on='time', right_on='weather_time', by='station',
+                         direction='nearest', tolerance=pd.Timedelta(tolerance))
+    return data.reset_index(drop=True)